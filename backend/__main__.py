@@ -0,0 +1,386 @@
+# backend/__main__.py
+# Запуск без GUI: python -m backend classify <папки|маски|архивы|изображения>
+# Наблюдение за папками: python -m backend watch <папки>
+# Сервис инференса для GUI: python -m backend serve
+
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import time
+
+from backend import inference
+from backend.archive import is_archive, is_image
+from backend.bursts import burst_counts
+from backend.decode import decoders, set_decoder
+from backend.results import ClassificationResultsWriter, ReportWriter
+from backend.timing import RunStats, format_summary
+from backend.video import MOTION_THRESHOLD
+
+logger = logging.getLogger("backend")
+
+def collect_inputs(inputs):
+    image_paths = []
+    archive_paths = []
+
+    def add(path):
+        if is_archive(path):
+            archive_paths.append(path)
+        elif is_image(path):
+            image_paths.append(path)
+
+    for pattern in inputs:
+        if any(char in pattern for char in "*?["):
+            paths = sorted(glob.glob(pattern, recursive=True))
+        else:
+            paths = [pattern]
+        for path in paths:
+            if os.path.isdir(path):
+                for root, dirs, files in os.walk(path):
+                    dirs.sort()
+                    for name in sorted(files):
+                        add(os.path.join(root, name))
+            elif os.path.isfile(path):
+                add(path)
+            else:
+                logger.warning(f"Input not found: {path}")
+    return image_paths, archive_paths
+
+class ProgressReporter:
+    def __init__(self, total=None, stream=sys.stderr, interval=1.0):
+        self.total = total
+        self.stream = stream
+        self.interval = interval
+        self.done = 0
+        self.start = time.perf_counter()
+        self._last_report = 0.0
+
+    def __call__(self, count):
+        self.done += count
+        now = time.perf_counter()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            self._write("\r")
+
+    def _write(self, end):
+        elapsed = time.perf_counter() - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        progress = f"{self.done}/{self.total}" if self.total else f"{self.done}"
+        self.stream.write(f"{end}Processed {progress} images, {rate:.1f} img/s, {elapsed:.1f}s elapsed")
+        self.stream.flush()
+
+    def finish(self):
+        self._write("\r")
+        self.stream.write("\n")
+        self.stream.flush()
+
+def classify(args):
+    image_paths, archive_paths = collect_inputs(args.inputs)
+    if not image_paths and not archive_paths:
+        logger.error("No images or archives found")
+        return 1
+
+    model = inference.load_model(args.model) if args.model else inference.get_classification_model()
+    progress = ProgressReporter(total=len(image_paths) if not archive_paths else None)
+
+    class_counts = {}
+    burst_classifications = []
+    pipeline_summaries = []
+    stats = RunStats()
+    report_writer = ReportWriter(args.report) if args.report else None
+    results_writer = ClassificationResultsWriter(args.output)
+
+    def write(new_image_classifications):
+        # JSON и отчет пишутся порциями по ходу запуска, все результаты в памяти не держатся
+        with stats.stage("write_results"):
+            results_writer.write(new_image_classifications)
+            if report_writer is not None:
+                report_writer.write(new_image_classifications)
+
+    def merge(new_class_counts, new_image_classifications, pipeline_summary=None):
+        for key, value in new_class_counts.items():
+            class_counts[key] = class_counts.get(key, 0) + value
+        write(new_image_classifications)
+        if args.group_bursts:
+            burst_classifications.extend(new_image_classifications)
+        if pipeline_summary is not None:
+            pipeline_summaries.append(pipeline_summary)
+
+    try:
+        if args.detect_first:
+            # Двухэтапный режим: детектор отсеивает пустые кадры, классификатор видит только вырезанных животных
+            if args.detection_model:
+                detection_model = inference.load_model(args.detection_model)
+            else:
+                detection_model = inference.get_detection_model()
+            if args.processes > 1:
+                logger.warning("Detect-first mode runs in a single process")
+            options = dict(batch_size=args.batch_size, num_workers=args.workers, use_cache=not args.no_cache,
+                           progress_callback=progress, stats=stats)
+            if image_paths:
+                merge(*inference.process_images_detect_classify(detection_model, model, image_paths, **options))
+            for archive_path in archive_paths:
+                merge(*inference.process_archive_detect_classify(detection_model, model, archive_path, **options))
+        elif args.group_bursts:
+            # Для группировки серий нужны все кадры, результаты приходят в конце каждого входа
+            options = dict(batch_size=args.batch_size, num_workers=args.workers, use_cache=not args.no_cache,
+                           progress_callback=progress, num_processes=args.processes, burst_grouping=True,
+                           burst_representatives=args.burst_representatives, stats=stats)
+            if image_paths:
+                merge(*inference.process_images_classification(model, image_paths,
+                                                               burst_use_mtime=args.burst_use_mtime, **options))
+            for archive_path in archive_paths:
+                merge(*inference.process_archive_classification(model, archive_path, **options))
+        elif args.cascade:
+            # Каскад: быстрый проход, полная модель только для изображений с уверенностью ниже порога
+            fast_model = inference.load_model(args.cascade_model, task="classify") if args.cascade_model else model
+            if args.processes > 1:
+                logger.warning("Cascade mode runs in a single process")
+            options = dict(batch_size=args.batch_size, num_workers=args.workers, use_cache=not args.no_cache,
+                           progress_callback=progress, stats=stats, class_counts=class_counts,
+                           threshold=args.cascade_threshold, fast_imgsz=args.cascade_imgsz,
+                           audit_fraction=args.cascade_audit)
+            if image_paths:
+                for chunk in inference.chunked(inference.iter_images_cascade(fast_model, model, image_paths,
+                                                                             **options), args.batch_size):
+                    write(chunk)
+            for archive_path in archive_paths:
+                for chunk in inference.chunked(inference.iter_archive_cascade(fast_model, model, archive_path,
+                                                                              **options), args.batch_size):
+                    write(chunk)
+        else:
+            options = dict(batch_size=args.batch_size, num_workers=args.workers, use_cache=not args.no_cache,
+                           progress_callback=progress, num_processes=args.processes, stats=stats,
+                           class_counts=class_counts)
+            streams = []
+            if image_paths:
+                streams.append(lambda: inference.iter_images_classification(model, image_paths, **options))
+            for archive_path in archive_paths:
+                streams.append(lambda archive_path=archive_path:
+                               inference.iter_archive_classification(model, archive_path, **options))
+            for stream in streams:
+                for chunk in inference.chunked(stream(), args.batch_size):
+                    write(chunk)
+        progress.finish()
+    finally:
+        # При прерывании файлы закрываются с тем, что успели обработать
+        if report_writer is not None:
+            with stats.stage("write_report"):
+                report_writer.close()
+        timings = stats.summary()
+        if args.cascade:
+            timings["cascade"] = inference.cascade_summary(timings)
+        if args.detect_first:
+            # Сколько вызовов классификатора сэкономил детектор, по всем входам запуска
+            timings["detect_first"] = inference.merge_pipeline_summaries(pipeline_summaries)
+        output_path = results_writer.close(class_counts, timings)
+
+    if args.report:
+        logger.info(f"Saved report to {args.report}")
+    logger.info(f"Saved classification results to {output_path}")
+    logger.info(format_summary(stats.summary()))
+    if args.cascade:
+        logger.info(inference.format_cascade_summary(inference.cascade_summary(stats.summary())))
+    if args.detect_first:
+        logger.info(inference.format_pipeline_summary(inference.merge_pipeline_summaries(pipeline_summaries)))
+    logger.info(f"Class counts: {class_counts}")
+    if args.group_bursts:
+        logger.info(f"Burst counts: {burst_counts(burst_classifications)}")
+    return 0
+
+def video(args):
+    from backend.video import process_video
+
+    model = inference.load_model(args.model) if args.model else inference.get_detection_model()
+    for video_path in args.inputs:
+        summary = process_video(model, video_path, output_dir=args.output_dir, stride=args.stride,
+                                batch_size=args.batch_size, show=args.show, motion_threshold=args.motion_threshold)
+        logger.info(f"Saved {summary['annotated_video']}, {summary['detections_json']} and {summary['detections_csv']}")
+    return 0
+
+def engine(args):
+    from backend.engines import check_parity, export_model
+
+    if args.model:
+        model_path = args.model
+    elif args.role == "classification":
+        model_path = inference.classification_model_path
+    else:
+        model_path = inference.detection_model_path
+    exported_path = export_model(model_path, args.engine, args.int8, args.calibration_data, inference.IMGSZ)
+
+    if args.check:
+        # Классификатор сравнивается по top-1, детектор - по совпадению рамок (метка и IoU)
+        task, metric = ("classify", "top1_agreement") if args.role == "classification" else ("detect", "box_agreement")
+        image_paths, _ = collect_inputs(args.check)
+        report = check_parity(inference.load_model(model_path, task=task),
+                              inference.load_model(exported_path, task=task), image_paths, args.batch_size, task)
+        print(json.dumps(report, indent=4))
+        if report[metric] < args.min_agreement:
+            logger.error(f"{metric} is below {args.min_agreement:.2%}")
+            return 1
+    return 0
+
+def watch(args):
+    from backend.watch import watch_folders
+
+    for directory in args.inputs:
+        if not os.path.isdir(directory):
+            logger.error(f"Not a directory: {directory}")
+            return 1
+    if args.report and not args.report.lower().endswith(".csv"):
+        logger.error("Watch mode appends to the report, only .csv is supported")
+        return 1
+
+    model = inference.load_model(args.model) if args.model else inference.get_classification_model()
+    stats = RunStats()
+    try:
+        watch_folders(model, args.inputs, run_name=args.run_name, report_path=args.report,
+                      poll_interval=args.poll_interval, settle_seconds=args.settle_seconds,
+                      batch_size=args.batch_size, num_workers=args.workers, use_cache=not args.no_cache, stats=stats)
+    except KeyboardInterrupt:
+        # Запуск уже сохранен со статусом stopped, повторный запуск с тем же --run-name продолжит его
+        logger.info("Stopped watching")
+    logger.info(format_summary(stats.summary()))
+    return 0
+
+def serve(args):
+    from backend.server import serve as run_server
+
+    models = {}
+    if "classification" in args.roles:
+        models["classification"] = (inference.load_model(args.classification_model, task="classify")
+                                    if args.classification_model else inference.get_classification_model())
+    if "detection" in args.roles:
+        models["detection"] = (inference.load_model(args.detection_model, task="detect")
+                               if args.detection_model else inference.get_detection_model())
+    try:
+        run_server(models, host=args.host, port=args.port, unix_path=args.unix, max_batch=args.max_batch,
+                   max_wait=args.max_wait_ms / 1000, max_pending=args.max_pending, num_workers=args.workers)
+    except KeyboardInterrupt:
+        logger.info("Inference server stopped")
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m backend", description="Инференс моделей без графического интерфейса")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    classify_parser = subparsers.add_parser("classify", help="Классификация изображений, папок и архивов")
+    classify_parser.add_argument("inputs", nargs="+", help="Изображения, папки, маски (glob) или архивы")
+    classify_parser.add_argument("-o", "--output", help="Путь к JSON с результатами (по умолчанию metadata/)")
+    classify_parser.add_argument("-r", "--report", help="Путь к отчету .xlsx, .csv или .parquet")
+    classify_parser.add_argument("-b", "--batch-size", type=int, default=inference.BATCH_SIZE)
+    classify_parser.add_argument("-w", "--workers", type=int, default=inference.DECODE_WORKERS,
+                                 help="Количество потоков декодирования изображений")
+    classify_parser.add_argument("-p", "--processes", type=int, default=1,
+                                 help="Количество процессов с отдельной копией модели")
+    classify_parser.add_argument("--model", help="Веса модели классификации (по умолчанию из models/engines.json)")
+    classify_parser.add_argument("--no-cache", action="store_true", help="Не использовать кэш результатов")
+    classify_parser.add_argument("--group-bursts", action="store_true",
+                                 help="Группировать серии похожих кадров и классифицировать только представителей")
+    classify_parser.add_argument("--burst-representatives", type=int, default=1,
+                                 help="Количество кадров серии, на которых запускается модель")
+    classify_parser.add_argument("--burst-use-mtime", action="store_true",
+                                 help="Для кадров без EXIF брать время съемки из mtime файла "
+                                      "(только если копирование сохраняет mtime)")
+    classify_parser.add_argument("--detect-first", action="store_true",
+                                 help="Сначала детекция: пустые кадры пропускаются, классифицируются вырезанные рамки")
+    classify_parser.add_argument("--detection-model", help="Веса модели детекции (по умолчанию из models/engines.json)")
+    classify_parser.add_argument("--cascade", action="store_true",
+                                 help="Каскад: сначала быстрый проход, полная модель только для неуверенных изображений")
+    classify_parser.add_argument("--cascade-model",
+                                 help="Веса быстрой модели (по умолчанию основная модель в разрешении --cascade-imgsz)")
+    classify_parser.add_argument("--cascade-imgsz", type=int, default=inference.CASCADE_IMGSZ,
+                                 help="Разрешение быстрого прохода")
+    classify_parser.add_argument("--cascade-threshold", type=float, default=inference.CASCADE_THRESHOLD,
+                                 help="Изображения с уверенностью ниже порога отправляются в полную модель")
+    classify_parser.add_argument("--cascade-audit", type=float, default=inference.CASCADE_AUDIT_FRACTION,
+                                 help="Доля уверенных изображений, проверяемых полной моделью для оценки точности")
+    classify_parser.add_argument("--decoder", choices=sorted(decoders),
+                                 help="Декодирование изображений: reduced - JPEG сразу в масштабе модели (по умолчанию), "
+                                      "cv2 - уменьшенное декодирование OpenCV, full - полное разрешение")
+    classify_parser.set_defaults(func=classify)
+
+    video_parser = subparsers.add_parser("video", help="Детекция на видео с сохранением размеченного видео")
+    video_parser.add_argument("inputs", nargs="+", help="Видеофайлы")
+    video_parser.add_argument("-o", "--output-dir", default="videos", help="Папка для размеченного видео и детекций")
+    video_parser.add_argument("-s", "--stride", type=int, default=1, help="Обрабатывать каждый N-й кадр")
+    video_parser.add_argument("-b", "--batch-size", type=int, default=inference.BATCH_SIZE)
+    video_parser.add_argument("-m", "--motion-threshold", type=float, default=MOTION_THRESHOLD,
+                              help="Доля изменившихся пикселей, ниже которой детектор не запускается "
+                                   "и кадр наследует детекции предыдущего (0 - детектор на каждом кадре)")
+    video_parser.add_argument("--show", action="store_true", help="Показывать кадры в окне во время обработки")
+    video_parser.add_argument("--model", help="Веса модели детекции (по умолчанию из models/engines.json)")
+    video_parser.set_defaults(func=video)
+
+    engine_parser = subparsers.add_parser("engine", help="Экспорт модели в ONNX/OpenVINO и проверка точности")
+    engine_parser.add_argument("role", choices=["classification", "detection"])
+    engine_parser.add_argument("-e", "--engine", choices=["onnx", "openvino"], required=True)
+    engine_parser.add_argument("--int8", action="store_true", help="INT8 квантизация (только openvino)")
+    engine_parser.add_argument("--calibration-data",
+                               help="Данные для калибровки INT8: папка с примерами изображений или готовый "
+                                    "датасет ultralytics (YAML для детекции, train/ и val/ для классификации)")
+    engine_parser.add_argument("--model", help="Исходные .pt веса")
+    engine_parser.add_argument("--check", nargs="+", help="Изображения для сравнения с .pt моделью")
+    engine_parser.add_argument("--min-agreement", type=float, default=0.98,
+                               help="Минимальная доля совпадений с .pt моделью: top-1 для классификации, "
+                                    "рамок для детекции")
+    engine_parser.add_argument("-b", "--batch-size", type=int, default=inference.BATCH_SIZE)
+    engine_parser.set_defaults(func=engine)
+
+    watch_parser = subparsers.add_parser("watch", help="Наблюдение за папками и классификация новых файлов")
+    watch_parser.add_argument("inputs", nargs="+", help="Папки, в которые поступают изображения и архивы")
+    watch_parser.add_argument("--run-name", help="Имя запуска в метаданных (по умолчанию watch_<папка>); "
+                                                 "запуск с тем же именем продолжается")
+    watch_parser.add_argument("-r", "--report", help="Путь к отчету .csv, новые строки дописываются в конец")
+    watch_parser.add_argument("-b", "--batch-size", type=int, default=inference.BATCH_SIZE)
+    watch_parser.add_argument("-w", "--workers", type=int, default=inference.DECODE_WORKERS,
+                              help="Количество потоков декодирования изображений")
+    watch_parser.add_argument("--model", help="Веса модели классификации (по умолчанию из models/engines.json)")
+    watch_parser.add_argument("--no-cache", action="store_true", help="Не использовать кэш результатов")
+    watch_parser.add_argument("--poll-interval", type=float, default=2.0, help="Интервал опроса папок, секунды")
+    watch_parser.add_argument("--settle-seconds", type=float, default=5.0,
+                              help="Сколько секунд файл не должен меняться, чтобы считаться скопированным")
+    watch_parser.add_argument("--decoder", choices=sorted(decoders), help="Декодирование изображений, как в classify")
+    watch_parser.set_defaults(func=watch)
+
+    serve_parser = subparsers.add_parser("serve", help="Локальный сервис инференса для нескольких окон приложения")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--unix", help="Слушать Unix-сокет вместо TCP порта")
+    serve_parser.add_argument("--roles", nargs="+", choices=["classification", "detection"],
+                              default=["classification", "detection"], help="Какие модели загрузить")
+    serve_parser.add_argument("--classification-model", help="Веса модели классификации")
+    serve_parser.add_argument("--detection-model", help="Веса модели детекции")
+    serve_parser.add_argument("--max-batch", type=int, default=inference.BATCH_SIZE,
+                              help="Максимальный размер батча из запросов разных клиентов")
+    serve_parser.add_argument("--max-wait-ms", type=float, default=10.0,
+                              help="Сколько ждать заполнения батча, миллисекунды")
+    serve_parser.add_argument("--max-pending", type=int, default=32 * inference.BATCH_SIZE,
+                              help="Изображений в обработке, сверх которых запросы получают 503")
+    serve_parser.add_argument("-w", "--workers", type=int, default=inference.DECODE_WORKERS,
+                              help="Количество потоков декодирования изображений")
+    serve_parser.add_argument("--decoder", choices=sorted(decoders), help="Декодирование изображений, как в classify")
+    serve_parser.set_defaults(func=serve)
+
+    return parser
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                        stream=sys.stderr)
+    args = build_parser().parse_args(argv)
+    if getattr(args, "decoder", None):
+        set_decoder(args.decoder)
+    try:
+        return args.func(args)
+    except KeyboardInterrupt:
+        logger.error("Interrupted")
+        return 130
+    except ValueError as e:
+        logger.error(str(e))
+        return 2
+
+if __name__ == "__main__":
+    sys.exit(main())
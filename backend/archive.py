@@ -0,0 +1,67 @@
+# backend/archive.py
+
+import io
+import os
+import tarfile
+import zipfile
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz')
+
+def is_archive(name):
+    return name.lower().endswith(ARCHIVE_EXTENSIONS)
+
+def is_image(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+def _iter_members(source, name):
+    # Tar читается в потоковом режиме, поэтому содержимое члена нужно прочитать до перехода к следующему
+    if name.lower().endswith('.zip'):
+        with zipfile.ZipFile(source) as zip_ref:
+            for info in zip_ref.infolist():
+                if not info.is_dir():
+                    yield info.filename, lambda info=info: zip_ref.read(info)
+    else:
+        if isinstance(source, str):
+            tar_ref = tarfile.open(source, mode='r|*')
+        else:
+            tar_ref = tarfile.open(fileobj=source, mode='r|*')
+        with tar_ref:
+            for info in tar_ref:
+                if info.isfile():
+                    yield info.name, lambda info=info: tar_ref.extractfile(info).read()
+
+# Отдает (путь, байты) для каждого изображения архива, включая вложенные архивы.
+# Путь - это путь к архиву плюс путь внутри него: /data/card01.zip/DCIM/inner.tar.gz/IMG_0001.JPG
+def iter_archive_images(archive_path, source=None, prefix=None):
+    prefix = prefix or archive_path
+    for member_name, read in _iter_members(archive_path if source is None else source, archive_path):
+        if is_image(member_name):
+            yield f"{prefix}/{member_name}", read()
+        elif is_archive(member_name):
+            yield from iter_archive_images(member_name, io.BytesIO(read()), f"{prefix}/{member_name}")
+
+def split_archive_path(path):
+    parts = path.replace("\\", "/").split("/")
+    for i in range(len(parts) - 1, 0, -1):
+        archive_path = "/".join(parts[:i])
+        if is_archive(archive_path) and os.path.isfile(archive_path):
+            return archive_path, "/".join(parts[i:])
+    return None, None
+
+def read_archive_member(path):
+    archive_path, member = split_archive_path(path)
+    if archive_path is None:
+        raise FileNotFoundError(path)
+
+    source, name = archive_path, archive_path
+    while True:
+        for member_name, read in _iter_members(source, name):
+            if member_name == member:
+                return read()
+            if is_archive(member_name) and member.startswith(member_name + "/"):
+                source, name = io.BytesIO(read()), member_name
+                member = member[len(member_name) + 1:]
+                break
+        else:
+            raise FileNotFoundError(path)
@@ -0,0 +1,112 @@
+# backend/bursts.py
+# Фотоловушки снимают сериями по 3-10 почти одинаковых кадров. Кадры группируются по времени съемки (EXIF)
+# и перцептивному хэшу, модель запускается только на представителях серии.
+
+import io
+import datetime
+import logging
+import os
+
+from PIL import Image, UnidentifiedImageError
+
+BURST_MAX_GAP = 10.0
+BURST_MAX_DISTANCE = 12
+# Серия - это 3-10 кадров одного срабатывания. Животное, которое пасется перед камерой, дает цепочку кадров
+# с короткими промежутками; без ограничения она стала бы одной серией, и ответ одного представителя
+# разошелся бы на неограниченное число кадров
+BURST_MAX_FRAMES = 10
+BURST_MAX_SPAN = 30.0
+HASH_SIZE = 8
+
+logger = logging.getLogger(__name__)
+
+EXIF_IFD = 0x8769
+DATETIME_ORIGINAL = 36867
+DATETIME = 306
+
+def dhash(img, hash_size=HASH_SIZE):
+    small = img.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+def hamming_distance(first, second):
+    return bin(first ^ second).count("1")
+
+def exif_timestamp(img):
+    try:
+        exif = img.getexif()
+        value = exif.get_ifd(EXIF_IFD).get(DATETIME_ORIGINAL) or exif.get(DATETIME)
+        if value:
+            return datetime.datetime.strptime(str(value).strip("\x00 "), "%Y:%m:%d %H:%M:%S").timestamp()
+    except Exception:
+        pass
+    return None
+
+def image_signature(image_path, data=None, use_mtime=False):
+    try:
+        with Image.open(image_path if data is None else io.BytesIO(data)) as img:
+            timestamp = exif_timestamp(img)
+            if timestamp is None and use_mtime and data is None:
+                # mtime - время съемки, только если копирование его сохранило (rsync -a, импорт с карты);
+                # иначе это время копирования, и все кадры папки попали бы в одни серии. У файлов из архива времени нет
+                timestamp = os.path.getmtime(image_path)
+            # Для хэша хватает уменьшенного JPEG, полное декодирование не нужно
+            img.draft("L", (64, 64))
+            return timestamp, dhash(img)
+    except UnidentifiedImageError:
+        logger.warning(f"Cannot identify image file {image_path}, skipping.")
+    except Exception as e:
+        logger.warning(f"Error loading image {image_path}: {e}")
+    return None
+
+def group_bursts(signatures, max_gap=BURST_MAX_GAP, max_distance=BURST_MAX_DISTANCE, max_frames=BURST_MAX_FRAMES,
+                 max_span=BURST_MAX_SPAN):
+    # signatures: список (ключ, время съемки или None, хэш). Возвращает серии как списки индексов.
+    order = sorted(range(len(signatures)),
+                   key=lambda i: (signatures[i][1] is None, signatures[i][1] or 0.0, i))
+    bursts = []
+    previous = None
+    for index in order:
+        _, timestamp, image_hash = signatures[index]
+        if previous is not None:
+            _, previous_timestamp, previous_hash = signatures[previous]
+            # Кадр без времени съемки ни с чем не объединяется: иначе похожие сканы слились бы в одну серию
+            close_in_time = (timestamp is not None and previous_timestamp is not None
+                             and abs(timestamp - previous_timestamp) <= max_gap)
+            # Серия ограничена и по числу кадров, и по времени от первого кадра, а не только промежутком между соседними
+            burst_start = signatures[bursts[-1][0]][1]
+            fits_burst = len(bursts[-1]) < max_frames and close_in_time and timestamp - burst_start <= max_span
+            if fits_burst and hamming_distance(image_hash, previous_hash) <= max_distance:
+                bursts[-1].append(index)
+                previous = index
+                continue
+        bursts.append([index])
+        previous = index
+    return bursts
+
+def pick_representatives(burst, count=1):
+    if count >= len(burst):
+        return list(burst)
+    # Берем кадры равномерно по серии, начиная с середины для одного представителя
+    if count == 1:
+        return [burst[len(burst) // 2]]
+    step = (len(burst) - 1) / (count - 1)
+    return [burst[round(i * step)] for i in range(count)]
+
+def burst_counts(image_classifications):
+    counts = {}
+    seen_bursts = set()
+    for image_data in image_classifications:
+        burst = image_data.get("burst")
+        if burst is None or burst in seen_bursts or not image_data["classes"]:
+            continue
+        seen_bursts.add(burst)
+        label_name = image_data["classes"][0][0]
+        counts[label_name] = counts.get(label_name, 0) + 1
+    return counts
@@ -0,0 +1,210 @@
+# backend/cache.py
+
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+cache_directory = "cache"
+cache_path = os.path.join(cache_directory, "results.sqlite")
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+# Сколько обновлений времени обращения копится в памяти, если записей в кэш долго нет
+TOUCH_BATCH = 1024
+
+_weights_hashes = {}
+_weights_lock = threading.Lock()
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+def _weight_files(model_path):
+    # Экспортированная OpenVINO модель - это папка, хэшируем все ее файлы
+    if os.path.isdir(model_path):
+        return sorted(os.path.join(root, name) for root, _, files in os.walk(model_path) for name in files)
+    return [model_path]
+
+def weights_signature(model_path):
+    # (путь, размер, mtime) меняется при замене .pt файла. Экспорт OpenVINO заменяет папку целиком,
+    # поэтому для папки достаточно mtime ее самой
+    stat = os.stat(model_path)
+    return os.path.abspath(model_path), stat.st_size, stat.st_mtime_ns
+
+def weights_hash(model_path):
+    # Хэш весов запоминается по сигнатуре файла, повторно файл не читается
+    signature = weights_signature(model_path)
+    with _weights_lock:
+        if signature not in _weights_hashes:
+            sha = hashlib.sha256()
+            for path in _weight_files(model_path):
+                with open(path, 'rb') as file:
+                    for block in iter(lambda: file.read(1024 * 1024), b''):
+                        sha.update(block)
+            _weights_hashes[signature] = sha.hexdigest()
+        return _weights_hashes[signature]
+
+class SizeBoundedStore:
+    # Таблица SQLite "ключ -> данные" с вытеснением давно не использованных записей по суммарному размеру.
+    # Сумма ведется триггерами в таблице sizes (общей для всех процессов), запись не пересчитывает всю таблицу.
+    # Время обращения при чтении обновляется пачкой вместе со следующей записью
+    def __init__(self, path, table, columns, max_bytes):
+        # columns: [(имя, тип SQLite)] - столбцы данных помимо key, size и last_access
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.path = path
+        self.table = table
+        self.columns = [name for name, _ in columns]
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._touched = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        column_definitions = "".join(f"{name} {kind}, " for name, kind in columns)
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            f"key TEXT PRIMARY KEY, {column_definitions}size INTEGER NOT NULL, last_access REAL NOT NULL)")
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_last_access ON {table} (last_access)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS sizes (name TEXT PRIMARY KEY, total INTEGER NOT NULL)")
+        self._conn.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_size_insert AFTER INSERT ON {table} BEGIN "
+            f"UPDATE sizes SET total = total + new.size WHERE name = '{table}'; END")
+        self._conn.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_size_update AFTER UPDATE OF size ON {table} BEGIN "
+            f"UPDATE sizes SET total = total + new.size - old.size WHERE name = '{table}'; END")
+        self._conn.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_size_delete AFTER DELETE ON {table} BEGIN "
+            f"UPDATE sizes SET total = total - old.size WHERE name = '{table}'; END")
+        # Кэш, созданный до появления счетчика, суммируется один раз
+        if self._conn.execute("SELECT 1 FROM sizes WHERE name = ?", (table,)).fetchone() is None:
+            self._conn.execute(
+                f"INSERT OR IGNORE INTO sizes (name, total) SELECT ?, COALESCE(SUM(size), 0) FROM {table}", (table,))
+        self._conn.commit()
+
+        column_names = ", ".join(self.columns)
+        self._select_sql = f"SELECT {column_names} FROM {table} WHERE key = ?"
+        self._upsert_sql = (
+            f"INSERT INTO {table} (key, {column_names}, size, last_access) "
+            f"VALUES ({', '.join('?' * (len(self.columns) + 3))}) ON CONFLICT (key) DO UPDATE SET "
+            + ", ".join(f"{name} = excluded.{name}" for name in [*self.columns, "size", "last_access"]))
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(self._select_sql, (key,)).fetchone()
+            if row is None:
+                return None
+            self._touched[key] = time.time()
+            if len(self._touched) >= TOUCH_BATCH:
+                self._flush_touched()
+                self._conn.commit()
+        return row
+
+    def contains(self, key):
+        with self._lock:
+            return self._conn.execute(f"SELECT 1 FROM {self.table} WHERE key = ?", (key,)).fetchone() is not None
+
+    def put_many(self, rows):
+        # rows: [(ключ, (значения столбцов), размер)]
+        now = time.time()
+        rows = [(key, *values, size, now) for key, values, size in rows]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(self._upsert_sql, rows)
+            self._flush_touched()
+            self._evict()
+            self._conn.commit()
+
+    def total_bytes(self):
+        with self._lock:
+            return self._conn.execute("SELECT total FROM sizes WHERE name = ?", (self.table,)).fetchone()[0]
+
+    def _flush_touched(self):
+        if self._touched:
+            self._conn.executemany(f"UPDATE {self.table} SET last_access = ? WHERE key = ?",
+                                   [(accessed, key) for key, accessed in self._touched.items()])
+            self._touched.clear()
+
+    def _evict(self):
+        # LRU: удаляем давно не использованные записи, только когда сумма превысила max_bytes
+        total = self._conn.execute("SELECT total FROM sizes WHERE name = ?", (self.table,)).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        cursor = self._conn.execute(f"SELECT key, size FROM {self.table} ORDER BY last_access")
+        stale_keys = []
+        for key, size in cursor:
+            stale_keys.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self._conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", stale_keys)
+
+    def flush(self):
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._touched.clear()
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+            self._conn.close()
+
+class ResultCache:
+    def __init__(self, path=cache_path, max_bytes=MAX_CACHE_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._store = SizeBoundedStore(path, "results", [("value", "TEXT NOT NULL")], max_bytes)
+
+    @staticmethod
+    def make_key(task, model_hash, imgsz, data):
+        # model_hash - хэш весов, загруженных в память (model.weights_hash), а не текущего файла на диске
+        return f"{task}:{model_hash}:{imgsz}:{content_hash(data)}"
+
+    def get(self, key):
+        row = self._store.get(key)
+        return None if row is None else json.loads(row[0])
+
+    def put_many(self, items):
+        rows = []
+        for key, value in items:
+            value = json.dumps(value)
+            rows.append((key, (value,), len(value)))
+        self._store.put_many(rows)
+
+    def put(self, key, value):
+        self.put_many([(key, value)])
+
+    def total_bytes(self):
+        return self._store.total_bytes()
+
+    def flush(self):
+        self._store.flush()
+
+    def clear(self):
+        self._store.clear()
+
+    def close(self):
+        self._store.close()
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+def get_result_cache():
+    global _result_cache
+    with _result_cache_lock:
+        if _result_cache is None:
+            _result_cache = ResultCache()
+            # Накопленные обращения записываются при выходе
+            atexit.register(_result_cache.close)
+        return _result_cache
@@ -0,0 +1,200 @@
+# backend/client.py
+# Клиент локального сервиса инференса (backend/server.py). Адрес задается переменной окружения
+# INFERENCE_SERVER: http://127.0.0.1:8765 или unix:/tmp/animals.sock; без нее вкладки загружают модели сами.
+
+import base64
+import http.client
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from backend import inference
+from backend.archive import iter_archive_images
+from backend.timing import RunStats
+
+logger = logging.getLogger(__name__)
+
+SERVER_ENV = "INFERENCE_SERVER"
+TIMEOUT = 300
+# Сколько запросов одного клиента одновременно в пути: пока сервер считает один батч, следующий уже в очереди
+MAX_IN_FLIGHT = 2
+MAX_RETRIES = 30
+
+class ServerBusy(Exception):
+    pass
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=TIMEOUT):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+class InferenceClient:
+    def __init__(self, address, timeout=TIMEOUT):
+        self.address = address
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            if self.address.startswith("unix:"):
+                # unix:/tmp/animals.sock и unix:///tmp/animals.sock
+                socket_path = self.address[len("unix:"):]
+                if socket_path.startswith("//"):
+                    socket_path = socket_path[2:]
+                connection = _UnixHTTPConnection(socket_path, self.timeout)
+            else:
+                url = urlparse(self.address)
+                connection = http.client.HTTPConnection(url.hostname, url.port, timeout=self.timeout)
+            self._local.connection = connection
+        return connection
+
+    def _request(self, method, path, payload=None):
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request(method, path, body, headers)
+                response = connection.getresponse()
+                data = response.read()
+                break
+            except (ConnectionError, http.client.HTTPException):
+                # Сервер закрыл keep-alive соединение: один раз переподключаемся
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+        if response.status == 503:
+            raise ServerBusy(json.loads(data).get("error", "Server is busy"))
+        if response.status != 200:
+            raise RuntimeError(f"Inference server error {response.status}: {json.loads(data).get('error')}")
+        return json.loads(data)
+
+    def health(self):
+        return self._request("GET", "/health")
+
+    def metrics(self):
+        return self._request("GET", "/metrics")
+
+    def predict(self, task, sources, use_cache=True, thumbnails=False, stop_event=None):
+        # sources: [(путь, байты или None)]; файлы с диска сервер читает сам, изображения из архивов передаются
+        images = []
+        for image_path, data in sources:
+            image = {"path": image_path}
+            if data is not None:
+                image["data"] = base64.b64encode(data).decode("ascii")
+            images.append(image)
+        payload = {"images": images, "use_cache": use_cache, "thumbnails": thumbnails}
+        delay = 0.1
+        for _ in range(MAX_RETRIES):
+            if stop_event and stop_event.is_set():
+                raise InterruptedError("Inference was stopped.")
+            try:
+                return self._request("POST", f"/{task}", payload)["results"]
+            except ServerBusy:
+                time.sleep(delay)
+                delay = min(delay * 2, 2.0)
+        raise ServerBusy("Inference server stayed busy, giving up")
+
+    def _iter_predictions(self, task, sources, *, batch_size, use_cache, thumbnails, stop_event, stats):
+        # Батчи отправляются с опережением на MAX_IN_FLIGHT запросов, порядок результатов сохраняется
+        executor = ThreadPoolExecutor(max_workers=MAX_IN_FLIGHT, thread_name_prefix="inference-client")
+        pending = deque()
+
+        def request(chunk):
+            with stats.stage("server_request", len(chunk)):
+                return self.predict(task, chunk, use_cache=use_cache, thumbnails=thumbnails, stop_event=stop_event)
+
+        try:
+            for chunk in inference.chunked(sources, max(1, batch_size)):
+                pending.append((chunk, executor.submit(request, chunk)))
+                if len(pending) >= MAX_IN_FLIGHT:
+                    chunk, future = pending.popleft()
+                    yield chunk, future.result()
+            while pending:
+                chunk, future = pending.popleft()
+                yield chunk, future.result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _iter_chunks(self, task, sources, *, stop_event=None, batch_size=inference.BATCH_SIZE, use_cache=True,
+                     progress_callback=None, stats=None, skip=None, thumbnails=False):
+        # Отдает (счетчики батча, результаты батча), как iter_classified_chunks в backend/inference.py
+        stats = stats if stats is not None else RunStats()
+        if skip:
+            sources = inference.skip_sources(sources, skip, progress_callback)
+        predictions = self._iter_predictions(task, sources, batch_size=batch_size, use_cache=use_cache,
+                                             thumbnails=thumbnails, stop_event=stop_event, stats=stats)
+        try:
+            for chunk, results in predictions:
+                if stop_event and stop_event.is_set():
+                    raise InterruptedError("Inference was stopped.")
+                stats.count("images", len(chunk))
+                stats.count("batches")
+                chunk_counts = {}
+                chunk_results = []
+                for image_data in results:
+                    if image_data is None:
+                        stats.count("failed_images")
+                        continue
+                    image_data["classes"] = [tuple(class_data) for class_data in image_data["classes"]]
+                    # Для классификации считается класс изображения, для детекции - каждая рамка
+                    for label_name, _ in image_data["classes"]:
+                        chunk_counts[label_name] = chunk_counts.get(label_name, 0) + 1
+                    chunk_results.append(image_data)
+                yield chunk_counts, chunk_results
+                if progress_callback is not None:
+                    progress_callback(len(chunk))
+        finally:
+            predictions.close()
+
+    def iter_images_classification(self, image_paths, stop_event=None, batch_size=inference.BATCH_SIZE,
+                                   use_cache=True, progress_callback=None, stats=None, skip=None, thumbnails=False,
+                                   class_counts=None):
+        sources = ((image_path, None) for image_path in image_paths)
+        return inference.iter_results(self._iter_chunks("classify", sources, stop_event=stop_event,
+                                                        batch_size=batch_size, use_cache=use_cache,
+                                                        progress_callback=progress_callback, stats=stats, skip=skip,
+                                                        thumbnails=thumbnails), class_counts)
+
+    def iter_archive_classification(self, archive_path, stop_event=None, batch_size=inference.BATCH_SIZE,
+                                    use_cache=True, progress_callback=None, stats=None, skip=None, thumbnails=False,
+                                    class_counts=None):
+        return inference.iter_results(self._iter_chunks("classify", iter_archive_images(archive_path),
+                                                        stop_event=stop_event, batch_size=batch_size,
+                                                        use_cache=use_cache, progress_callback=progress_callback,
+                                                        stats=stats, skip=skip, thumbnails=thumbnails), class_counts)
+
+    def iter_images_detection(self, image_paths, stop_event=None, batch_size=inference.BATCH_SIZE, use_cache=True,
+                              progress_callback=None, stats=None, thumbnails=False, class_counts=None):
+        sources = ((image_path, None) for image_path in image_paths)
+        return inference.iter_results(self._iter_chunks("detect", sources, stop_event=stop_event,
+                                                        batch_size=batch_size, use_cache=use_cache,
+                                                        progress_callback=progress_callback, stats=stats,
+                                                        thumbnails=thumbnails), class_counts)
+
+def get_inference_client():
+    # Клиент возвращается, только если сервис задан и отвечает; иначе вкладки работают с моделями в процессе
+    address = os.environ.get(SERVER_ENV)
+    if not address:
+        return None
+    client = InferenceClient(address)
+    try:
+        health = client.health()
+    except Exception as e:
+        logger.warning(f"Inference server {address} is unavailable, using in-process models: {e}")
+        return None
+    logger.info(f"Using inference server {address}: {health['models']}")
+    return client
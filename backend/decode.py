@@ -0,0 +1,112 @@
+# backend/decode.py
+# Декодирование изображений для модели. Оригиналы фотоловушек 12-20 Мп, а модель видит imgsz=544, поэтому
+# JPEG декодируется сразу в уменьшенном масштабе (1/2, 1/4, 1/8 в DCT), но не меньше target_size по каждой стороне.
+# EXIF ориентация применяется, исходный размер (с учетом поворота) сохраняется в img.info["original_size"],
+# по нему рамки детекции пересчитываются в координаты оригинала.
+# Декодер выбирается переменной окружения IMAGE_DECODER: reduced (по умолчанию), cv2 или full.
+
+import io
+import os
+
+from PIL import Image, ImageOps
+
+DECODER_ENV = "IMAGE_DECODER"
+DEFAULT_DECODER = "reduced"
+EXIF_ORIENTATION = 0x0112
+
+decoders = {}
+
+def register_decoder(name):
+    def register(decoder):
+        decoders[name] = decoder
+        return decoder
+    return register
+
+def _open(source):
+    return Image.open(source if isinstance(source, str) else io.BytesIO(source))
+
+def _orientation(img):
+    return img.getexif().get(EXIF_ORIENTATION, 1)
+
+def _oriented_size(img):
+    # Ориентации 5-8 поворачивают изображение на 90 градусов: ширина и высота меняются местами
+    width, height = img.size
+    if _orientation(img) in (5, 6, 7, 8):
+        return height, width
+    return width, height
+
+def _finish(img, original_size):
+    # exif_transpose копирует изображение даже без поворота, поэтому вызываем его только при необходимости
+    if _orientation(img) not in (None, 1):
+        img = ImageOps.exif_transpose(img)
+    img = img.convert("RGB")
+    img.info["original_size"] = original_size
+    return img
+
+@register_decoder("full")
+def decode_full(source, target_size=None):
+    img = _open(source)
+    return _finish(img, _oriented_size(img))
+
+@register_decoder("reduced")
+def decode_reduced(source, target_size=None):
+    img = _open(source)
+    original_size = _oriented_size(img)
+    if target_size:
+        # draft работает только для JPEG, остальные форматы декодируются целиком
+        img.draft("RGB", (target_size, target_size))
+    return _finish(img, original_size)
+
+@register_decoder("cv2")
+def decode_cv2(source, target_size=None):
+    import cv2
+    import numpy as np
+
+    if isinstance(source, str):
+        with open(source, 'rb') as file:
+            source = file.read()
+    with _open(source) as header:
+        original_size = _oriented_size(header)
+    flags = cv2.IMREAD_COLOR
+    if target_size:
+        shortest = min(original_size)
+        for factor, reduced_flags in ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                                      (2, cv2.IMREAD_REDUCED_COLOR_2)):
+            if shortest // factor >= target_size:
+                flags = reduced_flags
+                break
+    # cv2 сам применяет EXIF ориентацию
+    array = cv2.imdecode(np.frombuffer(source, dtype=np.uint8), flags)
+    if array is None:
+        raise ValueError("cv2 cannot decode image")
+    img = Image.fromarray(cv2.cvtColor(array, cv2.COLOR_BGR2RGB))
+    img.info["original_size"] = original_size
+    return img
+
+def decoder_name(name=None):
+    name = name or os.environ.get(DECODER_ENV) or DEFAULT_DECODER
+    if name not in decoders:
+        raise ValueError(f"Unknown image decoder {name!r}, expected one of {tuple(decoders)}")
+    return name
+
+def get_decoder(name=None):
+    return decoders[decoder_name(name)]
+
+def set_decoder(name):
+    get_decoder(name)
+    # Через окружение выбор доходит и до рабочих процессов backend/parallel.py
+    os.environ[DECODER_ENV] = name
+
+def decode_image(source, target_size=None, decoder=None):
+    # source: путь или байты. Возвращает RGB изображение не меньше target_size по каждой стороне
+    return get_decoder(decoder)(source, target_size)
+
+def original_size(img):
+    return img.info.get("original_size", img.size)
+
+def scale_box(xyxy, img):
+    # Рамка в координатах декодированного изображения -> в координатах оригинала
+    width, height = original_size(img)
+    scale_x, scale_y = width / img.width, height / img.height
+    x0, y0, x1, y1 = xyxy
+    return [x0 * scale_x, y0 * scale_y, x1 * scale_x, y1 * scale_y]
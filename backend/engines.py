@@ -0,0 +1,223 @@
+# backend/engines.py
+# Выбор движка инференса для каждой модели: PyTorch (.pt), ONNX Runtime или OpenVINO (в том числе INT8).
+# Экспортированные модели загружает тот же ultralytics.YOLO, поэтому predict и model.names не меняются.
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+ENGINES = ("torch", "onnx", "openvino")
+# Рамки детекторов совпадают, если у них одна метка и IoU не меньше порога
+PARITY_IOU = 0.5
+engines_config_path = os.path.join(os.path.dirname(__file__), '..', 'models', 'engines.json')
+
+_export_locks = {}
+_export_locks_lock = threading.Lock()
+
+# Пример models/engines.json:
+# {"classification": {"engine": "openvino", "int8": true, "calibration_data": "calibration/"},
+#  "detection": {"engine": "openvino", "int8": true, "calibration_data": "calibration/"}}
+# calibration_data - папка с примерами изображений (разметка для калибровки не нужна). Можно указать и готовый
+# датасет ultralytics: YAML для детекции или папку с train/ и val/ по классам для классификации
+def load_engine_config(model_role, path=engines_config_path):
+    if not os.path.isfile(path):
+        return {}
+    with open(path, 'r') as file:
+        config = json.load(file).get(model_role, {})
+    engine = config.get("engine", "torch")
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown inference engine {engine!r} for {model_role}, expected one of {ENGINES}")
+    return config
+
+def exported_model_path(model_path, engine, int8=False):
+    base_path = os.path.splitext(model_path)[0]
+    if engine == "torch":
+        return model_path
+    if engine == "onnx":
+        return f"{base_path}.onnx"
+    return f"{base_path}{'_int8' if int8 else ''}_openvino_model"
+
+def _is_stale(exported_path, model_path):
+    return not os.path.exists(exported_path) or os.path.getmtime(exported_path) < os.path.getmtime(model_path)
+
+def _link_or_copy(source, destination):
+    try:
+        os.symlink(os.path.abspath(source), destination)
+    except OSError:
+        # Windows без прав на символические ссылки
+        shutil.copy2(source, destination)
+
+def calibration_dataset(calibration_data, task, names, work_directory):
+    # ultralytics ждет для калибровки INT8 описание датасета, а не папку изображений: YAML для детекции,
+    # train/ и val/ с папками классов для классификации. Из папки примеров такое описание собирается в work_directory
+    from backend.archive import is_image
+
+    if os.path.isfile(calibration_data) and calibration_data.lower().endswith((".yaml", ".yml")):
+        return calibration_data
+    if not os.path.isdir(calibration_data):
+        raise ValueError(f"Calibration data must be a folder of sample images or a dataset YAML: {calibration_data}")
+    if task == "classify" and all(os.path.isdir(os.path.join(calibration_data, split)) for split in ("train", "val")):
+        return calibration_data
+
+    image_paths = sorted(os.path.join(root, name) for root, _, files in os.walk(calibration_data)
+                         for name in files if is_image(name))
+    if not image_paths:
+        raise ValueError(f"No images found in calibration data {calibration_data}")
+
+    if task == "classify":
+        # Для калибровки метки не важны: все примеры кладутся в папку первого класса, остальные папки пустые
+        dataset_path = os.path.join(work_directory, "calibration")
+        for split in ("train", "val"):
+            for label in sorted(names):
+                os.makedirs(os.path.join(dataset_path, split, str(names[label])))
+            for index, image_path in enumerate(image_paths):
+                destination = os.path.join(dataset_path, split, str(names[min(names)]),
+                                           f"{index:06d}_{os.path.basename(image_path)}")
+                _link_or_copy(image_path, destination)
+        return dataset_path
+
+    dataset_path = os.path.join(work_directory, "calibration.yaml")
+    with open(dataset_path, "w", encoding="utf-8") as file:
+        # Формат YAML ultralytics; json.dumps дает корректные строки YAML с экранированием
+        file.write(f"path: {json.dumps(os.path.abspath(calibration_data))}\ntrain: .\nval: .\nnames:\n")
+        for label in sorted(names):
+            file.write(f"  {label}: {json.dumps(str(names[label]))}\n")
+    return dataset_path
+
+def export_model(model_path, engine, int8=False, calibration_data=None, imgsz=544):
+    if engine not in ENGINES or engine == "torch":
+        raise ValueError(f"Cannot export to {engine!r}")
+    if int8 and engine != "openvino":
+        raise ValueError("INT8 quantization is only supported for the openvino engine")
+    if int8 and not calibration_data:
+        raise ValueError("INT8 quantization requires calibration_data")
+
+    from ultralytics import YOLO
+
+    target_path = exported_model_path(model_path, engine, int8)
+    options = dict(format=engine, imgsz=imgsz)
+
+    # Экспорт идет во временную папку рядом с целью и переносится одним os.replace:
+    # другой процесс не загрузит недописанную модель
+    work_directory = tempfile.mkdtemp(prefix=".export-", dir=os.path.dirname(os.path.abspath(target_path)))
+    try:
+        work_model_path = os.path.join(work_directory, os.path.basename(model_path))
+        # copy2 сохраняет mtime, поэтому экспортированная модель не выглядит устаревшей
+        shutil.copy2(model_path, work_model_path)
+        model = YOLO(work_model_path)
+        if int8:
+            # Калибровка INT8 выполняется NNCF на примерах из calibration_data
+            options.update(int8=True, data=calibration_dataset(calibration_data, model.task, dict(model.names),
+                                                               work_directory))
+        exported_path = str(model.export(**options))
+        if os.path.isdir(target_path):
+            shutil.rmtree(target_path)
+        os.replace(exported_path, target_path)
+    finally:
+        shutil.rmtree(work_directory, ignore_errors=True)
+    logger.info(f"Exported {os.path.basename(model_path)} to {target_path}")
+    return target_path
+
+def _export_lock(target_path):
+    with _export_locks_lock:
+        return _export_locks.setdefault(os.path.abspath(target_path), threading.Lock())
+
+def resolve_model_path(model_path, engine="torch", int8=False, calibration_data=None, imgsz=544):
+    target_path = exported_model_path(model_path, engine, int8)
+    if engine == "torch":
+        return target_path
+    # Прогрев моделей и первая задача могут одновременно найти устаревший экспорт: экспортирует только один,
+    # второй после ожидания видит свежую модель
+    with _export_lock(target_path):
+        # Экспорт повторяется, если .pt файл новее экспортированной модели
+        if _is_stale(target_path, model_path):
+            export_model(model_path, engine, int8, calibration_data, imgsz)
+    return target_path
+
+def check_parity(reference_model, candidate_model, image_paths, batch_size=16, task="classify"):
+    if dict(reference_model.names) != dict(candidate_model.names):
+        raise ValueError("Candidate model labels differ from the reference model")
+    if task == "detect":
+        return _detection_parity(reference_model, candidate_model, image_paths, batch_size)
+    return _classification_parity(reference_model, candidate_model, image_paths, batch_size)
+
+def _classification_parity(reference_model, candidate_model, image_paths, batch_size):
+    from backend.inference import process_images_classification
+
+    _, reference_results = process_images_classification(reference_model, image_paths, batch_size=batch_size,
+                                                         use_cache=False)
+    _, candidate_results = process_images_classification(candidate_model, image_paths, batch_size=batch_size,
+                                                         use_cache=False)
+    candidate_by_path = {image_data["image"]: image_data["classes"] for image_data in candidate_results}
+
+    compared = 0
+    agreed = 0
+    confidence_delta = 0.0
+    for image_data in reference_results:
+        candidate_classes = candidate_by_path.get(image_data["image"])
+        if not image_data["classes"] or not candidate_classes:
+            continue
+        reference_label, reference_confidence = image_data["classes"][0]
+        candidate_label, candidate_confidence = candidate_classes[0]
+        compared += 1
+        agreed += reference_label == candidate_label
+        confidence_delta += abs(reference_confidence - candidate_confidence)
+
+    report = {
+        "images": compared,
+        "top1_agreement": agreed / compared if compared else 0.0,
+        "mean_confidence_delta": confidence_delta / compared if compared else 0.0,
+    }
+    logger.info(f"Parity check on {compared} images: top-1 agreement {report['top1_agreement']:.2%}, "
+                f"mean confidence delta {report['mean_confidence_delta']:.4f}")
+    return report
+
+def _box_iou(first, second):
+    x0, y0 = max(first[0], second[0]), max(first[1], second[1])
+    x1, y1 = min(first[2], second[2]), min(first[3], second[3])
+    intersection = max(0.0, x1 - x0) * max(0.0, y1 - y0)
+    union = ((first[2] - first[0]) * (first[3] - first[1]) + (second[2] - second[0]) * (second[3] - second[1])
+             - intersection)
+    return intersection / union if union > 0 else 0.0
+
+def _detection_parity(reference_model, candidate_model, image_paths, batch_size):
+    from backend.inference import iter_images_detection
+
+    candidate_by_path = {image_data["image"]: image_data["detections"] for image_data in
+                         iter_images_detection(candidate_model, image_paths, batch_size=batch_size, use_cache=False)}
+
+    compared = 0
+    boxes = 0
+    matched = 0
+    iou_total = 0.0
+    for image_data in iter_images_detection(reference_model, image_paths, batch_size=batch_size, use_cache=False):
+        candidate_detections = candidate_by_path.get(image_data["image"])
+        if candidate_detections is None:
+            continue
+        compared += 1
+        # Лишняя или пропущенная рамка у любой из моделей считается расхождением
+        boxes += max(len(image_data["detections"]), len(candidate_detections))
+        unmatched = list(candidate_detections)
+        for detection in image_data["detections"]:
+            best_iou, best_index = max(((_box_iou(detection["xyxy"], candidate["xyxy"]), index)
+                                        for index, candidate in enumerate(unmatched)
+                                        if candidate["label"] == detection["label"]), default=(0.0, None))
+            if best_iou >= PARITY_IOU:
+                matched += 1
+                iou_total += best_iou
+                unmatched.pop(best_index)
+
+    report = {
+        "images": compared,
+        "boxes": boxes,
+        "box_agreement": matched / boxes if boxes else 1.0,
+        "mean_iou": iou_total / matched if matched else 0.0,
+    }
+    logger.info(f"Parity check on {compared} images: box agreement {report['box_agreement']:.2%} "
+                f"({matched} of {boxes} boxes), mean IoU {report['mean_iou']:.4f}")
+    return report
@@ -1,125 +1,972 @@
 # backend/inference.py
 
-import zipfile
 import os
-from ultralytics import YOLO
-from PIL import Image, ImageFile, UnidentifiedImageError
-import cv2
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from PIL import ImageFile, UnidentifiedImageError
 import numpy as np
+import psutil
+from backend.archive import iter_archive_images
+from backend.bursts import group_bursts, image_signature, pick_representatives
+from backend.cache import get_result_cache, weights_hash, weights_signature
+from backend.decode import decode_image, decoder_name, scale_box
+from backend.engines import load_engine_config, resolve_model_path
+from backend.thumbnails import get_thumbnail_cache, store_thumbnail
+from backend.timing import RunStats
+
+logger = logging.getLogger(__name__)
 
 model_directory = os.path.join(os.path.dirname(__file__), '..', 'models')
 detection_model_path = os.path.join(model_directory, 'best_detect_world.pt')
 classification_model_path = os.path.join(model_directory, 'best_clasify.pt')
 
-detection_model = YOLO(detection_model_path)
-classification_model = YOLO(classification_model_path)
 ImageFile.LOAD_TRUNCATED_IMAGES = True
 
-def run_inference(model, img, stop_event=None):
-    results = model.predict(source=img, imgsz=544)
+IMGSZ = 544
+BATCH_SIZE = 16
+DECODE_WORKERS = min(4, os.cpu_count() or 1)
+DETECTION_CONFIDENCE = 0.25
+# Детекции в кэше хранятся вместе с уверенностью в координатах оригинала с учетом EXIF поворота;
+# записи старых форматов ("detect", "detect_boxes") вытесняются по LRU
+DETECTION_CACHE_TASK = "detect_boxes_oriented"
+CLASSIFICATION_CACHE_TASK = "classify"
+CROP_PADDING = 0.1
+# Каскад: быстрый проход в низком разрешении, полная модель только для неуверенных изображений.
+# Порог совпадает с верхней границей диапазона ручной проверки (REVIEW_MAX_CONFIDENCE)
+CASCADE_THRESHOLD = 0.55
+CASCADE_IMGSZ = 224
+# Доля уверенных изображений, которые все равно проверяются полной моделью для оценки расхождения
+CASCADE_AUDIT_FRACTION = 0.05
+
+# Модели (и torch вместе с ними) загружаются при первом обращении, а не при импорте модуля
+_models = {}
+_models_lock = threading.Lock()
+_first_prediction_logged = False
+
+def seconds_since_start():
+    return time.time() - psutil.Process().create_time()
+
+def _weights_signature(model_path):
+    try:
+        return weights_signature(model_path)
+    except OSError:
+        # Веса не из файла (например, скачиваются ultralytics по имени): такая модель не кэшируется
+        return None
+
+def load_model(model_path, task=None):
+    with _models_lock:
+        model = _models.get(model_path)
+        signature = _weights_signature(model_path)
+        if model is not None and model.weights_signature != signature:
+            # Файл весов заменили (новая версия модели, повторный экспорт движка): загружаем заново
+            logger.info(f"Weights of {os.path.basename(model_path)} changed on disk, reloading the model")
+            model = None
+        if model is None:
+            from ultralytics import YOLO
+            start = time.perf_counter()
+            model_hash = weights_hash(model_path) if signature is not None else None
+            model = YOLO(model_path, task=task)
+            # Путь к весам нужен кэшу результатов и рабочим процессам, в том числе для ONNX/OpenVINO моделей
+            model.weights_path = model_path
+            model.weights_signature = signature
+            # Ключи кэша строятся из хэша весов, загруженных в этот объект, а не из текущего файла на диске.
+            # Если файл заменили во время загрузки, неизвестно, какие веса загружены: кэш для объекта отключается
+            model.weights_hash = model_hash if _weights_signature(model_path) == signature else None
+            _models[model_path] = model
+            logger.info(f"Loaded model {os.path.basename(model_path)} in {time.perf_counter() - start:.2f}s")
+        return model
+
+def model_weights_path(model):
+    return getattr(model, "weights_path", None) or getattr(model, "ckpt_path", None)
+
+def model_weights_hash(model):
+    return getattr(model, "weights_hash", None)
+
+def _load_configured_model(model_role, model_path, task):
+    # Движок (torch, onnx, openvino, INT8) задается для каждой модели в models/engines.json
+    config = load_engine_config(model_role)
+    engine_path = resolve_model_path(model_path, config.get("engine", "torch"), config.get("int8", False),
+                                     config.get("calibration_data"), IMGSZ)
+    return load_model(engine_path, task)
+
+def get_detection_model():
+    return _load_configured_model("detection", detection_model_path, "detect")
+
+def get_classification_model():
+    return _load_configured_model("classification", classification_model_path, "classify")
+
+def __getattr__(name):
+    # Совместимость со старым доступом через backend.inference.classification_model
+    if name == "detection_model":
+        return get_detection_model()
+    if name == "classification_model":
+        return get_classification_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def warm_up_models():
+    blank = np.zeros((IMGSZ, IMGSZ, 3), dtype=np.uint8)
+    for get_model in (get_classification_model, get_detection_model):
+        try:
+            start = time.perf_counter()
+            model = get_model()
+            model.predict(source=blank, imgsz=IMGSZ, verbose=False)
+            logger.info(f"Warmed up {os.path.basename(model_weights_path(model))} in {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            logger.error(f"Error warming up model: {e}")
+
+def start_warm_up():
+    thread = threading.Thread(target=warm_up_models, name="model-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+def _record_model_speed(stats, results):
+    # ultralytics сам замеряет предобработку, прямой проход и постобработку каждого изображения (в мс)
+    for result in results:
+        speed = getattr(result, "speed", None)
+        if speed:
+            stats.add("model_preprocess", speed.get("preprocess", 0.0) / 1000)
+            stats.add("model_forward", speed.get("inference", 0.0) / 1000)
+            stats.add("model_postprocess", speed.get("postprocess", 0.0) / 1000)
+
+def run_inference(model, img, stop_event=None, stats=None, imgsz=IMGSZ):
+    global _first_prediction_logged
+    if stats is None:
+        results = model.predict(source=img, imgsz=imgsz)
+    else:
+        with stats.stage("model_predict", len(img) if isinstance(img, list) else 1):
+            results = model.predict(source=img, imgsz=imgsz)
+        _record_model_speed(stats, results)
+    if not _first_prediction_logged:
+        _first_prediction_logged = True
+        logger.info(f"Time to first prediction: {seconds_since_start():.2f}s since process start")
     if stop_event and stop_event.is_set():
         raise InterruptedError("Inference was stopped.")
     return results
 
-def process_image_detection(model, image_path, stop_event=None):
-    img = Image.open(image_path).convert("RGB")
-    outputs = run_inference(model, img, stop_event)
+def _result_cache_for(model):
+    # Кэшируем только модели, загруженные через load_model из файла весов: хэш весов входит в ключ кэша
+    model_hash = model_weights_hash(model)
+    if not model_hash:
+        return None, None
+    try:
+        return get_result_cache(), model_hash
+    except Exception as e:
+        logger.error(f"Result cache is unavailable: {e}")
+        return None, None
 
-    detections = []
+# Кэш результатов - только ускорение: ошибка SQLite (база заблокирована другим процессом, диск заполнен)
+# не прерывает запуск, изображение обрабатывается моделью, а результат просто не попадает в кэш
+_CACHE_ERROR = object()
+
+def _read_cache(cache, cache_key, stats):
+    try:
+        return cache.get(cache_key)
+    except sqlite3.Error as e:
+        stats.count("cache_errors")
+        logger.warning(f"Result cache lookup failed, continuing without the cache: {e}")
+        return _CACHE_ERROR
 
+def _write_cache(cache, entries, stats):
+    with stats.stage("cache_write"):
+        try:
+            cache.put_many(entries)
+        except sqlite3.Error as e:
+            stats.count("cache_errors")
+            logger.warning(f"Result cache write failed, {len(entries)} results are not cached: {e}")
+
+def process_image_detection(model, image_path, stop_event=None, use_cache=True, stats=None, thumbnails=False):
+    stats = stats if stats is not None else RunStats()
+    with stats.stage("read"):
+        with open(image_path, 'rb') as file:
+            data = file.read()
+    with stats.stage("decode"):
+        img = decode_image(data, IMGSZ)
+    thumbnail_cache = _thumbnail_cache(thumbnails)
+    if thumbnail_cache is not None:
+        _store_thumbnail(image_path, img, thumbnail_cache, stats)
+
+    cache, model_hash = _result_cache_for(model) if use_cache else (None, None)
+    cache_key = None
+    if cache is not None:
+        with stats.stage("cache_lookup"):
+            cache_key = cache.make_key(_cache_task(DETECTION_CACHE_TASK), model_hash, IMGSZ, data)
+            cached = _read_cache(cache, cache_key, stats)
+            if cached is _CACHE_ERROR:
+                cache_key = cached = None
+        if cached is not None:
+            stats.count("cache_hits")
+            return img, [(xyxy, label_name) for xyxy, label_name, _ in cached]
+        stats.count("cache_misses")
+
+    outputs = run_inference(model, img, stop_event, stats)
+
+    detections = []
     for result in outputs:
-        boxes = result.boxes
-        if boxes is not None:
-            for box in boxes:
-                label = int(box.cls)
-                label_name = model.names[label]
-                xyxy = box.xyxy[0].tolist()
-                detections.append((xyxy, label_name))
+        detections.extend(result_detections(model, result, img))
+
+    if cache_key is not None:
+        _write_cache(cache, [(cache_key, detections)], stats)
 
-    return img, detections
+    return img, [(xyxy, label_name) for xyxy, label_name, _ in detections]
 
-def process_images_classification(model, image_paths, stop_event=None):
+def result_detections(model, result, img=None):
+    # Модель видит уменьшенное при декодировании изображение, рамки возвращаются в координатах оригинала
+    detections = []
+    boxes = result.boxes
+    if boxes is not None:
+        for box in boxes:
+            label = int(box.cls)
+            label_name = model.names[label]
+            xyxy = box.xyxy[0].tolist()
+            if img is not None:
+                xyxy = scale_box(xyxy, img)
+            detections.append((xyxy, label_name, float(box.conf)))
+    return detections
+
+def _detection_data(image_path, detections, class_counts):
+    image_data = {"image": image_path, "detections": [], "classes": []}
+    for xyxy, label_name, confidence in detections:
+        image_data["detections"].append({"xyxy": list(xyxy), "label": label_name, "confidence": confidence})
+        image_data["classes"].append((label_name, confidence))
+        class_counts[label_name] = class_counts.get(label_name, 0) + 1
+    return image_data
+
+def _cached_detection(image_path, cached, stats):
+    return _detection_data(image_path, cached, {})
+
+def _iter_detected_chunks(model, sources, *, stop_event=None, batch_size=BATCH_SIZE, num_workers=DECODE_WORKERS,
+                          use_cache=True, progress_callback=None, stats=None, thumbnails=False):
+    # Детекция батчами; после каждого батча отдает (счетчики батча, результаты батча)
+    return _iter_inferred_chunks(model, sources, infer=partial(_infer_results, model, "detect"),
+                                 from_cache=_cached_detection, task=DETECTION_CACHE_TASK, stop_event=stop_event,
+                                 batch_size=batch_size, num_workers=num_workers, use_cache=use_cache,
+                                 progress_callback=progress_callback, stats=stats, thumbnails=thumbnails)
+
+def collect_chunks(chunks, result_callback=None):
+    # Накопление результатов для функций, возвращающих весь запуск целиком
     class_counts = {}
-    image_classifications = []
+    image_results = []
+    try:
+        for chunk_counts, chunk_results in chunks:
+            _merge_counts(class_counts, chunk_counts)
+            image_results.extend(chunk_results)
+            # Результаты готового батча отдаются сразу, например для сохранения контрольной точки
+            if result_callback is not None:
+                result_callback(chunk_counts, chunk_results)
+    finally:
+        chunks.close()
+    return class_counts, image_results
 
-    for image_path in image_paths:
-        if stop_event and stop_event.is_set():
-            raise InterruptedError("Inference was stopped.")
+def iter_results(chunks, class_counts=None):
+    # Результаты по одному изображению; class_counts обновляется перед отдачей каждого изображения,
+    # поэтому в любой момент соответствует уже отданным результатам
+    chunks = iter(chunks)
+    try:
+        for _, chunk_results in chunks:
+            for image_data in chunk_results:
+                if class_counts is not None:
+                    for label_name, _ in image_data["classes"]:
+                        class_counts[label_name] = class_counts.get(label_name, 0) + 1
+                yield image_data
+    finally:
+        # Потребитель может прекратить чтение раньше: останавливаем декодирование и рабочие процессы
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
 
-        try:
-            img = Image.open(image_path).convert("RGB")
-        except UnidentifiedImageError:
-            print(f"Cannot identify image file {image_path}, skipping.")
-            continue
-        except Exception as e:
-            print(f"Error loading image {image_path}: {e}")
-            continue
+def iter_images_detection(model, image_paths, stop_event=None, batch_size=BATCH_SIZE, num_workers=DECODE_WORKERS,
+                          use_cache=True, progress_callback=None, stats=None, thumbnails=False, class_counts=None):
+    sources = ((image_path, None) for image_path in image_paths)
+    return iter_results(_iter_detected_chunks(model, sources, stop_event=stop_event, batch_size=batch_size,
+                                              num_workers=num_workers, use_cache=use_cache,
+                                              progress_callback=progress_callback, stats=stats,
+                                              thumbnails=thumbnails), class_counts)
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _load_image(image_path, data=None, stats=None, thumbnails=None, decoder=None):
+    # JPEG декодируется сразу в масштабе, близком к IMGSZ (см. backend/decode.py)
+    try:
+        if stats is None:
+            img = decode_image(image_path if data is None else data, IMGSZ, decoder)
+        else:
+            with stats.stage("decode"):
+                img = decode_image(image_path if data is None else data, IMGSZ, decoder)
+    except UnidentifiedImageError:
+        logger.warning(f"Cannot identify image file {image_path}, skipping.")
+        return None
+    except Exception as e:
+        logger.warning(f"Error loading image {image_path}: {e}")
+        return None
+    if thumbnails is not None:
+        _store_thumbnail(image_path, img, thumbnails, stats)
+    return img
+
+def _store_thumbnail(image_path, img, thumbnails, stats=None):
+    # Миниатюра делается из уже декодированного изображения, окна просмотра не декодируют оригинал заново
+    try:
+        if stats is None:
+            store_thumbnail(image_path, img, thumbnails)
+        else:
+            with stats.stage("thumbnail"):
+                store_thumbnail(image_path, img, thumbnails)
+    except sqlite3.Error as e:
+        # Как и кэш результатов, хранилище миниатюр не должно прерывать запуск
+        if stats is not None:
+            stats.count("thumbnail_cache_errors")
+        logger.warning(f"Thumbnail cache write failed for {image_path}, continuing without it: {e}")
+    except Exception as e:
+        logger.warning(f"Cannot store thumbnail for {image_path}: {e}")
 
+def _thumbnail_cache(thumbnails):
+    if not thumbnails:
+        return None
+    try:
+        return get_thumbnail_cache()
+    except Exception as e:
+        logger.error(f"Thumbnail cache is unavailable: {e}")
+        return None
+
+def _cache_task(task, decoder=None):
+    # Декодер меняет пиксели, которые видит модель (уменьшенный JPEG, cv2, полное разрешение),
+    # поэтому входит в ключ кэша; записи без декодера в ключе вытесняются по LRU
+    return f"{task}:{decoder_name(decoder)}"
+
+def _load_source(image_path, data=None, task=None, cache=None, model_hash=None, stats=None, thumbnails=None,
+                 decoder=None):
+    # Возвращает (изображение, ключ кэша, результат из кэша); при попадании в кэш изображение не декодируется
+    if cache is None:
+        return _load_image(image_path, data, stats, thumbnails, decoder), None, None
+    try:
+        if data is None:
+            with stats.stage("read"):
+                with open(image_path, 'rb') as file:
+                    data = file.read()
+    except OSError as e:
+        logger.warning(f"Error loading image {image_path}: {e}")
+        return None, None, None
+
+    with stats.stage("cache_lookup"):
+        cache_key = cache.make_key(_cache_task(task, decoder), model_hash, IMGSZ, data)
+        cached = _read_cache(cache, cache_key, stats)
+    if cached is _CACHE_ERROR:
+        return _load_image(image_path, data, stats, thumbnails, decoder), None, None
+    if cached is not None:
+        stats.count("cache_hits")
+        return None, cache_key, cached
+    stats.count("cache_misses")
+    return _load_image(image_path, data, stats, thumbnails, decoder), cache_key, None
+
+def _iter_loaded_images(sources, load=_load_source, num_workers=DECODE_WORKERS, prefetch=2 * BATCH_SIZE):
+    if num_workers <= 1:
+        for image_path, data in sources:
+            yield image_path, load(image_path, data)
+        return
+
+    # Декодирование идет в пуле потоков на prefetch изображений вперед, порядок сохраняется
+    executor = ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="image-decode")
+    pending = deque()
+    try:
+        for image_path, data in sources:
+            pending.append((image_path, executor.submit(load, image_path, data)))
+            if len(pending) >= prefetch:
+                image_path, future = pending.popleft()
+                yield image_path, future.result()
+        while pending:
+            image_path, future = pending.popleft()
+            yield image_path, future.result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def _timed_iter(iterable, stats, name):
+    # Время, которое основной поток ждет следующий элемент (например, декодирования)
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
         try:
-            outputs = run_inference(model, img, stop_event)
-        except Exception as e:
-            print(f"Error running inference on image {image_path}: {e}")
+            item = next(iterator)
+        except StopIteration:
+            return
+        stats.add(name, time.perf_counter() - start)
+        yield item
+
+def predict_batch(model, batch, stop_event=None, stats=None, imgsz=IMGSZ):
+    # [(путь, изображение)] -> [(путь, результат модели или None, если изображение не обработано)]
+    images = [img for _, img in batch]
+    try:
+        outputs = run_inference(model, images, stop_event=stop_event, stats=stats, imgsz=imgsz)
+    except InterruptedError:
+        raise
+    except Exception as e:
+        # Одно битое изображение не должно ронять весь батч
+        logger.warning(f"Error running batch inference, retrying images one by one: {e}")
+        outputs = []
+        for image_path, img in batch:
+            try:
+                outputs.append(run_inference(model, img, stop_event=stop_event, stats=stats, imgsz=imgsz)[0])
+            except InterruptedError:
+                raise
+            except Exception as e:
+                logger.exception(f"Error running inference on image {image_path}: {e}")
+                outputs.append(None)
+
+    return [(image_path, result) for (image_path, _), result in zip(batch, outputs)]
+
+def _classification_data(model, image_path, result, class_counts):
+    image_data = {"image": image_path, "classes": []}
+    if result.probs is not None:
+        label = int(result.probs.top1)
+        label_name = model.names[label]
+        top1conf = result.probs.top1conf.item()
+        class_counts[label_name] = class_counts.get(label_name, 0) + 1
+        image_data["classes"].append((label_name, top1conf))
+    return image_data
+
+def _merge_counts(class_counts, new_class_counts):
+    for label_name, count in new_class_counts.items():
+        class_counts[label_name] = class_counts.get(label_name, 0) + count
+
+def _iter_inferred_chunks(model, sources, *, infer, from_cache, task, stop_event=None, batch_size=BATCH_SIZE,
+                          num_workers=DECODE_WORKERS, use_cache=True, progress_callback=None, stats=None,
+                          thumbnails=False):
+    # Общий цикл для классификации, детекции и каскада: декодирование с опережением, кэш, батчи, остановка.
+    # infer(batch, stop_event, stats) возвращает для каждого изображения батча (image_data, значение для кэша);
+    # image_data None - изображение не обработано, значение None - в кэш не пишется.
+    # from_cache(image_path, cached, stats) собирает image_data из попадания в кэш
+    batch_size = max(1, batch_size)
+    stats = stats if stats is not None else RunStats()
+
+    cache, model_hash = _result_cache_for(model) if use_cache else (None, None)
+    load = partial(_load_source, task=task, cache=cache, model_hash=model_hash, stats=stats,
+                   thumbnails=_thumbnail_cache(thumbnails))
+
+    loaded_images = _iter_loaded_images(sources, load, num_workers, prefetch=2 * batch_size)
+    try:
+        for chunk in chunked(_timed_iter(loaded_images, stats, "decode_wait"), batch_size):
+            if stop_event and stop_event.is_set():
+                raise InterruptedError("Inference was stopped.")
+
+            stats.count("images", len(chunk))
+            stats.count("batches")
+            batch = [(image_path, img) for image_path, (img, _, _) in chunk if img is not None]
+            outputs = iter(infer(batch, stop_event, stats) if batch else ())
+            new_cache_entries = []
+            chunk_counts = {}
+            chunk_results = []
+
+            for image_path, (img, cache_key, cached) in chunk:
+                if cached is not None:
+                    image_data = from_cache(image_path, cached, stats)
+                elif img is None:
+                    stats.count("failed_images")
+                    continue
+                else:
+                    image_data, cache_value = next(outputs)
+                    if image_data is None:
+                        stats.count("failed_images")
+                        continue
+                    if cache_key is not None and cache_value is not None:
+                        new_cache_entries.append((cache_key, cache_value))
+                for label_name, _ in image_data["classes"]:
+                    chunk_counts[label_name] = chunk_counts.get(label_name, 0) + 1
+                chunk_results.append(image_data)
+
+            if new_cache_entries:
+                _write_cache(cache, new_cache_entries, stats)
+            yield chunk_counts, chunk_results
+            if progress_callback is not None:
+                progress_callback(len(chunk))
+    finally:
+        loaded_images.close()
+
+def _infer_results(model, task, batch, stop_event, stats):
+    outputs = []
+    results = predict_batch(model, batch, stop_event=stop_event, stats=stats)
+    for (_, img), (image_path, result) in zip(batch, results):
+        outputs.append((None, None) if result is None else result_data(model, task, image_path, result, img))
+    return outputs
+
+def _cached_classification(image_path, cached, stats):
+    return {"image": image_path, "classes": [tuple(class_data) for class_data in cached]}
+
+# Строительные блоки для других модулей (сервис инференса, клиент, пул процессов): через них те же кэш
+# и формат результатов, что и у локальных циклов. task - "classify" или "detect"
+_CACHE_TASKS = {"classify": CLASSIFICATION_CACHE_TASK, "detect": DETECTION_CACHE_TASK}
+
+def source_loader(model, task, use_cache=True, stats=None, thumbnails=False):
+    # Функция (путь, байты или None) -> (изображение, ключ кэша, результат из кэша);
+    # при попадании в кэш изображение не декодируется, ключ нужен для write_cache после инференса
+    cache, model_hash = _result_cache_for(model) if use_cache else (None, None)
+    return partial(_load_source, task=_CACHE_TASKS[task], cache=cache, model_hash=model_hash,
+                   stats=stats if stats is not None else RunStats(), thumbnails=_thumbnail_cache(thumbnails))
+
+def result_data(model, task, image_path, result, img=None):
+    # Результат модели для одного изображения -> (image_data, значение для кэша)
+    if task == "detect":
+        detections = result_detections(model, result, img)
+        return _detection_data(image_path, detections, {}), detections
+    image_data = _classification_data(model, image_path, result, {})
+    return image_data, image_data["classes"]
+
+def cached_data(task, image_path, cached):
+    if task == "detect":
+        return _cached_detection(image_path, cached, None)
+    return _cached_classification(image_path, cached, None)
+
+def write_cache(entries, stats=None):
+    # entries - [(ключ кэша из source_loader, значение для кэша из result_data)]
+    stats = stats if stats is not None else RunStats()
+    try:
+        cache = get_result_cache()
+    except Exception as e:
+        logger.error(f"Result cache is unavailable: {e}")
+        return
+    _write_cache(cache, entries, stats)
+
+def iter_classified_chunks(model, sources, *, stop_event=None, batch_size=BATCH_SIZE, num_workers=DECODE_WORKERS,
+                           use_cache=True, progress_callback=None, stats=None, thumbnails=False):
+    # Классификация источников (путь, байты или None) батчами; отдает (счетчики батча, результаты батча)
+    return _iter_inferred_chunks(model, sources, infer=partial(_infer_results, model, "classify"),
+                                 from_cache=_cached_classification, task=CLASSIFICATION_CACHE_TASK,
+                                 stop_event=stop_event, batch_size=batch_size, num_workers=num_workers,
+                                 use_cache=use_cache, progress_callback=progress_callback, stats=stats,
+                                 thumbnails=thumbnails)
+
+def skip_sources(sources, skip, progress_callback=None):
+    # Изображения, обработанные до прерывания запуска, пропускаются без декодирования и инференса
+    for source in sources:
+        if source[0] in skip:
+            if progress_callback is not None:
+                progress_callback(1)
             continue
+        yield source
 
-        image_data = {"image": image_path, "classes": []}
+def _iter_classification(model, sources, *, stop_event=None, batch_size=BATCH_SIZE, num_workers=DECODE_WORKERS,
+                         use_cache=True, progress_callback=None, num_processes=1, stats=None, skip=None,
+                         thumbnails=False):
+    if skip:
+        sources = skip_sources(sources, skip, progress_callback)
+    model_path = model_weights_path(model)
+    if num_processes > 1 and model_path:
+        from backend.parallel import iter_sources_parallel
+        return iter_sources_parallel(model_path, sources, stop_event=stop_event, num_processes=num_processes,
+                                     batch_size=batch_size, num_workers=max(1, num_workers // num_processes),
+                                     use_cache=use_cache, progress_callback=progress_callback, stats=stats,
+                                     thumbnails=thumbnails)
+    if num_processes > 1:
+        logger.warning("Model has no weight file to load in worker processes, running in a single process")
+    return iter_classified_chunks(model, sources, stop_event=stop_event, batch_size=batch_size,
+                                  num_workers=num_workers, use_cache=use_cache, progress_callback=progress_callback,
+                                  stats=stats, thumbnails=thumbnails)
 
-        for result in outputs:
-            if result.probs is not None:
-                label = int(result.probs.top1)
-                label_name = model.names[label]
-                top1conf = result.probs.top1conf.item()
-                class_counts[label_name] = class_counts.get(label_name, 0) + 1
-                image_data["classes"].append((label_name, top1conf))
+def _run_classification(model, sources, *, result_callback=None, **options):
+    # options - аргументы _iter_classification
+    return collect_chunks(_iter_classification(model, sources, **options), result_callback)
 
+def _timed_signature(image_path, data=None, stats=None, use_mtime=False):
+    with stats.stage("burst_signature"):
+        return image_signature(image_path, data, use_mtime)
+
+def _classify_bursts(model, make_sources, *, stop_event=None, batch_size=BATCH_SIZE, num_workers=DECODE_WORKERS,
+                     use_cache=True, progress_callback=None, num_processes=1, representatives=1, stats=None,
+                     result_callback=None, skip=None, thumbnails=False, use_mtime=False):
+    stats = stats if stats is not None else RunStats()
+    # Первый проход: время съемки и хэш каждого кадра, без полного декодирования
+    signatures = []
+    loaded_signatures = _iter_loaded_images(make_sources(),
+                                            partial(_timed_signature, stats=stats, use_mtime=use_mtime), num_workers,
+                                            prefetch=4 * batch_size)
+    try:
+        for image_path, signature in loaded_signatures:
+            if stop_event and stop_event.is_set():
+                raise InterruptedError("Inference was stopped.")
+            if signature is not None:
+                signatures.append((image_path, *signature))
+    finally:
+        loaded_signatures.close()
+
+    bursts = group_bursts(signatures)
+    burst_of = {}
+    representative_paths = set()
+    for burst_id, burst in enumerate(bursts):
+        for index in burst:
+            burst_of[index] = burst_id
+        representative_paths.update(signatures[index][0] for index in pick_representatives(burst, representatives))
+
+    # Второй проход: модель запускается только на представителях серий
+    sources = (source for source in make_sources() if source[0] in representative_paths)
+    _, representative_results = _run_classification(model, sources, stop_event=stop_event, batch_size=batch_size,
+                                                    num_workers=num_workers, use_cache=use_cache,
+                                                    progress_callback=progress_callback,
+                                                    num_processes=num_processes, stats=stats, thumbnails=thumbnails)
+    results_by_path = {image_data["image"]: image_data for image_data in representative_results}
+
+    burst_labels = {}
+    for burst_id, burst in enumerate(bursts):
+        classified = [results_by_path[signatures[index][0]] for index in burst
+                      if signatures[index][0] in results_by_path and results_by_path[signatures[index][0]]["classes"]]
+        if classified:
+            burst_labels[burst_id] = max(classified, key=lambda image_data: image_data["classes"][0][1])
+
+    class_counts = {}
+    image_classifications = []
+    for index, (image_path, _, _) in enumerate(signatures):
+        # Серии пересчитываются целиком (для группировки нужны все кадры), но уже сохраненные кадры не повторяются
+        if skip and image_path in skip:
+            continue
+        burst_id = burst_of[index]
+        if image_path in results_by_path:
+            image_data = results_by_path[image_path]
+        elif burst_id in burst_labels:
+            best = burst_labels[burst_id]
+            image_data = {"image": image_path, "classes": list(best["classes"]), "propagated_from": best["image"]}
+        else:
+            continue
+        image_data["burst"] = burst_id
+        for label_name, _ in image_data["classes"]:
+            class_counts[label_name] = class_counts.get(label_name, 0) + 1
         image_classifications.append(image_data)
 
+    stats.count("burst_images", len(signatures))
+    stats.count("bursts", len(bursts))
+    stats.count("burst_propagated_images", len(signatures) - len(representative_paths))
+    if progress_callback is not None:
+        progress_callback(len(signatures) - len(representative_paths))
+    logger.info(f"Burst grouping: {len(signatures)} images in {len(bursts)} bursts, "
+                f"model ran on {len(representative_paths)} images")
+    if result_callback is not None:
+        result_callback(class_counts, image_classifications)
     return class_counts, image_classifications
 
-def process_video(model, video_path, stop_event=None):
-    cap = cv2.VideoCapture(video_path)
-    while cap.isOpened():
-        if stop_event and stop_event.is_set():
-            raise InterruptedError("Процесс предсказания модели был прерван!.")
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-        outputs = run_inference(model, img, stop_event)
-        draw = ImageDraw.Draw(img)
-        detections = []
-
-        if not outputs:
-            print("No outputs from model")
+def iter_images_classification(model, image_paths, stop_event=None, batch_size=BATCH_SIZE,
+                               num_workers=DECODE_WORKERS, use_cache=True, progress_callback=None, num_processes=1,
+                               stats=None, skip=None, thumbnails=False, class_counts=None):
+    # Результаты отдаются по мере готовности батчей, память не растет с числом изображений.
+    # Группировка серий недоступна: для нее нужны все кадры запуска (см. process_images_classification)
+    sources = ((image_path, None) for image_path in image_paths)
+    return iter_results(_iter_classification(model, sources, stop_event=stop_event, batch_size=batch_size,
+                                             num_workers=num_workers, use_cache=use_cache,
+                                             progress_callback=progress_callback, num_processes=num_processes,
+                                             stats=stats, skip=skip, thumbnails=thumbnails), class_counts)
+
+def iter_archive_classification(model, archive_path, stop_event=None, batch_size=BATCH_SIZE,
+                                num_workers=DECODE_WORKERS, use_cache=True, progress_callback=None, num_processes=1,
+                                stats=None, skip=None, thumbnails=False, class_counts=None):
+    return iter_results(_iter_classification(model, iter_archive_images(archive_path), stop_event=stop_event,
+                                             batch_size=batch_size, num_workers=num_workers, use_cache=use_cache,
+                                             progress_callback=progress_callback, num_processes=num_processes,
+                                             stats=stats, skip=skip, thumbnails=thumbnails), class_counts)
+
+# process_* возвращают весь запуск целиком (счетчики, результаты) и отдают порции в result_callback.
+# Это единственный накопительный слой поверх iter_*: его используют группировка серий (нужны все кадры),
+# наблюдение за папкой, проверка движков и бенчмарки
+def process_images_classification(model, image_paths, stop_event=None, batch_size=BATCH_SIZE,
+                                  num_workers=DECODE_WORKERS, use_cache=True, progress_callback=None,
+                                  num_processes=1, burst_grouping=False, burst_representatives=1, stats=None,
+                                  result_callback=None, skip=None, thumbnails=False, burst_use_mtime=False):
+    # burst_use_mtime: кадры без EXIF группируются по mtime файла (только если копирование сохраняет mtime)
+    options = dict(stop_event=stop_event, batch_size=batch_size, num_workers=num_workers, use_cache=use_cache,
+                   progress_callback=progress_callback, num_processes=num_processes, stats=stats,
+                   result_callback=result_callback, skip=skip, thumbnails=thumbnails)
+    if burst_grouping:
+        image_paths = list(image_paths)
+        return _classify_bursts(model, lambda: ((image_path, None) for image_path in image_paths),
+                                representatives=burst_representatives, use_mtime=burst_use_mtime, **options)
+    sources = ((image_path, None) for image_path in image_paths)
+    return _run_classification(model, sources, **options)
+
+def process_archive_classification(model, archive_path, stop_event=None, batch_size=BATCH_SIZE,
+                                   num_workers=DECODE_WORKERS, use_cache=True, progress_callback=None,
+                                   num_processes=1, burst_grouping=False, burst_representatives=1, stats=None,
+                                   result_callback=None, skip=None, thumbnails=False):
+    # Изображения читаются из архива в память по мере надобности, без распаковки на диск
+    options = dict(stop_event=stop_event, batch_size=batch_size, num_workers=num_workers, use_cache=use_cache,
+                   progress_callback=progress_callback, num_processes=num_processes, stats=stats,
+                   result_callback=result_callback, skip=skip, thumbnails=thumbnails)
+    if burst_grouping:
+        return _classify_bursts(model, lambda: iter_archive_images(archive_path),
+                                representatives=burst_representatives, **options)
+    return _run_classification(model, iter_archive_images(archive_path), **options)
+
+def _top_class(model, result):
+    if result is None or result.probs is None:
+        return None
+    return model.names[int(result.probs.top1)], result.probs.top1conf.item()
+
+def _is_audited(image_path, audit_fraction):
+    # Выборка детерминированная: при повторном запуске проверяются те же изображения
+    return audit_fraction > 0 and zlib.crc32(image_path.encode("utf-8")) % 10000 < audit_fraction * 10000
+
+def _infer_cascade(fast_model, model, threshold, fast_imgsz, audit_fraction, batch, stop_event, stats):
+    with stats.stage("cascade_fast", len(batch)):
+        fast_results = predict_batch(fast_model, batch, stop_event=stop_event, stats=stats, imgsz=fast_imgsz)
+    fast_classes = [_top_class(fast_model, result) for _, result in fast_results]
+
+    # Неуверенные изображения и контрольная выборка уверенных уходят в полную модель
+    full_indices = [index for index, fast_class in enumerate(fast_classes)
+                    if fast_class is None or fast_class[1] < threshold
+                    or _is_audited(batch[index][0], audit_fraction)]
+    full_batch = [batch[index] for index in full_indices]
+    with stats.stage("cascade_full", len(full_batch)):
+        full_results = predict_batch(model, full_batch, stop_event=stop_event, stats=stats) if full_batch else []
+    full_classes = {index: _top_class(model, result) for index, (_, result) in zip(full_indices, full_results)}
+
+    outputs = []
+    for index, ((image_path, _), fast_class) in enumerate(zip(batch, fast_classes)):
+        if index not in full_classes:
+            # Ответ быстрой модели в кэш не пишется: в кэше только ответы полной модели
+            stats.count("cascade_accepted")
+            outputs.append(({"image": image_path, "classes": [fast_class], "cascade": "fast"}, None))
             continue
+        full_class = full_classes[index]
+        if full_class is None:
+            outputs.append((None, None))
+            continue
+        # Ответ быстрой модели сохраняется рядом, по нему подбирается порог
+        stage = "escalated" if fast_class is None or fast_class[1] < threshold else "audited"
+        stats.count(f"cascade_{stage}")
+        if fast_class is not None and fast_class[0] == full_class[0]:
+            stats.count(f"cascade_{stage}_agreed")
+        image_data = {"image": image_path, "classes": [full_class], "cascade": stage,
+                      "fast_classes": [fast_class] if fast_class is not None else []}
+        outputs.append((image_data, image_data["classes"]))
+    return outputs
+
+def _cached_cascade(image_path, cached, stats):
+    # Если ответ полной модели уже есть, быстрый проход не нужен
+    stats.count("cascade_cached")
+    return dict(_cached_classification(image_path, cached, stats), cascade="cached")
+
+def _iter_cascade_chunks(fast_model, model, sources, *, threshold=CASCADE_THRESHOLD, fast_imgsz=CASCADE_IMGSZ,
+                         audit_fraction=CASCADE_AUDIT_FRACTION, **options):
+    # Каскад - та же классификация с другой функцией инференса батча и общим с ней кэшем полной модели;
+    # options - аргументы _iter_inferred_chunks
+    infer = partial(_infer_cascade, fast_model, model, threshold, fast_imgsz, audit_fraction)
+    return _iter_inferred_chunks(model, sources, infer=infer, from_cache=_cached_cascade,
+                                 task=CLASSIFICATION_CACHE_TASK, **options)
+
+def cascade_summary(summary):
+    # Сводка по каскаду из RunStats.summary(): доля эскалаций и оценка расхождения с полной моделью
+    counters = summary.get("counters", {})
+    accepted = counters.get("cascade_accepted", 0)
+    escalated = counters.get("cascade_escalated", 0)
+    audited = counters.get("cascade_audited", 0)
+    total = accepted + escalated + audited
+    audit_agreement = counters.get("cascade_audited_agreed", 0) / audited if audited else None
+    result = {
+        "images": total,
+        "cached": counters.get("cascade_cached", 0),
+        "accepted": accepted,
+        "escalated": escalated,
+        "audited": audited,
+        "escalation_rate": escalated / total if total else 0.0,
+        "full_model_calls_saved": accepted / total if total else 0.0,
+        "audit_agreement": audit_agreement,
+        "escalated_fast_agreement": counters.get("cascade_escalated_agreed", 0) / escalated if escalated else None,
+    }
+    # Ответ может отличаться от полной модели только у принятых без проверки изображений
+    if audit_agreement is not None:
+        result["estimated_disagreement_with_full"] = (1 - audit_agreement) * accepted / total
+    return result
+
+def format_cascade_summary(cascade):
+    line = (f"Cascade: {cascade['images']} images, {cascade['escalated']} escalated "
+            f"({cascade['escalation_rate']:.1%}), {cascade['full_model_calls_saved']:.1%} full model calls saved")
+    if cascade["audit_agreement"] is not None:
+        line += (f", audit agreement {cascade['audit_agreement']:.1%} on {cascade['audited']} images, "
+                 f"estimated disagreement with full model {cascade['estimated_disagreement_with_full']:.2%}")
+    return line
+
+def iter_images_cascade(fast_model, model, image_paths, stop_event=None, batch_size=BATCH_SIZE,
+                        num_workers=DECODE_WORKERS, use_cache=True, progress_callback=None, stats=None, skip=None,
+                        thumbnails=False, class_counts=None, threshold=CASCADE_THRESHOLD, fast_imgsz=CASCADE_IMGSZ,
+                        audit_fraction=CASCADE_AUDIT_FRACTION):
+    # fast_model может быть той же моделью: тогда быстрый проход - это она же в разрешении fast_imgsz
+    sources = ((image_path, None) for image_path in image_paths)
+    if skip:
+        sources = skip_sources(sources, skip, progress_callback)
+    return iter_results(_iter_cascade_chunks(fast_model, model, sources, threshold=threshold, fast_imgsz=fast_imgsz,
+                                             audit_fraction=audit_fraction, stop_event=stop_event,
+                                             batch_size=batch_size, num_workers=num_workers, use_cache=use_cache,
+                                             progress_callback=progress_callback, stats=stats,
+                                             thumbnails=thumbnails), class_counts)
+
+def iter_archive_cascade(fast_model, model, archive_path, stop_event=None, batch_size=BATCH_SIZE,
+                         num_workers=DECODE_WORKERS, use_cache=True, progress_callback=None, stats=None, skip=None,
+                         thumbnails=False, class_counts=None, threshold=CASCADE_THRESHOLD, fast_imgsz=CASCADE_IMGSZ,
+                         audit_fraction=CASCADE_AUDIT_FRACTION):
+    sources = iter_archive_images(archive_path)
+    if skip:
+        sources = skip_sources(sources, skip, progress_callback)
+    return iter_results(_iter_cascade_chunks(fast_model, model, sources, threshold=threshold, fast_imgsz=fast_imgsz,
+                                             audit_fraction=audit_fraction, stop_event=stop_event,
+                                             batch_size=batch_size, num_workers=num_workers, use_cache=use_cache,
+                                             progress_callback=progress_callback, stats=stats,
+                                             thumbnails=thumbnails), class_counts)
+
+def _crop_box(img, xyxy, padding=CROP_PADDING):
+    x0, y0, x1, y1 = xyxy
+    pad_x = (x1 - x0) * padding
+    pad_y = (y1 - y0) * padding
+    return img.crop((max(0, int(x0 - pad_x)), max(0, int(y0 - pad_y)),
+                     min(img.width, int(x1 + pad_x)), min(img.height, int(y1 + pad_y))))
+
+def _pipeline_summary(images, empty_images, boxes):
+    # Без детектора классификатор запускался бы на каждом кадре целиком
+    return {
+        "images": images,
+        "empty_images": empty_images,
+        "boxes": boxes,
+        "classifier_calls": boxes,
+        "classifier_calls_without_detector": images,
+        "classifier_calls_saved": images - boxes,
+        "empty_fraction": empty_images / images if images else 0.0,
+    }
+
+def merge_pipeline_summaries(summaries):
+    # Сводка двухэтапного режима по нескольким входам (папка и архивы)
+    summaries = list(summaries)
+    return _pipeline_summary(sum(summary["images"] for summary in summaries),
+                             sum(summary["empty_images"] for summary in summaries),
+                             sum(summary["boxes"] for summary in summaries))
+
+def format_pipeline_summary(summary):
+    return (f"Two-stage pipeline: {summary['images']} images, {summary['empty_images']} empty "
+            f"({summary['empty_fraction']:.0%}), {summary['boxes']} boxes classified, "
+            f"{summary['classifier_calls_saved']} classifier calls saved")
+
+def _detect_classify_cache(detection_model, classification_model, min_confidence, use_cache):
+    # Ответ двухэтапного режима зависит от обеих моделей и порога детектора: весь ключ, кроме хэша
+    # детектора и изображения, входит в task
+    if not use_cache:
+        return None, None, None
+    cache, model_hash = _result_cache_for(detection_model)
+    classifier_hash = model_weights_hash(classification_model)
+    if cache is None or not classifier_hash:
+        return None, None, None
+    return cache, model_hash, f"detect_classify:{classifier_hash}:{min_confidence}"
+
+def _detect_classify_sources(detection_model, classification_model, sources, *, stop_event=None,
+                             batch_size=BATCH_SIZE, num_workers=DECODE_WORKERS,
+                             min_confidence=DETECTION_CONFIDENCE, progress_callback=None, stats=None,
+                             use_cache=True):
+    class_counts = {}
+    image_results = []
+    images = empty_images = boxes = 0
+    stats = stats if stats is not None else RunStats()
+    batch_size = max(1, batch_size)
+
+    # Рамки вырезаются для классификатора, поэтому здесь нужно полное разрешение
+    cache, model_hash, task = _detect_classify_cache(detection_model, classification_model, min_confidence,
+                                                     use_cache)
+    load = partial(_load_source, task=task, cache=cache, model_hash=model_hash, stats=stats, decoder="full")
+    loaded_images = _iter_loaded_images(sources, load, num_workers, prefetch=2 * batch_size)
+    try:
+        for chunk in chunked(_timed_iter(loaded_images, stats, "decode_wait"), batch_size):
+            if stop_event and stop_event.is_set():
+                raise InterruptedError("Inference was stopped.")
+
+            batch = [(image_path, img) for image_path, (img, _, _) in chunk if img is not None]
+            if batch:
+                detections = iter(predict_batch(detection_model, batch, stop_event=stop_event, stats=stats))
+            else:
+                detections = iter(())
+
+            # Этап 1: детекция. Пустые кадры дальше не идут, у остальных вырезаем рамки
+            crops = []
+            chunk_results = []
+            new_cache_keys = []
+            for image_path, (img, cache_key, cached) in chunk:
+                if cached is not None:
+                    cached["classes"] = [tuple(class_data) for class_data in cached["classes"]]
+                    for label_name, _ in cached["classes"]:
+                        class_counts[label_name] = class_counts.get(label_name, 0) + 1
+                    chunk_results.append(cached)
+                    continue
+                if img is None:
+                    continue
+                _, result = next(detections)
+                if result is None:
+                    continue
+                image_data = {"image": image_path, "empty": True, "boxes": [], "classes": []}
+                if result.boxes is not None:
+                    for box in result.boxes:
+                        confidence = float(box.conf)
+                        if confidence < min_confidence:
+                            continue
+                        xyxy = box.xyxy[0].tolist()
+                        image_data["boxes"].append({
+                            "xyxy": xyxy,
+                            "detector_label": detection_model.names[int(box.cls)],
+                            "detector_confidence": confidence,
+                        })
+                        with stats.stage("crop"):
+                            crop = _crop_box(img, xyxy)
+                        crops.append(((len(chunk_results), len(image_data["boxes"]) - 1), crop))
+                image_data["empty"] = not image_data["boxes"]
+                if cache_key is not None:
+                    new_cache_keys.append((cache_key, len(chunk_results)))
+                chunk_results.append(image_data)
+
+            # Этап 2: классификация вырезанных рамок батчами
+            for crop_batch in chunked(crops, batch_size):
+                for (image_index, box_index), result in predict_batch(classification_model, crop_batch,
+                                                                      stop_event=stop_event, stats=stats):
+                    if result is None or result.probs is None:
+                        continue
+                    label_name = classification_model.names[int(result.probs.top1)]
+                    top1conf = result.probs.top1conf.item()
+                    image_data = chunk_results[image_index]
+                    image_data["boxes"][box_index].update({"species": label_name, "confidence": top1conf})
+                    image_data["classes"].append((label_name, top1conf))
+                    class_counts[label_name] = class_counts.get(label_name, 0) + 1
+
+            if new_cache_keys:
+                _write_cache(cache, [(cache_key, chunk_results[index]) for cache_key, index in new_cache_keys], stats)
+            images += len(chunk_results)
+            empty_images += sum(1 for image_data in chunk_results if image_data["empty"])
+            boxes += sum(len(image_data["boxes"]) for image_data in chunk_results)
+            image_results.extend(chunk_results)
+            if progress_callback is not None:
+                progress_callback(len(chunk))
+    finally:
+        loaded_images.close()
+
+    summary = _pipeline_summary(images, empty_images, boxes)
+    logger.info(format_pipeline_summary(summary))
+    stats.count("images", images)
+    stats.count("empty_images", empty_images)
+    stats.count("boxes", boxes)
+    return class_counts, image_results, summary
+
+def process_images_detect_classify(detection_model, classification_model, image_paths, stop_event=None,
+                                   batch_size=BATCH_SIZE, num_workers=DECODE_WORKERS,
+                                   min_confidence=DETECTION_CONFIDENCE, progress_callback=None, stats=None,
+                                   use_cache=True):
+    sources = ((image_path, None) for image_path in image_paths)
+    return _detect_classify_sources(detection_model, classification_model, sources, stop_event=stop_event,
+                                    batch_size=batch_size, num_workers=num_workers, min_confidence=min_confidence,
+                                    progress_callback=progress_callback, stats=stats, use_cache=use_cache)
 
-        for result in outputs:
-            boxes = result.boxes
-            if boxes is not None:
-                for box in boxes:
-                    label = int(box.cls)
-                    label_name = model.names[label]
-                    xyxy = box.xyxy[0].tolist()
-                    detections.append((xyxy, label_name))
-                    draw.rectangle(xyxy, outline="red", width=2)
-                    draw.text((xyxy[0], xyxy[1]), label_name, fill="red")
-
-        frame_with_detections = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
-        cv2.imshow('frame', frame_with_detections)
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-
-    cap.release()
-    cv2.destroyAllWindows()
-
-def process_archive_classification(model, archive_path, extract_to, stop_event=None):
-    with zipfile.ZipFile(archive_path, 'r') as zip_ref:
-        zip_ref.extractall(extract_to)
-
-    image_paths = []
-    for root, _, files in os.walk(extract_to):
-        for file in files:
-            if file.endswith(('.png', '.jpg', '.jpeg')):
-                image_paths.append(os.path.join(root, file))
-
-    return process_images_classification(model, image_paths, stop_event)
+def process_archive_detect_classify(detection_model, classification_model, archive_path, stop_event=None,
+                                    batch_size=BATCH_SIZE, num_workers=DECODE_WORKERS,
+                                    min_confidence=DETECTION_CONFIDENCE, progress_callback=None, stats=None,
+                                    use_cache=True):
+    return _detect_classify_sources(detection_model, classification_model, iter_archive_images(archive_path),
+                                    stop_event=stop_event, batch_size=batch_size, num_workers=num_workers,
+                                    min_confidence=min_confidence, progress_callback=progress_callback,
+                                    stats=stats, use_cache=use_cache)
@@ -0,0 +1,314 @@
+# backend/metadata.py
+# История запусков в SQLite: запуск и результаты по изображениям добавляются по мере обработки,
+# списки запусков, графики и выборки по классу и уверенности не требуют чтения целых JSON файлов.
+
+import glob
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from backend.results import metadata_directory, get_timestamp
+
+logger = logging.getLogger(__name__)
+
+metadata_path = os.path.join(metadata_directory, "metadata.sqlite")
+PAGE_SIZE = 1000
+
+def _top_class(image_data):
+    classes = image_data.get("classes") or []
+    if not classes:
+        return None, None
+    label_name, confidence = max(classes, key=lambda class_data: class_data[1])
+    return label_name, float(confidence)
+
+def _image_rows(run_id, image_classifications):
+    rows = []
+    for image_data in image_classifications:
+        label_name, confidence = _top_class(image_data)
+        rows.append((run_id, image_data["image"], label_name, confidence, json.dumps(image_data)))
+    return rows
+
+class MetadataStore:
+    _run_columns = "id, name, created, status, image_count, class_counts, timings, inputs"
+
+    def __init__(self, path=metadata_path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE, created REAL NOT NULL, "
+            "status TEXT NOT NULL, image_count INTEGER NOT NULL DEFAULT 0, class_counts TEXT, timings TEXT, "
+            "inputs TEXT)")
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(runs)")]
+        if "inputs" not in columns:
+            self._conn.execute("ALTER TABLE runs ADD COLUMN inputs TEXT")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS images ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE, "
+            "image TEXT NOT NULL, label TEXT, confidence REAL, data TEXT NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS images_run ON images (run_id, id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS images_run_confidence ON images (run_id, confidence)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS images_label_confidence ON images (label, confidence)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS images_image ON images (image)")
+        # Файлы, уже взятые в работу запуском (для наблюдения за папкой), в том числе архивы и битые изображения
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS run_files ("
+            "run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE, path TEXT NOT NULL, "
+            "seen REAL NOT NULL, PRIMARY KEY (run_id, path))")
+        self._conn.commit()
+
+    def _unique_name(self, name):
+        candidate = name
+        suffix = 1
+        while self._conn.execute("SELECT 1 FROM runs WHERE name = ?", (candidate,)).fetchone():
+            suffix += 1
+            candidate = f"{name}_{suffix}"
+        return candidate
+
+    def create_run(self, name=None, created=None, status="running", inputs=None):
+        # inputs - файлы и параметры запуска, по ним прерванный запуск можно продолжить
+        if name is None:
+            name = f"classification_results_{get_timestamp()}"
+        with self._lock:
+            cursor = self._conn.execute("INSERT INTO runs (name, created, status, inputs) VALUES (?, ?, ?, ?)",
+                                        (self._unique_name(name), created or time.time(), status,
+                                         json.dumps(inputs) if inputs is not None else None))
+            self._conn.commit()
+        return cursor.lastrowid
+
+    def add_images(self, run_id, image_classifications, class_counts=None, seen_files=()):
+        # С class_counts это контрольная точка: изображения и промежуточные счетчики фиксируются одной транзакцией.
+        # seen_files отмечаются в той же транзакции, что и их результаты (наблюдение за папкой)
+        rows = _image_rows(run_id, image_classifications)
+        if not rows and class_counts is None and not seen_files:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO images (run_id, image, label, confidence, data) VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.execute("UPDATE runs SET image_count = image_count + ? WHERE id = ?", (len(rows), run_id))
+            if class_counts is not None:
+                self._conn.execute("UPDATE runs SET class_counts = ? WHERE id = ?", (json.dumps(class_counts), run_id))
+            self._conn.executemany("INSERT OR IGNORE INTO run_files (run_id, path, seen) VALUES (?, ?, ?)",
+                                   [(run_id, path, now) for path in seen_files])
+            self._conn.commit()
+
+    def finish_run(self, run_id, class_counts, timings=None, status="done"):
+        with self._lock:
+            self._conn.execute("UPDATE runs SET status = ?, class_counts = ?, timings = ? WHERE id = ?",
+                               (status, json.dumps(class_counts),
+                                json.dumps(timings) if timings is not None else None, run_id))
+            self._conn.commit()
+
+    def set_status(self, run_id, status):
+        with self._lock:
+            self._conn.execute("UPDATE runs SET status = ? WHERE id = ?", (status, run_id))
+            self._conn.commit()
+
+    @staticmethod
+    def _run_from_row(row):
+        run_id, name, created, status, image_count, class_counts, timings, inputs = row
+        return {
+            "id": run_id,
+            "name": name,
+            "created": created,
+            "status": status,
+            "image_count": image_count,
+            "class_counts": json.loads(class_counts) if class_counts else {},
+            "timings": json.loads(timings) if timings else None,
+            "inputs": json.loads(inputs) if inputs else None,
+            # Запуски без типа созданы классификацией или импортированы из JSON
+            "task": (json.loads(inputs) if inputs else {}).get("task", "classification"),
+        }
+
+    def list_runs(self):
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {self._run_columns} FROM runs ORDER BY created DESC, id DESC").fetchall()
+        return [self._run_from_row(row) for row in rows]
+
+    def get_run(self, run_id):
+        with self._lock:
+            row = self._conn.execute(f"SELECT {self._run_columns} FROM runs WHERE id = ?", (run_id,)).fetchone()
+        return self._run_from_row(row) if row is not None else None
+
+    def get_run_by_name(self, name):
+        with self._lock:
+            row = self._conn.execute(f"SELECT {self._run_columns} FROM runs WHERE name = ?", (name,)).fetchone()
+        return self._run_from_row(row) if row is not None else None
+
+    def interrupted_runs(self):
+        # "running" остается у запуска, если приложение упало или компьютер перезагрузился.
+        # Запуски с ошибкой ("failed") не предлагаются: повтор упадет на том же месте
+        return [run for run in self.list_runs()
+                if run["status"] in ("running", "stopped") and run["inputs"] and "file_paths" in run["inputs"]]
+
+    def mark_files_seen(self, run_id, paths):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany("INSERT OR IGNORE INTO run_files (run_id, path, seen) VALUES (?, ?, ?)",
+                                   [(run_id, path, now) for path in paths])
+            self._conn.commit()
+
+    def seen_files(self, run_id):
+        with self._lock:
+            rows = self._conn.execute("SELECT path FROM run_files WHERE run_id = ?", (run_id,)).fetchall()
+        return {row[0] for row in rows}
+
+    def processed_images(self, run_id):
+        with self._lock:
+            rows = self._conn.execute("SELECT image FROM images WHERE run_id = ?", (run_id,)).fetchall()
+        return {row[0] for row in rows}
+
+    def latest_run(self):
+        runs = self.list_runs()
+        return runs[0] if runs else None
+
+    def class_counts(self, run_id):
+        run = self.get_run(run_id)
+        if run is None:
+            return {}
+        if run["class_counts"]:
+            return run["class_counts"]
+        # Незавершенный запуск: считаем по уже сохраненным изображениям
+        with self._lock:
+            rows = self._conn.execute("SELECT label, COUNT(*) FROM images WHERE run_id = ? AND label IS NOT NULL "
+                                      "GROUP BY label", (run_id,)).fetchall()
+        return dict(rows)
+
+    @staticmethod
+    def _image_filter(run_id=None, label=None, min_confidence=None, max_confidence=None, image=None):
+        conditions = []
+        parameters = []
+        for column, operator, value in (("run_id", "=", run_id), ("label", "=", label),
+                                        ("confidence", ">=", min_confidence), ("confidence", "<=", max_confidence),
+                                        ("image", "=", image)):
+            if value is not None:
+                conditions.append(f"{column} {operator} ?")
+                parameters.append(value)
+        return (" WHERE " + " AND ".join(conditions) if conditions else ""), parameters
+
+    def query_images(self, run_id=None, label=None, min_confidence=None, max_confidence=None, image=None,
+                     limit=None, offset=0):
+        where, parameters = self._image_filter(run_id, label, min_confidence, max_confidence, image)
+        query = f"SELECT data FROM images{where} ORDER BY id"
+        if limit is not None:
+            query += " LIMIT ? OFFSET ?"
+            parameters.extend([limit, offset])
+        with self._lock:
+            rows = self._conn.execute(query, parameters).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def image_ids(self, run_id=None, label=None, min_confidence=None, max_confidence=None, image=None):
+        # Только id: выборка фиксируется один раз, а данные подгружаются страницами через images_by_ids
+        where, parameters = self._image_filter(run_id, label, min_confidence, max_confidence, image)
+        with self._lock:
+            rows = self._conn.execute(f"SELECT id FROM images{where} ORDER BY id", parameters).fetchall()
+        return [row[0] for row in rows]
+
+    def images_by_ids(self, image_ids):
+        if not image_ids:
+            return []
+        placeholders = ", ".join("?" * len(image_ids))
+        with self._lock:
+            rows = self._conn.execute(f"SELECT id, data FROM images WHERE id IN ({placeholders})",
+                                      list(image_ids)).fetchall()
+        data_by_id = {image_id: json.loads(data) for image_id, data in rows}
+        return [(image_id, data_by_id[image_id]) for image_id in image_ids if image_id in data_by_id]
+
+    def update_images(self, images):
+        # images: список (id, image_data), все изменения одной транзакцией
+        rows = []
+        for image_id, image_data in images:
+            label_name, confidence = _top_class(image_data)
+            rows.append((label_name, confidence, json.dumps(image_data), image_id))
+        with self._lock:
+            self._conn.executemany("UPDATE images SET label = ?, confidence = ?, data = ? WHERE id = ?", rows)
+            self._conn.commit()
+
+    def iter_run_images(self, run_id, page_size=PAGE_SIZE):
+        # Постранично по id, чтобы не держать весь запуск в памяти и не держать блокировку между страницами
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute("SELECT id, data FROM images WHERE run_id = ? AND id > ? ORDER BY id LIMIT ?",
+                                          (run_id, last_id, page_size)).fetchall()
+            if not rows:
+                return
+            for _, data in rows:
+                yield json.loads(data)
+            last_id = rows[-1][0]
+
+    def import_json(self, json_path):
+        # Повторный импорт того же файла ничего не меняет: имя запуска - имя файла
+        name = os.path.splitext(os.path.basename(json_path))[0]
+        with self._lock:
+            row = self._conn.execute("SELECT id FROM runs WHERE name = ?", (name,)).fetchone()
+        if row is not None:
+            return None
+        with open(json_path, 'r') as file:
+            data = json.load(file)
+        image_classifications = data.get("image_classifications", [])
+        timings = data.get("timings")
+        # Запуск и все его изображения добавляются одной транзакцией: битый элемент или остановка приложения
+        # посреди импорта не оставляют половину запуска, из-за которой файл больше никогда не импортировался бы
+        with self._lock:
+            try:
+                cursor = self._conn.execute(
+                    "INSERT INTO runs (name, created, status, image_count, class_counts, timings) "
+                    "VALUES (?, ?, 'imported', ?, ?, ?)",
+                    (name, os.path.getmtime(json_path), len(image_classifications),
+                     json.dumps(data.get("class_counts", {})), json.dumps(timings) if timings is not None else None))
+                run_id = cursor.lastrowid
+                for start in range(0, len(image_classifications), PAGE_SIZE):
+                    self._conn.executemany(
+                        "INSERT INTO images (run_id, image, label, confidence, data) VALUES (?, ?, ?, ?, ?)",
+                        _image_rows(run_id, image_classifications[start:start + PAGE_SIZE]))
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        return run_id
+
+    def import_json_history(self, directory=metadata_directory):
+        imported = []
+        for json_path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+            try:
+                run_id = self.import_json(json_path)
+            except (OSError, ValueError, KeyError, TypeError, sqlite3.Error) as e:
+                logger.warning(f"Error importing {json_path}: {e}")
+                continue
+            if run_id is not None:
+                imported.append(run_id)
+        return imported
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM images")
+            self._conn.execute("DELETE FROM run_files")
+            self._conn.execute("DELETE FROM runs")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_metadata_store = None
+_metadata_store_lock = threading.Lock()
+
+def get_metadata_store():
+    global _metadata_store
+    with _metadata_store_lock:
+        if _metadata_store is None:
+            _metadata_store = MetadataStore()
+        return _metadata_store
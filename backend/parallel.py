@@ -0,0 +1,92 @@
+# backend/parallel.py
+# Классификация в пуле процессов: список изображений режется на шарды, каждый процесс держит свою копию модели
+
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from backend import inference
+from backend.timing import RunStats
+
+_worker_model = None
+_worker_stop_event = None
+
+def _init_worker(model_path, intra_op_threads, stop_event):
+    global _worker_model, _worker_stop_event
+    # Потоки torch делим между процессами, иначе 32 процесса по 32 потока мешают друг другу
+    os.environ["OMP_NUM_THREADS"] = str(intra_op_threads)
+    try:
+        import torch
+        torch.set_num_threads(intra_op_threads)
+    except ImportError:
+        pass
+
+    _worker_model = inference.load_model(model_path, task="classify")
+    _worker_stop_event = stop_event
+
+def _classify_shard(sources, options):
+    stats = RunStats()
+    class_counts, image_classifications = inference.collect_chunks(inference.iter_classified_chunks(
+        _worker_model, sources, stop_event=_worker_stop_event, stats=stats, **options))
+    return class_counts, image_classifications, stats.summary()
+
+def _forward_stop(stop_event, process_stop_event, done):
+    while not done.is_set():
+        if stop_event.wait(0.05):
+            process_stop_event.set()
+            return
+
+def iter_sources_parallel(model_path, sources, *, stop_event=None, num_processes=None, shard_size=None,
+                          batch_size=inference.BATCH_SIZE, num_workers=1, use_cache=True, progress_callback=None,
+                          stats=None, thumbnails=False):
+    # Отдает (счетчики шарда, результаты шарда) по мере готовности шардов, в порядке отправки
+    num_processes = num_processes or os.cpu_count() or 1
+    shard_size = shard_size or batch_size * 4
+    intra_op_threads = max(1, (os.cpu_count() or 1) // num_processes)
+    options = dict(batch_size=batch_size, num_workers=num_workers, use_cache=use_cache, thumbnails=thumbnails)
+
+    context = multiprocessing.get_context("spawn")
+    process_stop_event = context.Event()
+    done = threading.Event()
+    if stop_event is not None:
+        threading.Thread(target=_forward_stop, args=(stop_event, process_stop_event, done),
+                         name="stop-forwarder", daemon=True).start()
+
+    def collect(shard_length, future):
+        new_class_counts, new_image_classifications, shard_stats = future.result()
+        if stats is not None:
+            stats.merge(shard_stats)
+        return shard_length, new_class_counts, new_image_classifications
+
+    executor = ProcessPoolExecutor(max_workers=num_processes, mp_context=context, initializer=_init_worker,
+                                   initargs=(model_path, intra_op_threads, process_stop_event))
+    # Шарды отправляются с ограниченным запасом, а результаты собираются в порядке отправки,
+    # поэтому итог не зависит от того, какой процесс закончил первым
+    pending = deque()
+    try:
+        for shard in inference.chunked(sources, shard_size):
+            if process_stop_event.is_set():
+                raise InterruptedError("Inference was stopped.")
+            pending.append((len(shard), executor.submit(_classify_shard, shard, options)))
+            if len(pending) >= 2 * num_processes:
+                shard_length, new_class_counts, new_image_classifications = collect(*pending.popleft())
+                yield new_class_counts, new_image_classifications
+                if progress_callback is not None:
+                    progress_callback(shard_length)
+        while pending:
+            shard_length, new_class_counts, new_image_classifications = collect(*pending.popleft())
+            yield new_class_counts, new_image_classifications
+            if progress_callback is not None:
+                progress_callback(shard_length)
+    except BaseException:
+        # В том числе GeneratorExit, если потребитель перестал читать результаты
+        process_stop_event.set()
+        raise
+    finally:
+        done.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    if process_stop_event.is_set():
+        raise InterruptedError("Inference was stopped.")
@@ -0,0 +1,157 @@
+# backend/results.py
+
+import csv
+import datetime
+import json
+import os
+
+metadata_directory = "metadata"
+reports_directory = "reports"
+
+# Словарь для перевода названий классов на русский
+animal_dict = {'roedeer': 'Косуля', 'deer': 'Олень', 'muskdeer': 'Кабарга'}
+report_columns = ["Изображение", "Класс"]
+
+def get_timestamp():
+    return datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+
+class ClassificationResultsWriter:
+    # JSON с результатами пишется по мере поступления изображений; счетчики дописываются в конце,
+    # поэтому раздел image_classifications идет первым
+    def __init__(self, filename=None):
+        if filename is None:
+            filename = os.path.join(metadata_directory, f"classification_results_{get_timestamp()}.json")
+        directory = os.path.dirname(filename)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.filename = filename
+        self._file = open(filename, 'w')
+        self._file.write('{"image_classifications": [')
+        self._first = True
+
+    def write(self, image_classifications):
+        for item in image_classifications:
+            self._file.write(("" if self._first else ", ") + json.dumps(item))
+            self._first = False
+
+    def close(self, class_counts, timings=None):
+        self._file.write('], "class_counts": ' + json.dumps(class_counts))
+        if timings is not None:
+            self._file.write(', "timings": ' + json.dumps(timings))
+        self._file.write('}')
+        self._file.close()
+        return self.filename
+
+def write_classification_results(class_counts, image_classifications, filename=None, timings=None):
+    writer = ClassificationResultsWriter(filename)
+    writer.write(image_classifications)
+    return writer.close(class_counts, timings)
+
+def report_rows(image_classifications):
+    for item in image_classifications:
+        classes = [cls[0] for cls in item["classes"]]
+        # Сохраняем только имя файла
+        yield [os.path.basename(item["image"]), ", ".join([animal_dict.get(cls, cls) for cls in classes])]
+
+# Строки отчета пишутся по мере чтения результатов, поэтому память не растет с размером запуска
+REPORT_FORMATS = ('.xlsx', '.csv', '.parquet')
+EXCEL_MAX_ROWS = 1048576
+PARQUET_ROW_GROUP_SIZE = 50000
+
+class ReportWriter:
+    # Отчет, в который результаты добавляются порциями по ходу запуска
+    def __init__(self, report_path):
+        self.extension = os.path.splitext(report_path)[1].lower()
+        if self.extension not in REPORT_FORMATS:
+            raise ValueError(f"Unsupported report format: {report_path}")
+        directory = os.path.dirname(report_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.report_path = report_path
+
+        if self.extension == '.csv':
+            self._file = open(report_path, 'w', newline='', encoding='utf-8-sig')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(report_columns)
+        elif self.extension == '.xlsx':
+            from openpyxl import Workbook
+
+            # write_only: строки сразу уходят во временный XML, а не копятся в объектах ячеек
+            self._workbook = Workbook(write_only=True)
+            self._sheet = None
+            self._sheet_rows = EXCEL_MAX_ROWS
+        else:
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ValueError("Parquet reports require pyarrow (pip install pyarrow)")
+            self._pa = pa
+            self._schema = pa.schema([(column, pa.string()) for column in report_columns])
+            self._writer = pq.ParquetWriter(report_path, self._schema)
+            self._rows = []
+
+    def write(self, image_classifications):
+        rows = report_rows(image_classifications)
+        if self.extension == '.csv':
+            self._writer.writerows(rows)
+        elif self.extension == '.xlsx':
+            for row in rows:
+                if self._sheet_rows >= EXCEL_MAX_ROWS:
+                    # Лист Excel ограничен 1048576 строками, остальное продолжается на следующем листе
+                    self._sheet = self._workbook.create_sheet(f"Sheet{len(self._workbook.worksheets) + 1}")
+                    self._sheet.append(report_columns)
+                    self._sheet_rows = 1
+                self._sheet.append(row)
+                self._sheet_rows += 1
+        else:
+            for row in rows:
+                self._rows.append(row)
+                if len(self._rows) >= PARQUET_ROW_GROUP_SIZE:
+                    self._write_row_group()
+
+    def _write_row_group(self):
+        pa = self._pa
+        columns = list(zip(*self._rows))
+        self._writer.write_table(pa.Table.from_arrays([pa.array(column, pa.string()) for column in columns],
+                                                      schema=self._schema))
+        self._rows = []
+
+    def close(self):
+        if self.extension == '.csv':
+            self._file.close()
+        elif self.extension == '.xlsx':
+            if self._sheet is None:
+                self._workbook.create_sheet("Sheet1").append(report_columns)
+            self._workbook.save(self.report_path)
+        else:
+            if self._rows:
+                self._write_row_group()
+            self._writer.close()
+        return self.report_path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def append_report(image_classifications, report_path):
+    # Дописывание строк в CSV отчет по мере поступления результатов (наблюдение за папкой)
+    if not report_path.lower().endswith('.csv'):
+        raise ValueError(f"Only .csv reports can be appended to: {report_path}")
+    directory = os.path.dirname(report_path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    is_new = not os.path.exists(report_path) or os.path.getsize(report_path) == 0
+    with open(report_path, 'a', newline='', encoding='utf-8-sig' if is_new else 'utf-8') as file:
+        writer = csv.writer(file)
+        if is_new:
+            writer.writerow(report_columns)
+        writer.writerows(report_rows(image_classifications))
+    return report_path
+
+def write_report(image_classifications, report_path):
+    with ReportWriter(report_path) as writer:
+        writer.write(image_classifications)
+    return report_path
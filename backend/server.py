@@ -0,0 +1,298 @@
+# backend/server.py
+# Локальный сервис инференса: одна копия моделей классификации и детекции на машину для всех окон приложения.
+# Запросы разных клиентов собираются в общие батчи (до max_batch изображений или max_wait секунд ожидания),
+# при переполнении очереди сервис отвечает 503 и клиент повторяет запрос позже.
+# Запуск: python -m backend serve [--port 8765 | --unix /tmp/animals.sock]
+
+import asyncio
+import base64
+import json
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from backend import inference
+from backend.timing import RunStats
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_BATCH = inference.BATCH_SIZE
+MAX_WAIT = 0.01
+# Сколько изображений может одновременно находиться в обработке; сверх этого запросы получают 503
+MAX_PENDING = 32 * inference.BATCH_SIZE
+MAX_BODY_BYTES = 512 * 1024 * 1024
+LATENCY_WINDOW = 1000
+
+TASKS = {"classify": "classification", "detect": "detection"}
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def _percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {"count": 0}
+    pick = lambda fraction: values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))] * 1000
+    return {"count": len(values), "p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+class MicroBatcher:
+    # Очередь изображений одной модели: батч отправляется, когда набралось max_batch или истекло max_wait
+    def __init__(self, model, max_batch=MAX_BATCH, max_wait=MAX_WAIT, stats=None):
+        self.model = model
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self.stats = stats if stats is not None else RunStats()
+        self.queue = asyncio.Queue()
+        # Модель вызывается из одного потока: батчи одной модели идут строго по очереди
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model")
+        self.batch_sizes = deque(maxlen=LATENCY_WINDOW)
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, image_path, img):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((image_path, img, future, time.perf_counter()))
+        return await future
+
+    async def _next_batch(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # То, что уже лежит в очереди, забираем без ожидания
+        while len(batch) < self.max_batch and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            now = time.perf_counter()
+            for _, _, _, queued in batch:
+                self.stats.add("queue_wait", now - queued)
+            self.batch_sizes.append(len(batch))
+            self.stats.count("batches")
+            try:
+                results = await loop.run_in_executor(self.executor, partial(
+                    inference.predict_batch, self.model, [(image_path, img) for image_path, img, _, _ in batch],
+                    stats=self.stats))
+            except Exception as e:
+                for _, _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, _, future, _), (_, result) in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def metrics(self):
+        return {"queued": self.queue.qsize(), "batches": len(self.batch_sizes),
+                "mean_batch_size": sum(self.batch_sizes) / len(self.batch_sizes) if self.batch_sizes else 0.0}
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.executor.shutdown(wait=True)
+
+class InferenceServer:
+    def __init__(self, models, max_batch=MAX_BATCH, max_wait=MAX_WAIT, max_pending=MAX_PENDING,
+                 num_workers=inference.DECODE_WORKERS):
+        # models: {"classification": модель, "detection": модель}
+        self.models = models
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_pending = max_pending
+        self.stats = RunStats()
+        self.decode_executor = ThreadPoolExecutor(max_workers=max(1, num_workers), thread_name_prefix="image-decode")
+        self.batchers = {}
+        self.pending = 0
+        self.latencies = {task: deque(maxlen=LATENCY_WINDOW) for task in TASKS}
+        self.started = time.time()
+        self._server = None
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None):
+        for role, model in self.models.items():
+            batcher = MicroBatcher(model, max_batch=self.max_batch, max_wait=self.max_wait, stats=self.stats)
+            batcher.start()
+            self.batchers[role] = batcher
+        if unix_path:
+            if os.path.exists(unix_path):
+                os.remove(unix_path)
+            self._server = await asyncio.start_unix_server(self.handle_connection, unix_path)
+            logger.info(f"Inference server listening on unix:{unix_path}")
+        else:
+            self._server = await asyncio.start_server(self.handle_connection, host, port)
+            logger.info(f"Inference server listening on http://{host}:{port}")
+        return self._server
+
+    async def serve_forever(self, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None):
+        server = await self.start(host=host, port=port, unix_path=unix_path)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+        for batcher in self.batchers.values():
+            await batcher.close()
+        self.decode_executor.shutdown(wait=True)
+
+    async def handle_connection(self, reader, writer):
+        # Минимальный HTTP/1.1 с keep-alive: клиенту достаточно стандартного http.client
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {"error": "Request body is too large"}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                try:
+                    payload = await self.dispatch(method, target.split("?", 1)[0], body)
+                    status = 200
+                except HTTPError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except Exception as e:
+                    logger.error(f"Error handling {method} {target}: {e}")
+                    status, payload = 500, {"error": str(e)}
+                close = headers.get("connection", "").lower() == "close"
+                await self._respond(writer, status, payload, close=close)
+                if close:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, payload, close=False):
+        body = json.dumps(payload).encode("utf-8")
+        reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large",
+                   500: "Internal Server Error", 503: "Service Unavailable"}
+        headers = [f"HTTP/1.1 {status} {reasons.get(status, '')}", "Content-Type: application/json",
+                   f"Content-Length: {len(body)}", f"Connection: {'close' if close else 'keep-alive'}"]
+        if status == 503:
+            headers.append("Retry-After: 1")
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def dispatch(self, method, path, body):
+        if method == "GET" and path == "/health":
+            return self.health()
+        if method == "GET" and path == "/metrics":
+            return self.metrics()
+        task = path.strip("/")
+        if method == "POST" and task in TASKS:
+            try:
+                request = json.loads(body or b"{}")
+            except ValueError:
+                raise HTTPError(400, "Request body is not valid JSON")
+            return await self.predict(task, request)
+        raise HTTPError(404, f"Unknown endpoint {method} {path}")
+
+    def health(self):
+        return {"status": "ok", "uptime_seconds": time.time() - self.started, "pending": self.pending,
+                "models": {role: os.path.basename(str(inference.model_weights_path(model)))
+                           for role, model in self.models.items()}}
+
+    def metrics(self):
+        return {"uptime_seconds": time.time() - self.started, "pending": self.pending,
+                "max_pending": self.max_pending, "max_batch": self.max_batch, "max_wait_ms": self.max_wait * 1000,
+                "latency": {task: _percentiles(latencies) for task, latencies in self.latencies.items()},
+                "models": {role: batcher.metrics() for role, batcher in self.batchers.items()},
+                "stats": self.stats.summary()}
+
+    async def predict(self, task, request):
+        role = TASKS[task]
+        if role not in self.batchers:
+            raise HTTPError(404, f"Model {role} is not loaded")
+        images = request.get("images")
+        if not isinstance(images, list):
+            raise HTTPError(400, "Expected {\"images\": [{\"path\": ..., \"data\": base64}]}")
+
+        # Противодавление: не берем больше, чем успеваем обработать; одиночный большой запрос в пустую очередь проходит
+        if self.pending and self.pending + len(images) > self.max_pending:
+            self.stats.count("rejected_requests")
+            raise HTTPError(503, "Server is busy, retry later")
+        self.pending += len(images)
+        start = time.perf_counter()
+        try:
+            results = await self._predict(task, role, images, use_cache=request.get("use_cache", True),
+                                          thumbnails=request.get("thumbnails", False))
+        finally:
+            self.pending -= len(images)
+        self.latencies[task].append(time.perf_counter() - start)
+        self.stats.count("requests")
+        self.stats.count("images", len(images))
+        return {"results": results}
+
+    async def _predict(self, task, role, images, *, use_cache, thumbnails):
+        loop = asyncio.get_running_loop()
+        model = self.models[role]
+        load = inference.source_loader(model, task, use_cache=use_cache, stats=self.stats, thumbnails=thumbnails)
+        new_cache_entries = []
+
+        async def predict_one(image):
+            image_path = image.get("path")
+            data = base64.b64decode(image["data"]) if image.get("data") else None
+            img, cache_key, cached = await loop.run_in_executor(self.decode_executor, load, image_path, data)
+            if cached is not None:
+                return inference.cached_data(task, image_path, cached)
+            if img is None:
+                return None
+            result = await self.batchers[role].submit(image_path, img)
+            if result is None:
+                return None
+            image_data, cache_value = inference.result_data(model, task, image_path, result, img)
+            if cache_key is not None:
+                new_cache_entries.append((cache_key, cache_value))
+            return image_data
+
+        results = await asyncio.gather(*(predict_one(image) for image in images))
+        if new_cache_entries:
+            await loop.run_in_executor(self.decode_executor, partial(inference.write_cache, new_cache_entries,
+                                                                     stats=self.stats))
+        return results
+
+def serve(models, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None, max_batch=MAX_BATCH, max_wait=MAX_WAIT,
+          max_pending=MAX_PENDING, num_workers=inference.DECODE_WORKERS):
+    server = InferenceServer(models, max_batch=max_batch, max_wait=max_wait, max_pending=max_pending,
+                             num_workers=num_workers)
+    asyncio.run(server.serve_forever(host=host, port=port, unix_path=unix_path))
@@ -0,0 +1,122 @@
+# backend/thumbnails.py
+# Миниатюры для окон просмотра. Создаются из изображения, уже декодированного для инференса,
+# и хранятся в SQLite рядом с кэшем результатов; давно не открывавшиеся вытесняются по размеру.
+
+import atexit
+import io
+import logging
+import os
+import sqlite3
+import threading
+
+from PIL import Image
+
+from backend.archive import read_archive_member, split_archive_path
+from backend.cache import SizeBoundedStore, cache_directory
+from backend.decode import decode_image, original_size
+
+logger = logging.getLogger(__name__)
+
+thumbnails_path = os.path.join(cache_directory, "thumbnails.sqlite")
+THUMBNAIL_SIZE = 600
+THUMBNAIL_QUALITY = 85
+MAX_THUMBNAIL_BYTES = 256 * 1024 * 1024
+
+def thumbnail_key(image_path):
+    # Файл в архиве меняется вместе с архивом, поэтому берем размер и mtime самого архива
+    source_path = image_path
+    if not os.path.isfile(image_path):
+        source_path, _ = split_archive_path(image_path)
+        if source_path is None:
+            raise FileNotFoundError(image_path)
+    stat = os.stat(source_path)
+    return f"{os.path.abspath(image_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+def make_thumbnail(img, size=THUMBNAIL_SIZE):
+    scale = min(1.0, size / max(img.size))
+    target = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+    # reducing_gap: сначала быстрое целочисленное уменьшение, затем сглаживание на маленьком изображении
+    thumbnail = img.convert("RGB").resize(target, Image.Resampling.BILINEAR, reducing_gap=2.0)
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, format="JPEG", quality=THUMBNAIL_QUALITY)
+    return buffer.getvalue()
+
+class ThumbnailCache:
+    def __init__(self, path=thumbnails_path, max_bytes=MAX_THUMBNAIL_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._store = SizeBoundedStore(path, "thumbnails", [("data", "BLOB NOT NULL"), ("width", "INTEGER NOT NULL"),
+                                                            ("height", "INTEGER NOT NULL")], max_bytes)
+
+    def contains(self, key):
+        return self._store.contains(key)
+
+    def get(self, key):
+        # Возвращает (JPEG миниатюры, размер оригинала) или None
+        row = self._store.get(key)
+        if row is None:
+            return None
+        data, width, height = row
+        return data, (width, height)
+
+    def put(self, key, data, original_size):
+        self._store.put_many([(key, (data, original_size[0], original_size[1]), len(data))])
+
+    def flush(self):
+        self._store.flush()
+
+    def clear(self):
+        self._store.clear()
+
+    def close(self):
+        self._store.close()
+
+_thumbnail_cache = None
+_thumbnail_cache_lock = threading.Lock()
+
+def get_thumbnail_cache():
+    global _thumbnail_cache
+    with _thumbnail_cache_lock:
+        if _thumbnail_cache is None:
+            _thumbnail_cache = ThumbnailCache()
+            atexit.register(_thumbnail_cache.close)
+        return _thumbnail_cache
+
+def store_thumbnail(image_path, img, cache=None):
+    # Вызывается из потоков декодирования сразу после того, как изображение декодировано для модели
+    cache = cache if cache is not None else get_thumbnail_cache()
+    key = thumbnail_key(image_path)
+    if not cache.contains(key):
+        # Для модели изображение могло быть декодировано в уменьшенном масштабе, храним размер оригинала
+        cache.put(key, make_thumbnail(img), original_size(img))
+
+def thumbnail_data(image_path, cache=None):
+    # Миниатюра из кэша; если ее нет (например, результат был взят из кэша без декодирования), создается сейчас
+    cache = cache if cache is not None else get_thumbnail_cache()
+    key = thumbnail_key(image_path)
+    try:
+        cached = cache.get(key)
+    except sqlite3.Error as e:
+        # Без хранилища миниатюра просто создается заново
+        logger.warning(f"Thumbnail cache lookup failed for {image_path}: {e}")
+        cached = None
+    if cached is not None:
+        return cached
+
+    source = image_path if os.path.isfile(image_path) else read_archive_member(image_path)
+    # Для JPEG декодируем сразу в уменьшенном масштабе, с тем же поворотом по EXIF, что и для модели
+    img = decode_image(source, THUMBNAIL_SIZE, "reduced")
+    data = make_thumbnail(img)
+    try:
+        cache.put(key, data, original_size(img))
+    except sqlite3.Error as e:
+        logger.warning(f"Thumbnail cache write failed for {image_path}: {e}")
+    return data, original_size(img)
+
+def load_thumbnail(image_path, cache=None):
+    data, original_size = thumbnail_data(image_path, cache)
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    # По original_size координаты рамок пересчитываются из оригинала в миниатюру
+    img.info["original_size"] = original_size
+    return img
@@ -0,0 +1,56 @@
+# backend/timing.py
+# Легковесные замеры по этапам (чтение, декодирование, модель, запись): perf_counter и счетчики под одной блокировкой
+
+import threading
+import time
+from contextlib import contextmanager
+
+class RunStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+
+    def add(self, name, seconds, count=1):
+        with self._lock:
+            stage = self.stages.setdefault(name, [0.0, 0])
+            stage[0] += seconds
+            stage[1] += count
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def stage(self, name, count=1):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start, count)
+
+    def merge(self, summary):
+        # Объединение со сводкой из другого процесса (см. backend/parallel.py)
+        for name, stage in summary.get("stages", {}).items():
+            self.add(name, stage["seconds"], stage["count"])
+        for name, value in summary.get("counters", {}).items():
+            self.count(name, value)
+
+    def summary(self):
+        with self._lock:
+            return {
+                "wall_seconds": time.perf_counter() - self._start,
+                "stages": {name: {"seconds": seconds, "count": count,
+                                  "mean_ms": seconds / count * 1000 if count else 0.0}
+                           for name, (seconds, count) in self.stages.items()},
+                "counters": dict(self.counters),
+            }
+
+def format_summary(summary):
+    lines = [f"Run finished in {summary['wall_seconds']:.2f}s"]
+    for name, stage in sorted(summary["stages"].items(), key=lambda item: -item[1]["seconds"]):
+        lines.append(f"  {name:20s} {stage['seconds']:9.3f}s  x{stage['count']:<7d} {stage['mean_ms']:9.2f} ms avg")
+    for name, value in sorted(summary["counters"].items()):
+        lines.append(f"  {name:20s} {value}")
+    return "\n".join(lines)
@@ -0,0 +1,251 @@
+# backend/video.py
+
+import csv
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from backend.inference import BATCH_SIZE, result_detections, run_inference
+
+logger = logging.getLogger(__name__)
+
+FRAME_QUEUE_SIZE = 64
+# Детектор запускается, если изменилось хотя бы 0.1% пикселей уменьшенного кадра (около 15 пикселей при ширине 160);
+# кадры без движения наследуют детекции предыдущего. 0 - детектор на каждом кадре
+MOTION_THRESHOLD = 0.001
+GATE_WIDTH = 160
+
+def _draw_detections(frame, detections):
+    import cv2
+
+    for xyxy, label_name, _ in detections:
+        x0, y0, x1, y1 = (int(value) for value in xyxy)
+        cv2.rectangle(frame, (x0, y0), (x1, y1), (0, 0, 255), 2)
+        cv2.putText(frame, label_name, (x0, max(y0 - 5, 0)), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+    return frame
+
+class VideoDetectionsWriter:
+    # Детекции по кадрам пишутся в JSON и CSV после каждого батча, для длинного видео они не копятся в памяти
+    def __init__(self, json_path, csv_path):
+        self._json_file = open(json_path, 'w')
+        self._json_file.write("[")
+        self._first = True
+        self._csv_file = open(csv_path, 'w', newline='')
+        self._csv = csv.writer(self._csv_file)
+        self._csv.writerow(["frame", "time", "label", "confidence", "x0", "y0", "x1", "y1"])
+
+    def write(self, frame_detections):
+        for frame_data in frame_detections:
+            self._json_file.write(("" if self._first else ", ") + json.dumps(frame_data))
+            self._first = False
+            for detection in frame_data["detections"]:
+                self._csv.writerow([frame_data["frame"], f"{frame_data['time']:.3f}", detection["label"],
+                                    f"{detection['confidence']:.4f}", *(f"{value:.1f}" for value in detection["xyxy"])])
+
+    def close(self):
+        self._json_file.write("]")
+        self._json_file.close()
+        self._csv_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class _FrameReader(threading.Thread):
+    # Декодирует кадры в отдельном потоке и складывает их в ограниченную очередь
+    def __init__(self, cap, stride, queue_size=FRAME_QUEUE_SIZE):
+        super().__init__(name="video-decode", daemon=True)
+        self.cap = cap
+        self.stride = stride
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.stopped = threading.Event()
+        self.decode_seconds = 0.0
+        self.frame_count = 0
+        self.error = None
+
+    def _put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.frames.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run(self):
+        try:
+            while not self.stopped.is_set():
+                start = time.perf_counter()
+                if self.frame_count % self.stride:
+                    # Пропускаемые кадры не декодируем
+                    ok = self.cap.grab()
+                    frame = None
+                else:
+                    ok, frame = self.cap.read()
+                self.decode_seconds += time.perf_counter() - start
+                if not ok:
+                    break
+                frame_index = self.frame_count
+                self.frame_count += 1
+                if frame is not None and not self._put((frame_index, frame)):
+                    break
+        except Exception as e:
+            self.error = e
+        finally:
+            self._put(None)
+
+    def stop(self):
+        self.stopped.set()
+
+class MotionGate:
+    # Дешевая оценка движения: доля пикселей уменьшенного серого кадра, изменившихся относительно предыдущего
+    def __init__(self, threshold=MOTION_THRESHOLD, width=GATE_WIDTH, pixel_delta=25):
+        self.threshold = threshold
+        self.width = width
+        self.pixel_delta = pixel_delta
+        self._previous = None
+
+    def score(self, frame):
+        import cv2
+
+        height = max(1, int(frame.shape[0] * self.width / frame.shape[1]))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        previous, self._previous = self._previous, gray
+        if previous is None:
+            return 1.0
+        changed = cv2.absdiff(gray, previous) > self.pixel_delta
+        return float(changed.mean())
+
+    def has_motion(self, frame):
+        if self.threshold <= 0:
+            return True
+        return self.score(frame) >= self.threshold
+
+def process_video(model, video_path, stop_event=None, output_dir=None, stride=1, batch_size=BATCH_SIZE,
+                  show=None, motion_threshold=MOTION_THRESHOLD, queue_size=FRAME_QUEUE_SIZE):
+    import cv2
+
+    # Без output_dir сохраняется старое поведение: интерактивный просмотр кадр за кадром
+    if show is None:
+        show = output_dir is None
+    stride = max(1, stride)
+    batch_size = max(1, batch_size)
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video file {video_path}")
+    source_fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    writer = None
+    detections_writer = None
+    summary = {"video": video_path, "frames": 0, "processed_frames": 0}
+    if output_dir is not None:
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        base_name = os.path.splitext(os.path.basename(video_path))[0]
+        summary["annotated_video"] = os.path.join(output_dir, f"{base_name}_detections.mp4")
+        summary["detections_json"] = os.path.join(output_dir, f"{base_name}_detections.json")
+        summary["detections_csv"] = os.path.join(output_dir, f"{base_name}_detections.csv")
+        writer = cv2.VideoWriter(summary["annotated_video"], cv2.VideoWriter_fourcc(*"mp4v"),
+                                 source_fps / stride, (width, height))
+        detections_writer = VideoDetectionsWriter(summary["detections_json"], summary["detections_csv"])
+
+    gate = MotionGate(motion_threshold)
+    reader = _FrameReader(cap, stride, queue_size)
+    batch = []
+    last_detections = []
+    processed_frames = 0
+    inferred_frames = 0
+    gate_seconds = 0.0
+    inference_seconds = 0.0
+    quit_requested = False
+    start = time.perf_counter()
+
+    def flush_batch():
+        nonlocal quit_requested, last_detections, processed_frames, inferred_frames, inference_seconds
+        motion_frames = [frame for _, frame, has_motion in batch if has_motion]
+        outputs = iter(())
+        if motion_frames:
+            inference_start = time.perf_counter()
+            # ultralytics принимает BGR кадры из OpenCV напрямую, без конвертации в PIL
+            outputs = iter(run_inference(model, motion_frames, stop_event))
+            inference_seconds += time.perf_counter() - inference_start
+            inferred_frames += len(motion_frames)
+
+        frame_detections = []
+        for frame_index, frame, has_motion in batch:
+            # Кадры без движения наследуют детекции последнего обработанного кадра
+            if has_motion:
+                last_detections = result_detections(model, next(outputs))
+            frame_detections.append({
+                "frame": frame_index,
+                "time": frame_index / source_fps,
+                "inferred": has_motion,
+                "detections": [{"label": label_name, "confidence": confidence, "xyxy": xyxy}
+                               for xyxy, label_name, confidence in last_detections],
+            })
+            _draw_detections(frame, last_detections)
+            if writer is not None:
+                writer.write(frame)
+            if show and not quit_requested:
+                cv2.imshow('frame', frame)
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    quit_requested = True
+        if detections_writer is not None:
+            detections_writer.write(frame_detections)
+        processed_frames += len(frame_detections)
+        batch.clear()
+
+    reader.start()
+    try:
+        while not quit_requested:
+            if stop_event and stop_event.is_set():
+                raise InterruptedError("Процесс предсказания модели был прерван!.")
+            item = reader.frames.get()
+            if item is None:
+                break
+            frame_index, frame = item
+
+            gate_start = time.perf_counter()
+            has_motion = gate.has_motion(frame)
+            gate_seconds += time.perf_counter() - gate_start
+
+            batch.append((frame_index, frame, has_motion))
+            if len(batch) >= batch_size:
+                flush_batch()
+        if batch and not quit_requested:
+            flush_batch()
+        if reader.error is not None:
+            raise reader.error
+    finally:
+        reader.stop()
+        reader.join()
+        cap.release()
+        if writer is not None:
+            writer.release()
+        if detections_writer is not None:
+            detections_writer.close()
+        if show:
+            cv2.destroyAllWindows()
+
+    elapsed = time.perf_counter() - start
+    summary["frames"] = reader.frame_count
+    summary["processed_frames"] = processed_frames
+    summary["inferred_frames"] = inferred_frames
+    summary["seconds"] = elapsed
+    summary["fps"] = processed_frames / elapsed if elapsed > 0 else 0.0
+    summary["decode_seconds"] = reader.decode_seconds
+    summary["gate_seconds"] = gate_seconds
+    summary["inference_seconds"] = inference_seconds
+    logger.info(f"Processed {summary['processed_frames']} of {summary['frames']} frames of {video_path} "
+                f"in {elapsed:.1f}s ({summary['fps']:.1f} fps), detector ran on {inferred_frames} frames; "
+                f"decode {reader.decode_seconds:.2f}s, gate {gate_seconds:.2f}s, inference {inference_seconds:.2f}s")
+    return summary
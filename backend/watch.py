@@ -0,0 +1,180 @@
+# backend/watch.py
+# Наблюдение за папками, куда синхронизируются карты фотоловушек: новые изображения и архивы
+# классифицируются небольшими пачками по мере появления, результаты дописываются в запуск в метаданных.
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from backend import inference
+from backend.archive import is_archive, is_image
+from backend.metadata import get_metadata_store
+from backend.results import append_report
+from backend.timing import RunStats
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 2.0
+# Файл берется в работу, только когда его размер и mtime не менялись SETTLE_SECONDS (копирование закончено)
+SETTLE_SECONDS = 5.0
+LATENCY_WINDOW = 1000
+
+class FolderWatcher:
+    def __init__(self, directories, seen=(), settle_seconds=SETTLE_SECONDS):
+        self.directories = list(directories)
+        self.seen = set(seen)
+        self.settle_seconds = settle_seconds
+        self._pending = {}
+
+    def _scan(self):
+        for directory in self.directories:
+            for root, _, files in os.walk(directory):
+                for name in files:
+                    path = os.path.join(root, name)
+                    if is_image(path) or is_archive(path):
+                        yield path
+
+    def poll(self, now=None):
+        # Возвращает [(путь, время появления)] файлов, которые перестали меняться; каждый файл возвращается один раз.
+        # Время появления - первый опрос, заставший файл: mtime сохраняется при rsync -a, copy2 и импорте с карты
+        now = time.time() if now is None else now
+        ready = []
+        present = set()
+        for path in self._scan():
+            if path in self.seen:
+                continue
+            present.add(path)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # Файл удалили или переименовали между листингом и stat
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            previous = self._pending.get(path)
+            if previous is None or previous[0] != signature:
+                first_seen = now if previous is None else previous[2]
+                self._pending[path] = (signature, now, first_seen)
+                continue
+            if stat.st_size > 0 and now - previous[1] >= self.settle_seconds:
+                ready.append((path, previous[2]))
+                del self._pending[path]
+                self.seen.add(path)
+        for path in list(self._pending):
+            if path not in present:
+                del self._pending[path]
+        return sorted(ready)
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+def watch_folders(model, directories, stop_event=None, run_name=None, report_path=None,
+                  poll_interval=POLL_INTERVAL, settle_seconds=SETTLE_SECONDS, batch_size=inference.BATCH_SIZE,
+                  num_workers=inference.DECODE_WORKERS, use_cache=True, store=None, stats=None, max_polls=None):
+    store = store if store is not None else get_metadata_store()
+    stats = stats if stats is not None else RunStats()
+    stop_event = stop_event if stop_event is not None else threading.Event()
+    run_name = run_name or f"watch_{os.path.basename(os.path.normpath(directories[0]))}"
+
+    # Запуск с тем же именем продолжается: уже обработанные файлы не классифицируются повторно
+    run = store.get_run_by_name(run_name)
+    if run is None:
+        run_id = store.create_run(run_name, status="watching", inputs={"watch": list(directories)})
+        class_counts = {}
+        seen = set()
+        processed = set()
+    else:
+        run_id = run["id"]
+        class_counts = dict(run["class_counts"])
+        seen = store.seen_files(run_id)
+        # Изображения архива, сохраненные до остановки посреди архива, пропускаются
+        processed = store.processed_images(run_id)
+        store.set_status(run_id, "watching")
+        logger.info(f"Continuing {run_name}: {len(seen)} files already processed")
+
+    watcher = FolderWatcher(directories, seen, settle_seconds)
+    latencies = deque(maxlen=LATENCY_WINDOW)
+    arrivals = {}
+
+    def checkpoint(new_class_counts, new_image_classifications, seen_files=()):
+        now = time.time()
+        for key, value in new_class_counts.items():
+            class_counts[key] = class_counts.get(key, 0) + value
+        with stats.stage("checkpoint"):
+            # Файлы отмечаются обработанными в одной транзакции со своими результатами,
+            # поэтому после падения они не попадут в отчет второй раз
+            store.add_images(run_id, new_image_classifications, class_counts, seen_files)
+        if report_path:
+            with stats.stage("write_report"):
+                append_report(new_image_classifications, report_path)
+        # Задержка от появления файла в папке до сохраненного результата
+        for image_data in new_image_classifications:
+            latency = now - arrivals.get(image_data["image"], now)
+            latencies.append(latency)
+            stats.add("arrival_to_result", latency)
+
+    def image_checkpoint(new_class_counts, new_image_classifications):
+        checkpoint(new_class_counts, new_image_classifications,
+                   [image_data["image"] for image_data in new_image_classifications])
+
+    def process(description, classify):
+        # Ошибка одной пачки (битый архив, ошибка диска в кэше) не останавливает наблюдение;
+        # неотмеченные файлы пачки будут обработаны при следующем запуске
+        try:
+            classify()
+            return True
+        except InterruptedError:
+            raise
+        except Exception:
+            stats.count("failed_batches")
+            logger.exception(f"Error classifying {description}, will retry on the next start")
+            return False
+
+    logger.info(f"Watching {', '.join(directories)} for new images and archives (run {run_name})")
+    polls = 0
+    try:
+        while not stop_event.is_set():
+            with stats.stage("poll"):
+                ready = watcher.poll()
+            image_paths = [path for path, _ in ready if is_image(path)]
+            archive_paths = [path for path, _ in ready if is_archive(path)]
+            first_seen = dict(ready)
+            for image_path in image_paths:
+                arrivals[image_path] = first_seen[image_path]
+
+            if image_paths:
+                # Все готовые изображения одного опроса идут одним вызовом, модель получает полные батчи
+                if process(f"{len(image_paths)} new images", lambda: inference.process_images_classification(
+                        model, image_paths, stop_event=stop_event, batch_size=batch_size, num_workers=num_workers,
+                        use_cache=use_cache, stats=stats, result_callback=image_checkpoint)):
+                    # Изображения без результата (битые файлы) тоже больше не берутся в работу
+                    store.mark_files_seen(run_id, image_paths)
+                arrivals.clear()
+            for archive_path in archive_paths:
+                def archive_checkpoint(new_class_counts, new_image_classifications):
+                    for image_data in new_image_classifications:
+                        arrivals[image_data["image"]] = first_seen[archive_path]
+                    checkpoint(new_class_counts, new_image_classifications)
+
+                if process(archive_path, lambda: inference.process_archive_classification(
+                        model, archive_path, stop_event=stop_event, batch_size=batch_size, num_workers=num_workers,
+                        use_cache=use_cache, stats=stats, result_callback=archive_checkpoint, skip=processed)):
+                    store.mark_files_seen(run_id, [archive_path])
+                arrivals.clear()
+            if ready:
+                stats.count("files", len(ready))
+                if latencies:
+                    logger.info(f"Processed {len(ready)} new files, latency from arrival to result: "
+                                f"p50 {_percentile(latencies, 0.5):.2f}s, p95 {_percentile(latencies, 0.95):.2f}s")
+
+            polls += 1
+            if max_polls is not None and polls >= max_polls:
+                break
+            stop_event.wait(poll_interval)
+    except InterruptedError:
+        pass
+    finally:
+        store.finish_run(run_id, class_counts, stats.summary(), status="stopped")
+    return run_id, class_counts
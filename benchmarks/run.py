@@ -0,0 +1,298 @@
+# benchmarks/run.py
+# Воспроизводимый замер скорости основных путей: python -m benchmarks.run [--baseline benchmarks/baseline.json]
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+
+import numpy as np
+import psutil
+from PIL import Image
+
+from backend import inference
+from backend.decode import decode_image
+from backend.metadata import MetadataStore
+from backend.results import write_report
+from backend.video import process_video
+
+REGRESSION_THRESHOLD = 0.15
+
+class PeakRssSampler:
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.peak = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self.peak = max(self.peak, self.process.memory_info().rss)
+            self._stopped.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = self.process.memory_info().rss
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+def generate_images(directory, count, width, height, seed=0):
+    # Шум поверх градиента: JPEG такого изображения декодируется примерно как настоящий снимок
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    image_paths = []
+    for i in range(count):
+        noise = rng.normal(0, 40, (height, width, 3)).astype(np.float32)
+        pixels = np.clip(gradient + noise + i % 50, 0, 255).astype(np.uint8)
+        image_path = os.path.join(directory, f"synthetic_{i:05d}.jpg")
+        Image.fromarray(pixels).save(image_path, quality=90)
+        image_paths.append(image_path)
+    return image_paths
+
+def generate_archive(archive_path, image_paths):
+    with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_STORED) as zip_ref:
+        for image_path in image_paths:
+            zip_ref.write(image_path, os.path.join("DCIM", os.path.basename(image_path)))
+    return archive_path
+
+def generate_video(video_path, frames, width, height, fps=25, seed=0):
+    import cv2
+
+    rng = np.random.default_rng(seed)
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    background = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    for i in range(frames):
+        frame = background.copy()
+        x = (i * 7) % max(1, width - 80)
+        frame[height // 3:height // 3 + 60, x:x + 80] = 255
+        writer.write(frame)
+    writer.release()
+    return video_path
+
+def run_case(name, items, function, repeats):
+    durations = []
+    item_latencies = []
+    with PeakRssSampler() as sampler:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            latencies = function()
+            durations.append(time.perf_counter() - start)
+            if latencies:
+                item_latencies.extend(latencies)
+
+    samples = item_latencies or [duration / max(1, items) for duration in durations]
+    median_duration = statistics.median(durations)
+    result = {
+        "items": items,
+        "repeats": repeats,
+        "seconds": median_duration,
+        "throughput": items / median_duration if median_duration > 0 else 0.0,
+        "p50_ms": percentile(samples, 0.50) * 1000,
+        "p95_ms": percentile(samples, 0.95) * 1000,
+        "peak_rss_mb": sampler.peak / (1024 * 1024),
+    }
+    print(f"{name:32s} {result['throughput']:9.1f} items/s  p50 {result['p50_ms']:8.2f} ms  "
+          f"p95 {result['p95_ms']:8.2f} ms  peak RSS {result['peak_rss_mb']:7.1f} MB", file=sys.stderr)
+    return result
+
+class BatchLatencies:
+    # progress_callback вызывается после каждого батча: время батча делим на число изображений в нем
+    def __init__(self):
+        self.latencies = []
+        self._last = time.perf_counter()
+
+    def __call__(self, count):
+        now = time.perf_counter()
+        self.latencies.extend([(now - self._last) / max(1, count)] * count)
+        self._last = now
+
+def run_benchmarks(args, work_directory):
+    width, height = args.image_size
+    image_directory = os.path.join(work_directory, "images")
+    os.makedirs(image_directory)
+    image_paths = generate_images(image_directory, args.images, width, height)
+    archive_path = generate_archive(os.path.join(work_directory, "images.zip"), image_paths)
+    video_path = generate_video(os.path.join(work_directory, "video.mp4"), args.video_frames, width, height)
+
+    classification_model = (inference.load_model(args.classification_model, task="classify")
+                            if args.classification_model else inference.get_classification_model())
+    detection_model = (inference.load_model(args.detection_model, task="detect")
+                       if args.detection_model else inference.get_detection_model())
+    options = dict(batch_size=args.batch_size, num_workers=args.workers, use_cache=False)
+    # Прогрев, чтобы загрузка весов и первая компиляция не попали в замеры
+    inference.process_images_classification(classification_model, image_paths[:args.batch_size], **options)
+    inference.process_image_detection(detection_model, image_paths[0], use_cache=False)
+
+    results = {}
+
+    for decoder in ("full", "reduced"):
+        # Отдельно от модели: сколько стоит декодирование в полном и уменьшенном масштабе
+        def decode_images(decoder=decoder):
+            latencies = []
+            for image_path in image_paths:
+                start = time.perf_counter()
+                decode_image(image_path, inference.IMGSZ, decoder)
+                latencies.append(time.perf_counter() - start)
+            return latencies
+        results[f"decode_image_{decoder}"] = run_case(f"decode_image_{decoder}", len(image_paths), decode_images,
+                                                      args.repeats)
+
+    def classify_images():
+        latencies = BatchLatencies()
+        inference.process_images_classification(classification_model, image_paths, progress_callback=latencies,
+                                                **options)
+        return latencies.latencies
+    results["process_images_classification"] = run_case(
+        "process_images_classification", len(image_paths), classify_images, args.repeats)
+
+    def classify_archive():
+        latencies = BatchLatencies()
+        inference.process_archive_classification(classification_model, archive_path, progress_callback=latencies,
+                                                 **options)
+        return latencies.latencies
+    results["process_archive_classification"] = run_case(
+        "process_archive_classification", len(image_paths), classify_archive, args.repeats)
+
+    def detect_images():
+        latencies = []
+        for image_path in image_paths:
+            start = time.perf_counter()
+            inference.process_image_detection(detection_model, image_path, use_cache=False)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+    results["process_image_detection"] = run_case(
+        "process_image_detection", len(image_paths), detect_images, args.repeats)
+
+    def detect_video():
+        process_video(detection_model, video_path, output_dir=os.path.join(work_directory, "video_output"),
+                      batch_size=args.batch_size, show=False)
+    results["process_video"] = run_case("process_video", args.video_frames, detect_video, args.repeats)
+
+    # Результаты синтетического прогона того же размера, что и у реального
+    _, image_classifications = inference.process_images_classification(classification_model, image_paths,
+                                                                        **options)
+    image_classifications = (image_classifications * (args.result_rows // max(1, len(image_classifications)) + 1))
+    image_classifications = image_classifications[:args.result_rows]
+    class_counts = {"deer": len(image_classifications)}
+    store = MetadataStore(os.path.join(work_directory, "metadata", "metadata.sqlite"))
+    run_ids = []
+
+    def save_results():
+        # Как в приложении: результаты добавляются батчами по ходу запуска, затем запуск завершается
+        run_id = store.create_run()
+        for start in range(0, len(image_classifications), args.batch_size):
+            store.add_images(run_id, image_classifications[start:start + args.batch_size])
+        store.finish_run(run_id, class_counts)
+        run_ids.append(run_id)
+    results["save_classification_results"] = run_case(
+        "save_classification_results", len(image_classifications), save_results, args.repeats)
+
+    def export_excel():
+        # То же, что export_to_excel: чтение запуска из базы и запись отчета
+        write_report(store.iter_run_images(run_ids[-1]), os.path.join(work_directory, "reports", "report.xlsx"))
+    results["export_to_excel"] = run_case(
+        "export_to_excel", len(image_classifications), export_excel, args.repeats)
+    store.close()
+
+    return results
+
+def compare_with_baseline(results, baseline, threshold):
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get("results", {}).get(name)
+        if reference is None:
+            continue
+        if result["throughput"] < reference["throughput"] * (1 - threshold):
+            regressions.append(f"{name}: throughput {result['throughput']:.1f} < baseline {reference['throughput']:.1f}")
+        if result["p95_ms"] > reference["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {result['p95_ms']:.2f} ms > baseline {reference['p95_ms']:.2f} ms")
+    return regressions
+
+def image_size(value):
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="Замер скорости инференса и отчетов")
+    parser.add_argument("--images", type=int, default=200, help="Количество синтетических изображений")
+    parser.add_argument("--image-size", type=image_size, default=(1920, 1080), help="Размер изображений, например 1920x1080")
+    parser.add_argument("--video-frames", type=int, default=250)
+    parser.add_argument("--result-rows", type=int, default=100000, help="Строк в результатах для замера JSON/Excel")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("-b", "--batch-size", type=int, default=inference.BATCH_SIZE)
+    parser.add_argument("-w", "--workers", type=int, default=inference.DECODE_WORKERS)
+    parser.add_argument("--classification-model")
+    parser.add_argument("--detection-model")
+    parser.add_argument("-o", "--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="JSON с предыдущими результатами для сравнения")
+    parser.add_argument("--save-baseline", help="Сохранить результаты как новый baseline")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="Допустимое ухудшение относительно baseline (0.15 = 15%%)")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    work_directory = tempfile.mkdtemp(prefix="animal_benchmark_")
+    try:
+        results = run_benchmarks(args, work_directory)
+    finally:
+        shutil.rmtree(work_directory, ignore_errors=True)
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": {
+            "images": args.images,
+            "image_size": list(args.image_size),
+            "video_frames": args.video_frames,
+            "result_rows": args.result_rows,
+            "repeats": args.repeats,
+            "batch_size": args.batch_size,
+            "workers": args.workers,
+        },
+        "results": results,
+    }
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=4)
+    print(f"Saved benchmark results to {args.output}", file=sys.stderr)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as file:
+            json.dump(report, file, indent=4)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+        if baseline.get("config") != report["config"]:
+            print("Warning: baseline was recorded with a different configuration", file=sys.stderr)
+        regressions = compare_with_baseline(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+        print("No regressions against baseline", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
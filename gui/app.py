@@ -1,5 +1,9 @@
+import os
 import sys
+from PyQt5.QtCore import QTimer
 from PyQt5.QtWidgets import QApplication, QMainWindow, QTabWidget
+from backend.client import SERVER_ENV
+from backend.inference import seconds_since_start, start_warm_up
 from tabs.detection_tab import DetectionTab
 from tabs.classification_tab import ClassificationTab
 from tabs.metadata_tab import MetadataTab
@@ -30,10 +34,18 @@ class MainWindow(QMainWindow):
         self.tab_widget.addTab(self.metadata_tab, "Метаданные")
         self.tab_widget.addTab(self.reports_tab, "Отчеты")
 
+def on_window_shown():
+    logger.info(f"Time to window: {seconds_since_start():.2f}s since process start")
+    # Модели прогреваются в фоне, пока пользователь выбирает файлы; с сервисом инференса они живут в нем
+    if not os.environ.get(SERVER_ENV):
+        start_warm_up()
+
 if __name__ == "__main__":
     logger.debug("Starting application")
     app = QApplication(sys.argv)
     logger.debug(f"sys.argv: {sys.argv}")
     window = MainWindow()
     window.show()
+    # Срабатывает на первой итерации цикла событий, когда окно уже отрисовано
+    QTimer.singleShot(0, on_window_shown)
     sys.exit(app.exec_())
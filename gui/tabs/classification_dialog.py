@@ -1,5 +1,6 @@
 from PyQt5.QtWidgets import QDialog, QVBoxLayout, QLabel, QPushButton, QHBoxLayout
 from PyQt5.QtGui import QPixmap
+from backend.thumbnails import thumbnail_data
 import os
 
 class ClassificationDialog(QDialog):
@@ -11,7 +12,9 @@ class ClassificationDialog(QDialog):
         layout = QVBoxLayout()
         self.setLayout(layout)
 
-        pixmap = QPixmap(image_path)
+        # Миниатюра из кэша, сохраненная при классификации; оригинал (в том числе из архива) не читается заново
+        pixmap = QPixmap()
+        pixmap.loadFromData(thumbnail_data(image_path)[0])
 
         image_label = QLabel()
         image_label.setPixmap(pixmap)
@@ -1,54 +1,115 @@
 from PyQt5.QtCore import Qt, QThread, pyqtSignal, QCoreApplication, QEventLoop
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QPushButton, QFileDialog, QMessageBox, QProgressDialog, QDialog
-from backend.inference import process_archive_classification, classification_model, process_images_classification
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QPushButton, QFileDialog, QMessageBox, QProgressDialog, QInputDialog
+from backend.inference import iter_archive_classification, get_classification_model, iter_images_classification, BATCH_SIZE
+from backend.archive import is_archive, is_image
+from backend.client import get_inference_client
+from backend.metadata import get_metadata_store
+from backend.results import animal_dict
+from backend.timing import RunStats
 from utils.display import display_plot
-from utils.file_operations import save_classification_results, export_to_excel, load_history_files
+from utils.file_operations import save_classification_results, export_to_excel, start_classification_run, save_result_stream
 from utils.logger import logger
-from .classification_dialog import ClassificationDialog
-import tempfile
+from .review_dialog import ReviewDialog
+from functools import partial
 import threading
 
 class ClassificationWorker(QThread):
     progress_changed = pyqtSignal(int)
-    classification_done = pyqtSignal(dict, list)
+    results_saved = pyqtSignal(int, dict)
+    classification_done = pyqtSignal(dict)
     error_occurred = pyqtSignal(str)
 
-    def __init__(self, file_paths, model, extract_to):
+    def __init__(self, file_paths, model=None, batch_size=BATCH_SIZE, run_id=None):
         super().__init__()
         self.file_paths = file_paths
         self.model = model
-        self.extract_to = extract_to
+        self.batch_size = batch_size
         self._is_running = True
         self.stop_event = threading.Event()
+        self.stats = RunStats()
+        self.run_id = run_id
 
     def run(self):
-        class_counts = {}
-        image_classifications = []
+        # Если запущен общий сервис инференса, модель в этом процессе не загружается
+        client = get_inference_client() if self.model is None else None
+        if client is not None:
+            classify_images = client.iter_images_classification
+            classify_archive = client.iter_archive_classification
+        else:
+            # Модель загружается в рабочем потоке, чтобы не блокировать окно, если прогрев еще не закончился
+            if self.model is None:
+                self.model = get_classification_model()
+            classify_images = partial(iter_images_classification, self.model)
+            classify_archive = partial(iter_archive_classification, self.model)
+
+        store = get_metadata_store()
+        if self.run_id is None:
+            self.run_id = start_classification_run(self.file_paths, self.batch_size)
+            class_counts = {}
+            done_images = set()
+        else:
+            # Продолжение прерванного запуска: счетчики из контрольной точки, готовые изображения пропускаются
+            class_counts = dict(store.get_run(self.run_id)["class_counts"])
+            done_images = store.processed_images(self.run_id)
+            store.set_status(self.run_id, "running")
+            logger.info(f"Resuming run {self.run_id}, {len(done_images)} images already processed")
+
+        processed = len(done_images)
+
+        def on_saved(batch):
+            nonlocal processed
+            processed += len(batch)
+            self.results_saved.emit(processed, dict(class_counts))
+
+        def save(image_classifications):
+            # Результаты не копятся в памяти: поток сразу пишется в метаданные, окно получает счетчики
+            save_result_stream(self.run_id, image_classifications, class_counts, self.batch_size, self.stats, on_saved)
+
+        options = dict(stats=self.stats, skip=done_images, thumbnails=True, class_counts=class_counts)
+        files_done = 0
+
+        def advance(count):
+            nonlocal files_done
+            files_done += count
+            self.progress_changed.emit(files_done)
+
+        # Подряд идущие изображения уходят одним потоковым вызовом: пул потоков декодирует следующие батчи,
+        # пока модель считает текущий. Прогресс (включая уже обработанные и пропущенные) идет через progress_callback
+        image_run = []
+
+        def classify_image_run():
+            if image_run:
+                save(classify_images(list(image_run), stop_event=self.stop_event, batch_size=self.batch_size,
+                                     progress_callback=advance, **options))
+            image_run.clear()
 
         try:
-            for i, file_path in enumerate(self.file_paths):
+            for file_path in self.file_paths:
                 if self.stop_event.is_set():
                     break
-
-                if file_path.endswith('.zip'):
-                    new_class_counts, new_image_classifications = process_archive_classification(
-                        self.model, file_path, self.extract_to, self.stop_event)
-                elif file_path.endswith(('.png', '.jpg', '.jpeg')):
-                    new_class_counts, new_image_classifications = process_images_classification(
-                        self.model, [file_path], self.stop_event)
-                else:
+                if is_image(file_path):
+                    image_run.append(file_path)
                     continue
+                if is_archive(file_path):
+                    classify_image_run()
+                    save(classify_archive(file_path, self.stop_event, self.batch_size, **options))
+                advance(1)
 
-                for key, value in new_class_counts.items():
-                    class_counts[key] = class_counts.get(key, 0) + value
-                image_classifications.extend(new_image_classifications)
-                self.progress_changed.emit(i + 1)
+            if not self.stop_event.is_set():
+                classify_image_run()
+            self.progress_changed.emit(len(self.file_paths))
 
             if not self.stop_event.is_set():
-                self.classification_done.emit(class_counts, image_classifications)
+                self.classification_done.emit(class_counts)
+            else:
+                store.set_status(self.run_id, "stopped")
 
+        except InterruptedError:
+            logger.info(f"Classification run {self.run_id} stopped, it can be resumed later")
+            store.set_status(self.run_id, "stopped")
         except Exception as e:
             logger.error(f"Error during classification: {e}")
+            store.set_status(self.run_id, "failed")
             self.error_occurred.emit(str(e))
 
     def stop(self):
@@ -60,29 +121,55 @@ class ClassificationTab(QWidget):
         super().__init__()
         self.layout = QVBoxLayout()
         self.setLayout(self.layout)
+        self.worker = None
 
         self.classification_button = QPushButton("Загрузить файл для классификации")
         self.classification_button.clicked.connect(self.load_file_classification)
         self.layout.addWidget(self.classification_button)
 
+        self.resume_button = QPushButton("Продолжить прерванный запуск")
+        self.resume_button.clicked.connect(self.resume_classification)
+        self.layout.addWidget(self.resume_button)
+
     def load_file_classification(self):
         logger.debug("Loading file for classification")
         file_paths, _ = QFileDialog.getOpenFileNames(self, "Открыть файлы", "",
-                                                     "Все файлы (*.*);;Архивы (*.zip);;Изображения (*.png *.jpg *.jpeg)")
+                                                     "Все файлы (*.*);;Архивы (*.zip *.tar *.tar.gz *.tgz);;Изображения (*.png *.jpg *.jpeg)")
         if not file_paths:
             logger.debug("No files selected for classification")
             return
 
         logger.debug(f"Files selected for classification: {file_paths}")
+        self.start_classification(file_paths)
+
+    def resume_classification(self):
+        if self.worker is not None and self.worker.isRunning():
+            self.show_error("Классификация уже выполняется")
+            return
+
+        runs = get_metadata_store().interrupted_runs()
+        if not runs:
+            QMessageBox.information(self, "Информация", "Нет прерванных запусков")
+            return
+
+        names = [f"{run['name']} (обработано изображений: {run['image_count']})" for run in runs]
+        name, ok = QInputDialog.getItem(self, "Продолжить запуск", "Прерванный запуск:", names, 0, False)
+        if not ok:
+            return
+        run = runs[names.index(name)]
+        logger.debug(f"Resuming classification run: {run['name']}")
+        self.start_classification(run["inputs"]["file_paths"], run["inputs"].get("batch_size", BATCH_SIZE), run["id"])
 
+    def start_classification(self, file_paths, batch_size=BATCH_SIZE, run_id=None):
         self.progress_dialog = QProgressDialog("Обработка изображений...", "Отмена", 0, len(file_paths), self)
         self.progress_dialog.setWindowTitle("Прогресс обработки")
         self.progress_dialog.setWindowModality(Qt.WindowModal)
         self.progress_dialog.canceled.connect(self.cancel_classification)
         self.progress_dialog.show()
 
-        self.worker = ClassificationWorker(file_paths, classification_model, tempfile.mkdtemp())
+        self.worker = ClassificationWorker(file_paths, batch_size=batch_size, run_id=run_id)
         self.worker.progress_changed.connect(self.update_progress)
+        self.worker.results_saved.connect(self.update_counts)
         self.worker.classification_done.connect(self.on_classification_done)
         self.worker.error_occurred.connect(self.on_classification_error)
         self.worker.start()
@@ -91,52 +178,38 @@ class ClassificationTab(QWidget):
         self.progress_dialog.setValue(value)
         QCoreApplication.processEvents(QEventLoop.AllEvents, 100)
 
+    def update_counts(self, processed, class_counts):
+        counts = ", ".join(f"{animal_dict.get(label_name, label_name)}: {count}"
+                           for label_name, count in sorted(class_counts.items()))
+        self.progress_dialog.setLabelText(f"Обработка изображений...\nОбработано изображений: {processed}\n{counts}")
+
     def cancel_classification(self):
         if self.worker.isRunning():
             self.worker.stop()
 
-    def on_classification_done(self, class_counts, image_classifications):
+    def on_classification_done(self, class_counts):
         self.progress_dialog.close()
         if not class_counts:
             self.show_error("Ошибка при классификации: См. логи для подробностей")
             return
 
-        images_to_classify = self.get_images_to_classify(image_classifications)
+        run_id = self.worker.run_id
+        review_dialog = ReviewDialog(run_id, ['roedeer', 'deer', 'muskdeer'], self)
 
-        QMessageBox.information(self, "Информация", f"Найдено изображений для ручной классификации: {len(images_to_classify)}")
+        QMessageBox.information(self, "Информация", f"Найдено изображений для ручной классификации: {review_dialog.model.total}")
 
-        self.show_classification_dialogs(images_to_classify)
+        if review_dialog.model.total:
+            review_dialog.exec_()
 
-        save_classification_results(class_counts, image_classifications)
+        save_classification_results(run_id, class_counts, self.worker.stats)
         display_plot(self, class_counts)
 
         main_window = self.window()
         main_window.metadata_tab.load_history_files()
-        main_window.reports_tab.load_report_files()
 
-        history_files = load_history_files()
-        latest_history_file = sorted(history_files)[-1]
-        export_to_excel(latest_history_file)
+        export_to_excel(run_id)
         main_window.reports_tab.load_report_files()
 
-    def get_images_to_classify(self, image_classifications):
-        images_to_classify = []
-        for image_data in image_classifications:
-            for class_data in image_data["classes"]:
-                if isinstance(class_data, tuple) and len(class_data) == 2:
-                    class_name, class_prob = class_data
-                    if 0.4 <= class_prob <= 0.55:
-                        images_to_classify.append(image_data)
-                        break
-        return images_to_classify
-
-    def show_classification_dialogs(self, images_to_classify):
-        for image_data in images_to_classify:
-            dialog = ClassificationDialog(image_data["image"], ['roedeer', 'deer', 'muskdeer'], self)
-            if dialog.exec_() == QDialog.Accepted:
-                selected_class = dialog.selected_class
-                image_data["classes"] = [[selected_class, 1.0]]
-
     def on_classification_error(self, message):
         self.progress_dialog.close()
         self.show_error(f"Ошибка при классификации: {message}")
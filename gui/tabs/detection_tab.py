@@ -1,36 +1,210 @@
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QPushButton, QFileDialog, QMessageBox
-from backend.inference import process_image_detection, detection_model, process_video
+from PyQt5.QtCore import Qt, QThread, pyqtSignal, QCoreApplication, QEventLoop, QUrl
+from PyQt5.QtGui import QDesktopServices
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QPushButton, QFileDialog, QMessageBox, QProgressDialog
+from backend.inference import iter_images_detection, get_detection_model, BATCH_SIZE
+from backend.archive import is_image
+from backend.client import get_inference_client
+from backend.metadata import get_metadata_store
+from backend.thumbnails import load_thumbnail
+from backend.timing import RunStats
+from backend.video import process_video
 from utils.display import display_image
+from utils.file_operations import start_detection_run, save_detection_results, save_result_stream
 from utils.logger import logger
+from functools import partial
+import os
+import threading
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi')
+videos_directory = "videos"
+
+def is_video(path):
+    return path.lower().endswith(VIDEO_EXTENSIONS)
+
+def collect_detection_files(directory):
+    file_paths = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            if is_image(path) or is_video(path):
+                file_paths.append(path)
+    return sorted(file_paths)
+
+class DetectionWorker(QThread):
+    progress_changed = pyqtSignal(int)
+    detection_done = pyqtSignal(dict, list)
+    error_occurred = pyqtSignal(str)
+
+    def __init__(self, file_paths, model=None, batch_size=BATCH_SIZE):
+        super().__init__()
+        self.file_paths = file_paths
+        self.model = model
+        self.batch_size = batch_size
+        self.stop_event = threading.Event()
+        self.stats = RunStats()
+        self.run_id = None
+
+    def run(self):
+        image_paths = [file_path for file_path in self.file_paths if is_image(file_path)]
+        video_paths = [file_path for file_path in self.file_paths if is_video(file_path)]
+
+        # Изображения отправляются в общий сервис инференса, если он запущен; видео обрабатывается в процессе
+        client = get_inference_client() if self.model is None and image_paths else None
+        if client is not None:
+            detect_images = client.iter_images_detection
+        else:
+            # Модель загружается в рабочем потоке, как и в ClassificationWorker
+            if self.model is None:
+                self.model = get_detection_model()
+            detect_images = partial(iter_images_detection, self.model)
+        if video_paths and self.model is None:
+            self.model = get_detection_model()
+
+        store = get_metadata_store()
+        class_counts = {}
+        video_summaries = []
+        processed = 0
+
+        def report_progress(count):
+            nonlocal processed
+            processed += count
+            self.progress_changed.emit(processed)
+
+        try:
+            if image_paths:
+                self.run_id = start_detection_run()
+                # Детекции по каждому изображению сохраняются в метаданные порциями по мере готовности
+                image_results = detect_images(image_paths, self.stop_event, self.batch_size,
+                                              progress_callback=report_progress, stats=self.stats, thumbnails=True,
+                                              class_counts=class_counts)
+                save_result_stream(self.run_id, image_results, class_counts, self.batch_size, self.stats)
+
+            for video_path in video_paths:
+                if self.stop_event.is_set():
+                    break
+                # Окно cv2 нельзя показывать из рабочего потока: размеченное видео сохраняется в папку videos
+                video_summaries.append(process_video(self.model, video_path, self.stop_event,
+                                                     output_dir=videos_directory, batch_size=self.batch_size,
+                                                     show=False))
+                report_progress(1)
+
+            if not self.stop_event.is_set():
+                self.detection_done.emit(class_counts, video_summaries)
+            elif self.run_id is not None:
+                store.set_status(self.run_id, "stopped")
+
+        except InterruptedError:
+            logger.info("Detection stopped")
+            if self.run_id is not None:
+                store.set_status(self.run_id, "stopped")
+        except Exception as e:
+            logger.error(f"Error during detection: {e}")
+            if self.run_id is not None:
+                store.set_status(self.run_id, "failed")
+            self.error_occurred.emit(str(e))
+
+    def stop(self):
+        self.stop_event.set()
+        self.wait()
 
 class DetectionTab(QWidget):
     def __init__(self):
         super().__init__()
         self.layout = QVBoxLayout()
         self.setLayout(self.layout)
+        self.worker = None
 
         self.detection_button = QPushButton("Загрузить файл для детекции")
         self.detection_button.clicked.connect(self.load_file_detection)
         self.layout.addWidget(self.detection_button)
 
+        self.folder_detection_button = QPushButton("Выбрать папку для детекции")
+        self.folder_detection_button.clicked.connect(self.load_folder_detection)
+        self.layout.addWidget(self.folder_detection_button)
+
     def load_file_detection(self):
         logger.debug("Loading file for detection")
-        file_path, _ = QFileDialog.getOpenFileName(self, "Открыть файл", "",
-                                                   "Все файлы (*.*);;Изображения (*.png *.jpg *.jpeg);;Видео (*.mp4 *.avi)")
-        if not file_path:
+        file_paths, _ = QFileDialog.getOpenFileNames(self, "Открыть файлы", "",
+                                                     "Все файлы (*.*);;Изображения (*.png *.jpg *.jpeg);;Видео (*.mp4 *.avi)")
+        if not file_paths:
             logger.debug("No file selected for detection")
             return
 
-        logger.debug(f"File selected for detection: {file_path}")
+        logger.debug(f"Files selected for detection: {file_paths}")
+        self.start_detection(file_paths)
 
-        if file_path.endswith(('.png', '.jpg', '.jpeg')):
-            img, detections = process_image_detection(detection_model, file_path)
-            display_image(self, img, detections)
-        elif file_path.endswith(('.mp4', '.avi')):
-            process_video(detection_model, file_path)
-        else:
+    def load_folder_detection(self):
+        logger.debug("Loading folder for detection")
+        directory = QFileDialog.getExistingDirectory(self, "Выбрать папку")
+        if not directory:
+            logger.debug("No folder selected for detection")
+            return
+
+        logger.debug(f"Folder selected for detection: {directory}")
+        self.start_detection(collect_detection_files(directory))
+
+    def start_detection(self, file_paths):
+        supported_paths = [file_path for file_path in file_paths if is_image(file_path) or is_video(file_path)]
+        if not supported_paths:
             self.show_error("Неподдерживаемый формат файла!")
             logger.error("Unsupported file format for detection")
+            return
+        if self.worker is not None and self.worker.isRunning():
+            self.show_error("Детекция уже выполняется")
+            return
+
+        self.progress_dialog = QProgressDialog("Детекция...", "Отмена", 0, len(supported_paths), self)
+        self.progress_dialog.setWindowTitle("Прогресс обработки")
+        self.progress_dialog.setWindowModality(Qt.WindowModal)
+        self.progress_dialog.canceled.connect(self.cancel_detection)
+        self.progress_dialog.show()
+
+        self.worker = DetectionWorker(supported_paths)
+        self.worker.progress_changed.connect(self.update_progress)
+        self.worker.detection_done.connect(self.on_detection_done)
+        self.worker.error_occurred.connect(self.on_detection_error)
+        self.worker.start()
+
+    def update_progress(self, value):
+        self.progress_dialog.setValue(value)
+        QCoreApplication.processEvents(QEventLoop.AllEvents, 100)
+
+    def cancel_detection(self):
+        if self.worker.isRunning():
+            self.worker.stop()
+
+    def on_detection_done(self, class_counts, video_summaries):
+        self.progress_dialog.close()
+        store = get_metadata_store()
+        run_id = self.worker.run_id
+        run = None
+        if run_id is not None:
+            save_detection_results(run_id, class_counts, self.worker.stats, video_summaries)
+            self.window().metadata_tab.load_history_files()
+            run = store.get_run(run_id)
+
+        if run is not None and run["image_count"] == 1 and not video_summaries:
+            # Одно изображение: показываем его с рамками поверх миниатюры, сохраненной во время детекции
+            image_data = store.query_images(run_id=run_id, limit=1)[0]
+            detections = [(detection["xyxy"], detection["label"]) for detection in image_data["detections"]]
+            display_image(self, load_thumbnail(image_data["image"]), detections)
+            return
+
+        if run is None and len(video_summaries) == 1:
+            # Окно cv2 во время обработки недоступно из рабочего потока: открываем готовое размеченное видео
+            QDesktopServices.openUrl(QUrl.fromLocalFile(os.path.abspath(video_summaries[0]["annotated_video"])))
+            return
+
+        lines = []
+        if run is not None:
+            lines.append(f"Обработано изображений: {run['image_count']}, результаты сохранены в {run['name']}")
+        for summary in video_summaries:
+            lines.append(f"Размеченное видео сохранено: {summary['annotated_video']}")
+        QMessageBox.information(self, "Детекция завершена", "\n".join(lines))
+
+    def on_detection_error(self, message):
+        self.progress_dialog.close()
+        self.show_error(f"Ошибка при детекции: {message}")
 
     def show_error(self, message):
         logger.error(f"Error: {message}")
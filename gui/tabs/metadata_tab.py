@@ -1,5 +1,7 @@
+from PyQt5.QtCore import Qt
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QPushButton, QListWidget, QDialog, QTextEdit, QMessageBox, QListWidgetItem
-from utils.file_operations import load_history_files, load_classification_history, export_to_excel, clear_directory, metadata_directory
+from utils.file_operations import (load_history_files, load_classification_history, load_classification_results,
+                                   export_report, clear_metadata)
 from utils.display import display_plot
 from utils.logger import logger
 import json
@@ -23,10 +25,18 @@ class MetadataTab(QWidget):
         self.view_plot_button.clicked.connect(self.load_selected_classification_history)
         self.layout.addWidget(self.view_plot_button)
 
-        self.export_excel_button = QPushButton("Экспортировать выбранный JSON в Excel")
-        self.export_excel_button.clicked.connect(self.export_selected_to_excel)
+        self.export_excel_button = QPushButton("Экспортировать выбранный запуск в Excel")
+        self.export_excel_button.clicked.connect(lambda: self.export_selected('.xlsx'))
         self.layout.addWidget(self.export_excel_button)
 
+        self.export_csv_button = QPushButton("Экспортировать выбранный запуск в CSV")
+        self.export_csv_button.clicked.connect(lambda: self.export_selected('.csv'))
+        self.layout.addWidget(self.export_csv_button)
+
+        self.export_parquet_button = QPushButton("Экспортировать выбранный запуск в Parquet")
+        self.export_parquet_button.clicked.connect(lambda: self.export_selected('.parquet'))
+        self.layout.addWidget(self.export_parquet_button)
+
         self.clear_metadata_button = QPushButton("Очистить метаданные")
         self.clear_metadata_button.clicked.connect(self.clear_metadata)
         self.layout.addWidget(self.clear_metadata_button)
@@ -37,9 +47,10 @@ class MetadataTab(QWidget):
         logger.debug("Loading history files")
         try:
             self.metadata_list.clear()
-            history_files = load_history_files()
-            for filename in history_files:
-                item = QListWidgetItem(filename)
+            for run in load_history_files():
+                task = "детекция, " if run["task"] == "detection" else ""
+                item = QListWidgetItem(f"{run['name']} ({task}{run['image_count']})")
+                item.setData(Qt.UserRole, run["id"])
                 self.metadata_list.addItem(item)
         except Exception as e:
             logger.error(f"Error loading history files: {e}")
@@ -51,12 +62,15 @@ class MetadataTab(QWidget):
             self.show_error("Файл истории не выбран!")
             return
 
-        filename = selected_items[0].text()
-        logger.debug(f"Selected classification history file: {filename}")
+        run_id = selected_items[0].data(Qt.UserRole)
+        logger.debug(f"Selected classification history run: {run_id}")
         try:
-            data = load_classification_history(filename)
+            data = load_classification_history(run_id)
             class_counts = data["class_counts"]
-            display_plot(self, class_counts)
+            if data["task"] == "detection":
+                display_plot(self, class_counts, 'Результаты детекции', 'Количество рамок')
+            else:
+                display_plot(self, class_counts)
         except Exception as e:
             logger.error(f"Error loading classification history: {e}")
             self.show_error(f"Ошибка загрузки истории классификации: {e}")
@@ -67,12 +81,10 @@ class MetadataTab(QWidget):
             self.show_error("Файл истории не выбран!")
             return
 
-        filename = selected_items[0].text()
-        json_path = os.path.join(metadata_directory, filename)
-        logger.debug(f"Viewing selected JSON file: {json_path}")
+        run_id = selected_items[0].data(Qt.UserRole)
+        logger.debug(f"Viewing selected run as JSON: {run_id}")
         try:
-            with open(json_path, 'r') as json_file:
-                json_data = json.load(json_file)
+            json_data = load_classification_results(run_id)
 
             dialog = QDialog(self)
             dialog.setWindowTitle("Просмотр JSON")
@@ -86,25 +98,26 @@ class MetadataTab(QWidget):
             logger.error(f"Error viewing JSON file: {e}")
             self.show_error(f"Ошибка при просмотре JSON файла: {e}")
 
-    def export_selected_to_excel(self):
+    def export_selected(self, extension):
         selected_items = self.metadata_list.selectedItems()
         if not selected_items:
             self.show_error("Файл истории не выбран!")
             return
 
-        filename = selected_items[0].text()
-        logger.debug(f"Exporting selected JSON to Excel: {filename}")
+        run_id = selected_items[0].data(Qt.UserRole)
+        logger.debug(f"Exporting selected run to {extension}: {run_id}")
         try:
-            excel_path = export_to_excel(filename)
-            QMessageBox.information(self, "Экспорт успешен", f"Данные экспортированы в Excel файл:\n{excel_path}")
+            report_path = export_report(run_id, extension)
+            QMessageBox.information(self, "Экспорт успешен", f"Данные экспортированы в файл:\n{report_path}")
             # Обновляем список отчетов
             main_window = self.window()
             main_window.reports_tab.load_report_files()
-            # Открываем созданный отчет
-            self.open_report(excel_path)
+            # Открываем созданный отчет; для Parquet обычно нет программы просмотра
+            if extension != '.parquet':
+                self.open_report(report_path)
         except Exception as e:
-            logger.error(f"Error exporting to Excel: {e}")
-            self.show_error(f"Ошибка экспорта в Excel: {e}")
+            logger.error(f"Error exporting report: {e}")
+            self.show_error(f"Ошибка экспорта отчета: {e}")
 
     def open_report(self, report_path):
         logger.debug(f"Opening report: {report_path}")
@@ -122,7 +135,7 @@ class MetadataTab(QWidget):
             self.show_error(f"Ошибка открытия отчета: {e}")
 
     def clear_metadata(self):
-        if clear_directory(metadata_directory, self):
+        if clear_metadata(self):
             self.load_history_files()
 
     def show_error(self, message):
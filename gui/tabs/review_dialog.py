@@ -0,0 +1,220 @@
+from collections import OrderedDict
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QObject, QRunnable, QSize, QThreadPool, pyqtSignal
+from PyQt5.QtGui import QImage, QPixmap, QKeySequence
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QListView, QPushButton, QLabel, QShortcut,
+                             QAbstractItemView)
+from backend.metadata import get_metadata_store
+from backend.results import animal_dict
+from backend.thumbnails import thumbnail_data
+from utils.logger import logger
+from .classification_dialog import ClassificationDialog
+import os
+
+# Диапазон уверенности, в котором изображения отправляются на ручную проверку
+REVIEW_MIN_CONFIDENCE = 0.4
+REVIEW_MAX_CONFIDENCE = 0.55
+PAGE_SIZE = 500
+GRID_THUMBNAIL_SIZE = 160
+PIXMAP_CACHE_SIZE = 2000
+THUMBNAIL_THREADS = 4
+
+class ThumbnailSignals(QObject):
+    loaded = pyqtSignal(str, QImage)
+
+class ThumbnailLoader(QRunnable):
+    # QImage можно создавать вне GUI потока, QPixmap - только в нем
+    def __init__(self, image_path, signals):
+        super().__init__()
+        self.image_path = image_path
+        self.signals = signals
+
+    def run(self):
+        image = QImage()
+        try:
+            data, _ = thumbnail_data(self.image_path)
+            image.loadFromData(data)
+            image = image.scaled(GRID_THUMBNAIL_SIZE, GRID_THUMBNAIL_SIZE, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        except Exception as e:
+            logger.error(f"Error loading thumbnail for {self.image_path}: {e}")
+        self.signals.loaded.emit(self.image_path, image)
+
+class ReviewModel(QAbstractListModel):
+    # Строки подгружаются страницами по мере прокрутки (canFetchMore/fetchMore),
+    # миниатюры запрашиваются только для видимых элементов и грузятся в пуле потоков
+    def __init__(self, run_id, min_confidence=REVIEW_MIN_CONFIDENCE, max_confidence=REVIEW_MAX_CONFIDENCE, parent=None):
+        super().__init__(parent)
+        self.store = get_metadata_store()
+        self.run_id = run_id
+        # Выборка фиксируется при открытии: размеченные изображения выходят из диапазона, но остаются в списке
+        self.image_ids = self.store.image_ids(run_id=run_id, min_confidence=min_confidence,
+                                              max_confidence=max_confidence)
+        self.items = []
+        self.rows_by_path = {}
+        self.labeled_rows = set()
+        self.pixmaps = OrderedDict()
+        self.loading = set()
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(THUMBNAIL_THREADS)
+        self.signals = ThumbnailSignals()
+        self.signals.loaded.connect(self.on_thumbnail_loaded)
+
+    @property
+    def total(self):
+        return len(self.image_ids)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.items)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and len(self.items) < len(self.image_ids)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        page_ids = self.image_ids[len(self.items):len(self.items) + PAGE_SIZE]
+        page = self.store.images_by_ids(page_ids)
+        if len(page) < len(page_ids):
+            # Часть изображений удалена из базы, пока окно было открыто
+            self.image_ids = self.image_ids[:len(self.items)] + [image_id for image_id, _ in page]
+        if not page:
+            return
+        first = len(self.items)
+        self.beginInsertRows(QModelIndex(), first, first + len(page) - 1)
+        for row, (image_id, image_data) in enumerate(page, first):
+            self.items.append((image_id, image_data))
+            self.rows_by_path.setdefault(image_data["image"], []).append(row)
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        _, image_data = self.items[index.row()]
+        image_path = image_data["image"]
+        if role == Qt.DisplayRole:
+            classes = image_data["classes"]
+            label = ""
+            if classes:
+                label_name, confidence = classes[0]
+                label = f"{animal_dict.get(label_name, label_name)} {confidence:.2f}"
+            return f"{os.path.basename(image_path)}\n{label}"
+        if role == Qt.DecorationRole:
+            return self.thumbnail(image_path)
+        if role == Qt.ToolTipRole:
+            return image_path
+        if role == Qt.UserRole:
+            return image_path
+        return None
+
+    def thumbnail(self, image_path):
+        pixmap = self.pixmaps.get(image_path)
+        if pixmap is not None:
+            self.pixmaps.move_to_end(image_path)
+            return pixmap
+        if image_path not in self.loading:
+            self.loading.add(image_path)
+            self.thread_pool.start(ThumbnailLoader(image_path, self.signals))
+        return None
+
+    def on_thumbnail_loaded(self, image_path, image):
+        self.loading.discard(image_path)
+        self.pixmaps[image_path] = QPixmap.fromImage(image)
+        # Храним ограниченное число миниатюр, при прокрутке назад они загрузятся снова
+        while len(self.pixmaps) > PIXMAP_CACHE_SIZE:
+            self.pixmaps.popitem(last=False)
+        for row in self.rows_by_path.get(image_path, []):
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+    def set_label(self, rows, label_name):
+        updates = []
+        for row in rows:
+            image_id, image_data = self.items[row]
+            image_data["classes"] = [[label_name, 1.0]]
+            updates.append((image_id, image_data))
+            self.labeled_rows.add(row)
+        if not updates:
+            return
+        self.store.update_images(updates)
+        self.dataChanged.emit(self.index(min(rows)), self.index(max(rows)), [Qt.DisplayRole])
+
+    def stop_loading(self):
+        self.thread_pool.clear()
+        self.thread_pool.waitForDone()
+
+class ReviewDialog(QDialog):
+    def __init__(self, run_id, class_options, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Ручная классификация")
+        self.resize(1000, 700)
+        self.class_options = class_options
+
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+
+        self.model = ReviewModel(run_id, parent=self)
+        shortcuts_hint = ", ".join(f"{i + 1} - {animal_dict.get(class_option, class_option)}"
+                                   for i, class_option in enumerate(class_options))
+        self.status_label = QLabel()
+        layout.addWidget(QLabel(f"Выделите изображения (Ctrl/Shift + клик, Ctrl+A) и выберите класс: {shortcuts_hint}. "
+                                f"Двойной клик открывает изображение крупнее."))
+        layout.addWidget(self.status_label)
+
+        self.view = QListView()
+        self.view.setViewMode(QListView.IconMode)
+        self.view.setResizeMode(QListView.Adjust)
+        self.view.setMovement(QListView.Static)
+        # Одинаковый размер элементов и пакетная раскладка: вид не измеряет каждый из десятков тысяч элементов
+        self.view.setUniformItemSizes(True)
+        self.view.setLayoutMode(QListView.Batched)
+        self.view.setBatchSize(200)
+        self.view.setIconSize(QSize(GRID_THUMBNAIL_SIZE, GRID_THUMBNAIL_SIZE))
+        self.view.setGridSize(QSize(GRID_THUMBNAIL_SIZE + 20, GRID_THUMBNAIL_SIZE + 50))
+        self.view.setWordWrap(True)
+        self.view.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.view.setModel(self.model)
+        self.view.doubleClicked.connect(self.open_image)
+        layout.addWidget(self.view)
+
+        button_layout = QHBoxLayout()
+        for i, class_option in enumerate(class_options):
+            button = QPushButton(f"{i + 1}. {animal_dict.get(class_option, class_option)}")
+            button.clicked.connect(lambda _, class_option=class_option: self.label_selected(class_option))
+            button_layout.addWidget(button)
+            QShortcut(QKeySequence(str(i + 1)), self, activated=lambda class_option=class_option: self.label_selected(class_option))
+        done_button = QPushButton("Готово")
+        done_button.clicked.connect(self.accept)
+        button_layout.addWidget(done_button)
+        layout.addLayout(button_layout)
+
+        self.update_status()
+
+    def selected_rows(self):
+        return sorted(index.row() for index in self.view.selectionModel().selectedIndexes())
+
+    def label_selected(self, class_option):
+        rows = self.selected_rows()
+        if not rows:
+            return
+        self.model.set_label(rows, class_option)
+        logger.debug(f"Labeled {len(rows)} images as {class_option}")
+        # Переходим к следующему изображению, чтобы размечать подряд одними клавишами
+        next_row = rows[-1] + 1
+        if next_row < self.model.rowCount() or self.model.canFetchMore():
+            if next_row >= self.model.rowCount():
+                self.model.fetchMore()
+            self.view.setCurrentIndex(self.model.index(next_row))
+        self.update_status()
+
+    def open_image(self, index):
+        dialog = ClassificationDialog(index.data(Qt.UserRole), self.class_options, self)
+        if dialog.exec_() == QDialog.Accepted:
+            self.model.set_label([index.row()], dialog.selected_class)
+            self.update_status()
+
+    def update_status(self):
+        self.status_label.setText(f"Изображений для проверки: {self.model.total}, "
+                                  f"размечено: {len(self.model.labeled_rows)}")
+
+    def done(self, result):
+        self.model.stop_loading()
+        super().done(result)
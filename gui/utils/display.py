@@ -1,11 +1,13 @@
 from PyQt5.QtGui import QImage, QPixmap, QPainter, QPen, QFont
 from PyQt5.QtWidgets import QGraphicsScene, QGraphicsView, QDialog, QVBoxLayout
 from PyQt5.QtCore import Qt
-import matplotlib.pyplot as plt
 from io import BytesIO
 from PIL import Image
 
-def display_plot(parent, class_counts):
+def display_plot(parent, class_counts, title='Результаты классификации', ylabel='Количество'):
+    # matplotlib импортируется только при первом построении графика, чтобы не замедлять запуск
+    import matplotlib.pyplot as plt
+
     buf = BytesIO()
     fig, ax = plt.subplots()
 
@@ -25,8 +27,8 @@ def display_plot(parent, class_counts):
                 str(count), ha='center', va='bottom', color='black', fontsize=10, fontweight='bold')
 
     ax.set_xlabel('Класс')
-    ax.set_ylabel('Количество')
-    ax.set_title('Результаты классификации')
+    ax.set_ylabel(ylabel)
+    ax.set_title(title)
 
     plt.savefig(buf, format='png')
     buf.seek(0)
@@ -40,15 +42,19 @@ def display_plot(parent, class_counts):
     view = QGraphicsView(scene)
 
     dialog = QDialog(parent)
-    dialog.setWindowTitle("Результаты классификации")
+    dialog.setWindowTitle(title)
     dialog.setLayout(QVBoxLayout())
     dialog.layout().addWidget(view)
     dialog.exec_()
 
 def display_image(parent, img, detections):
-    original_width, original_height = img.size
+    # img может быть миниатюрой: тогда рамки пересчитываются из размера оригинала
+    original_width, original_height = img.info.get("original_size", img.size)
     img = img.convert("RGBA")
-    img_resized = img.resize((600, 600), Image.Resampling.LANCZOS)
+    if img.size != (600, 600):
+        img_resized = img.resize((600, 600), Image.Resampling.BILINEAR)
+    else:
+        img_resized = img
     resized_width, resized_height = img_resized.size
 
     width_ratio = resized_width / original_width
@@ -1,12 +1,12 @@
 import os
-import json
-import datetime
+from itertools import islice
 from PyQt5.QtWidgets import QMessageBox
 from utils.logger import logger
-import pandas as pd
+from backend.timing import RunStats, format_summary
+from backend.metadata import get_metadata_store
+from backend.results import metadata_directory, reports_directory, get_timestamp, write_report
 
-metadata_directory = "metadata"
-reports_directory = "reports"
+_history_imported = False
 
 def ensure_directories_exist():
     if not os.path.exists(metadata_directory):
@@ -14,58 +14,105 @@ def ensure_directories_exist():
     if not os.path.exists(reports_directory):
         os.makedirs(reports_directory)
 
-def get_timestamp():
-    return datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-
 def load_history_files():
+    global _history_imported
     ensure_directories_exist()
-    return [f for f in os.listdir(metadata_directory) if os.path.isfile(os.path.join(metadata_directory, f))]
+    store = get_metadata_store()
+    # JSON файлы из прошлых версий один раз переносятся в базу
+    if not _history_imported:
+        imported = store.import_json_history()
+        if imported:
+            logger.info(f"Imported {len(imported)} classification results from {metadata_directory}")
+        _history_imported = True
+    return store.list_runs()
 
 def load_report_files():
     ensure_directories_exist()
     return [f for f in os.listdir(reports_directory) if os.path.isfile(os.path.join(reports_directory, f))]
 
-def load_classification_history(filename):
-    file_path = os.path.join(metadata_directory, filename)
-    with open(file_path, 'r') as file:
-        return json.load(file)
+def load_classification_history(run_id):
+    store = get_metadata_store()
+    run = store.get_run(run_id)
+    run["class_counts"] = store.class_counts(run_id)
+    return run
+
+def load_classification_results(run_id):
+    store = get_metadata_store()
+    data = load_classification_history(run_id)
+    data["image_classifications"] = list(store.iter_run_images(run_id))
+    return data
 
-def save_classification_results(class_counts, image_classifications):
+def start_classification_run(file_paths, batch_size):
     ensure_directories_exist()
-    result = {
-        "class_counts": class_counts,
-        "image_classifications": image_classifications
-    }
-    timestamp = get_timestamp()
-    filename = os.path.join(metadata_directory, f"classification_results_{timestamp}.json")
-    with open(filename, 'w') as file:
-        json.dump(result, file)
-    logger.debug(f"Saved classification results to {filename}")
-
-def export_to_excel(filename):
-    file_path = os.path.join(metadata_directory, filename)
-    with open(file_path, 'r') as file:
-        data = json.load(file)
-
-    # Преобразование списка классов в строку
-    animal_dict = {'roedeer': 'Косуля', 'deer': 'Олень', 'muskdeer': 'Кабарга'}
-    for item in data["image_classifications"]:
-        classes = [cls[0] for cls in item["classes"]]
-        item["classes"] = ", ".join([animal_dict.get(cls, cls) for cls in classes])
-        item["image"] = os.path.basename(item["image"])  # Сохраняем только имя файла
-
-    # Преобразование данных в DataFrame
-    df = pd.DataFrame(data["image_classifications"])
-
-    # Переименование столбцов и упорядочивание
-    df = df.rename(columns={"image": "Изображение", "classes": "Класс"})
-    df = df[["Изображение", "Класс"]]
+    return get_metadata_store().create_run(inputs={"file_paths": list(file_paths), "batch_size": batch_size})
+
+def start_detection_run():
+    # Тип запуска хранится в inputs: история и графики отличают детекцию (счетчики рамок) от классификации.
+    # file_paths не сохраняются, поэтому запуск детекции не предлагается для продолжения классификации
+    ensure_directories_exist()
+    return get_metadata_store().create_run(f"detection_results_{get_timestamp()}", inputs={"task": "detection"})
+
+def save_result_stream(run_id, image_results, class_counts, batch_size, stats=None, callback=None):
+    # Результаты читаются из потока (iter_images_classification и т.п.) порциями, каждая порция сразу
+    # сохраняется вместе с промежуточными счетчиками; class_counts заполняет сам поток
+    stats = stats if stats is not None else RunStats()
+    store = get_metadata_store()
+    image_results = iter(image_results)
+    while True:
+        batch = list(islice(image_results, max(1, batch_size)))
+        if not batch:
+            break
+        with stats.stage("checkpoint"):
+            store.add_images(run_id, batch, class_counts)
+        if callback is not None:
+            callback(batch)
+
+def save_classification_results(run_id, class_counts, stats=None):
+    stats = stats if stats is not None else RunStats()
+    with stats.stage("write_results"):
+        get_metadata_store().finish_run(run_id, class_counts, timings=stats.summary())
+    logger.debug(f"Saved classification results for run {run_id}")
+    logger.info(format_summary(stats.summary()))
+
+def save_detection_results(run_id, class_counts, stats=None, video_summaries=None):
+    # class_counts - количество рамок по классам; сводки по видео сохраняются вместе со временем этапов
+    stats = stats if stats is not None else RunStats()
+    with stats.stage("write_results"):
+        timings = stats.summary()
+        if video_summaries:
+            timings["videos"] = video_summaries
+        get_metadata_store().finish_run(run_id, class_counts, timings=timings)
+    logger.debug(f"Saved detection results for run {run_id}")
+    logger.info(format_summary(stats.summary()))
+
+def export_report(run_id, extension='.xlsx'):
+    stats = RunStats()
+    store = get_metadata_store()
+    run = store.get_run(run_id)
 
     timestamp = get_timestamp()
-    excel_path = os.path.join(reports_directory, f"{os.path.splitext(filename)[0]}_{timestamp}.xlsx")
-    df.to_excel(excel_path, index=False)
-    logger.debug(f"Exported {filename} to Excel at {excel_path}")
-    return excel_path
+    report_path = os.path.join(reports_directory, f"{run['name']}_{timestamp}{extension}")
+    with stats.stage("write_report"):
+        write_report(store.iter_run_images(run_id), report_path)
+    logger.debug(f"Exported {run['name']} to {report_path}")
+    logger.info(format_summary(stats.summary()))
+    return report_path
+
+def export_to_excel(run_id):
+    return export_report(run_id, '.xlsx')
+
+def clear_metadata(parent):
+    reply = QMessageBox.question(parent, 'Очистить файлы', f"Вы уверены, что хотите очистить все файлы в {metadata_directory}?",
+                                 QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+    if reply == QMessageBox.Yes:
+        logger.debug(f"Clearing metadata: {metadata_directory}")
+        get_metadata_store().clear()
+        # Старые JSON файлы тоже удаляются, иначе они снова импортируются при следующем запуске
+        for filename in os.listdir(metadata_directory):
+            if filename.endswith('.json'):
+                os.remove(os.path.join(metadata_directory, filename))
+        return True
+    return False
 
 def clear_directory(directory_path, parent):
     reply = QMessageBox.question(parent, 'Очистить файлы', f"Вы уверены, что хотите очистить все файлы в {directory_path}?",
@@ -0,0 +1,62 @@
+# tests/conftest.py
+
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+tests_directory = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(tests_directory))
+sys.path.insert(0, os.path.join(tests_directory, "fakes"))
+
+import ultralytics
+from backend import cache, inference, thumbnails
+
+# Размеры меньше IMGSZ: изображения не уменьшаются при декодировании, и ответ поддельной модели
+# считается по исходному размеру
+IMAGE_SIZES = [(41 + 3 * i, 30 + 2 * i) for i in range(20)]
+
+@pytest.fixture(autouse=True)
+def isolated_caches(tmp_path, monkeypatch):
+    # Кэш результатов и миниатюр у каждого теста свой; относительные пути (cache/, metadata/) - внутри tmp_path
+    monkeypatch.chdir(tmp_path)
+    result_cache = cache.ResultCache(str(tmp_path / "results.sqlite"))
+    thumbnail_cache = thumbnails.ThumbnailCache(str(tmp_path / "thumbnails.sqlite"))
+    monkeypatch.setattr(cache, "_result_cache", result_cache)
+    monkeypatch.setattr(thumbnails, "_thumbnail_cache", thumbnail_cache)
+    ultralytics.CALLS.clear()
+    ultralytics.EXPORTS.clear()
+    yield
+    result_cache.close()
+    thumbnail_cache.close()
+
+def expected_classes(size):
+    return [ultralytics.expected_class(*size)]
+
+def write_image(path, size):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.new("RGB", size, (size[0] % 256, size[1] % 256, 128)).save(path, "JPEG")
+    return path
+
+@pytest.fixture
+def image_paths(tmp_path):
+    return [write_image(str(tmp_path / "images" / f"IMG_{i:04d}.jpg"), size) for i, size in enumerate(IMAGE_SIZES)]
+
+def write_weights(path, content=b"weights"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as file:
+        file.write(content)
+    return path
+
+@pytest.fixture
+def classifier_path(tmp_path):
+    return write_weights(str(tmp_path / "models" / "classifier.pt"))
+
+@pytest.fixture
+def classifier(classifier_path):
+    return inference.load_model(classifier_path, task="classify")
+
+@pytest.fixture
+def detector(tmp_path):
+    return inference.load_model(write_weights(str(tmp_path / "models" / "detector.pt")), task="detect")
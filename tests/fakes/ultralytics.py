@@ -0,0 +1,101 @@
+# tests/fakes/ultralytics.py
+# Поддельный ultralytics для тестов: ответ модели детерминированно зависит от размера изображения,
+# поэтому ожидаемый результат можно посчитать без модели. Подключается через sys.path в conftest.py,
+# оттуда же его импортируют процессы пула (spawn передает sys.path дочерним процессам).
+
+import os
+import shutil
+
+NAMES = {0: 'deer', 1: 'muskdeer', 2: 'roedeer'}
+# Изображение такой ширины роняет инференс: проверка повтора батча по одному изображению
+POISON_WIDTH = 61
+
+CALLS = []
+# Аргументы каждого export(): проверка данных калибровки INT8
+EXPORTS = []
+
+def image_score(width, height):
+    return (width * 7 + height) % 100
+
+def expected_class(width, height):
+    score = image_score(width, height)
+    return NAMES[score % 3], 0.3 + (score % 70) / 100
+
+class _Tensor:
+    def __init__(self, value):
+        self.value = value
+
+    def item(self):
+        return self.value
+
+    def tolist(self):
+        return list(self.value)
+
+    def __int__(self):
+        return int(self.value)
+
+    def __float__(self):
+        return float(self.value)
+
+    def __getitem__(self, index):
+        return _Tensor(self.value)
+
+class Probs:
+    def __init__(self, top1, top1conf):
+        self.top1 = top1
+        self.top1conf = _Tensor(top1conf)
+
+class Box:
+    def __init__(self, cls, xyxy, conf=0.9):
+        self.cls = _Tensor(cls)
+        self.xyxy = [_Tensor(xyxy)]
+        self.conf = _Tensor(conf)
+
+class Result:
+    def __init__(self, probs=None, boxes=None):
+        self.probs = probs
+        self.boxes = boxes
+
+class YOLO:
+    def __init__(self, path, task=None):
+        self.ckpt_path = path
+        self.names = dict(NAMES)
+        self.detect = task == "detect" or 'detect' in os.path.basename(path)
+        self.task = "detect" if self.detect else "classify"
+        # Веса с "shifted" в имени дают смещенные рамки: модель, расходящаяся с исходной
+        self.shifted = 'shifted' in os.path.basename(path)
+
+    def predict(self, source=None, imgsz=544, verbose=True, **kwargs):
+        images = source if isinstance(source, list) else [source]
+        CALLS.append(len(images))
+        results = []
+        for img in images:
+            width, height = (img.shape[1], img.shape[0]) if hasattr(img, "shape") else img.size
+            if width == POISON_WIDTH:
+                raise ValueError("poisoned image")
+            score = image_score(width, height)
+            if self.detect:
+                offset = width * 0.3 if self.shifted else 0.0
+                if hasattr(img, "shape"):
+                    # Кадры видео (массивы BGR): рамка следует за самым ярким столбцом, детекции меняются с движением
+                    offset += float(img.sum(axis=(0, 2)).argmax())
+                xyxy = [width * 0.1 + offset, height * 0.1, width * 0.5 + offset, height * 0.5]
+                boxes = [Box(score % 3, xyxy)] if score % 4 else []
+                results.append(Result(boxes=boxes))
+            else:
+                results.append(Result(probs=Probs(score % 3, expected_class(width, height)[1])))
+        return results
+
+    def export(self, format=None, imgsz=None, int8=False, data=None):
+        data_files = None
+        if data is not None:
+            data_files = (sorted(os.path.relpath(os.path.join(root, name), data) for root, _, files in os.walk(data)
+                                 for name in files) if os.path.isdir(data) else open(data, encoding="utf-8").read())
+        EXPORTS.append({"format": format, "int8": int8, "data": data, "data_files": data_files})
+        base_path = os.path.splitext(self.ckpt_path)[0]
+        if format == "onnx":
+            shutil.copy(self.ckpt_path, f"{base_path}.onnx")
+            return f"{base_path}.onnx"
+        os.makedirs(f"{base_path}_openvino_model")
+        shutil.copy(self.ckpt_path, f"{base_path}_openvino_model/model.bin")
+        return f"{base_path}_openvino_model"
@@ -0,0 +1,43 @@
+# tests/test_archive.py
+# Потоковое чтение архивов, включая вложенные, без распаковки на диск
+
+import io
+import os
+import tarfile
+import zipfile
+
+from backend import inference
+from backend.archive import read_archive_member
+from conftest import IMAGE_SIZES, expected_classes
+
+def test_archives_are_streamed_including_nested_archives(tmp_path, classifier, image_paths):
+    inner = io.BytesIO()
+    with tarfile.open(fileobj=inner, mode="w:gz") as tar_ref:
+        for image_path in image_paths[10:15]:
+            tar_ref.add(image_path, arcname=f"sub/{os.path.basename(image_path)}")
+    zip_path = str(tmp_path / "card.zip")
+    with zipfile.ZipFile(zip_path, "w") as zip_ref:
+        for image_path in image_paths[:10]:
+            zip_ref.write(image_path, f"DCIM/{os.path.basename(image_path)}")
+        zip_ref.writestr("nested/inner.tar.gz", inner.getvalue())
+        zip_ref.writestr("notes.txt", "not an image")
+    tar_path = str(tmp_path / "card.tar")
+    with tarfile.open(tar_path, "w") as tar_ref:
+        for image_path in image_paths[15:]:
+            tar_ref.add(image_path, arcname=f"DCIM/{os.path.basename(image_path)}")
+
+    names = ([f"{zip_path}/DCIM/{os.path.basename(image_path)}" for image_path in image_paths[:10]]
+             + [f"{zip_path}/nested/inner.tar.gz/sub/{os.path.basename(image_path)}"
+                for image_path in image_paths[10:15]]
+             + [f"{tar_path}/DCIM/{os.path.basename(image_path)}" for image_path in image_paths[15:]])
+    results = []
+    for archive_path in (zip_path, tar_path):
+        results.extend(inference.iter_archive_classification(classifier, archive_path, batch_size=4,
+                                                             use_cache=False))
+
+    assert [image_data["image"] for image_data in results] == names
+    assert [image_data["classes"] for image_data in results] == [expected_classes(size) for size in IMAGE_SIZES]
+    # Архивы не распаковываются на диск, а член вложенного архива читается по пути из результатов
+    assert not os.path.exists(tmp_path / "DCIM")
+    with open(image_paths[12], "rb") as file:
+        assert read_archive_member(names[12]) == file.read()
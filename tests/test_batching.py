@@ -0,0 +1,27 @@
+# tests/test_batching.py
+# Пакетная классификация на поддельной модели (tests/fakes/ultralytics.py): повтор упавшего батча по одному
+# изображению и пропуск битых файлов
+
+import ultralytics
+from backend import inference
+from backend.timing import RunStats
+from conftest import IMAGE_SIZES, expected_classes, write_image
+
+def test_failed_batch_is_retried_per_image_and_bad_files_are_skipped(tmp_path, classifier, image_paths):
+    broken_path = str(tmp_path / "images" / "broken.jpg")
+    with open(broken_path, "wb") as file:
+        file.write(b"not a jpeg")
+    poisoned_path = write_image(str(tmp_path / "images" / "poisoned.jpg"), (ultralytics.POISON_WIDTH, 40))
+    paths = image_paths[:5] + [broken_path, poisoned_path] + image_paths[5:]
+
+    stats = RunStats()
+    results = list(inference.iter_images_classification(classifier, paths, batch_size=4, use_cache=False,
+                                                        stats=stats))
+
+    assert [image_data["image"] for image_data in results] == image_paths
+    assert [image_data["classes"] for image_data in results] == [expected_classes(size) for size in IMAGE_SIZES]
+    counters = stats.summary()["counters"]
+    assert counters["failed_images"] == 2
+    assert counters["images"] == len(paths)
+    # Батч с испорченным изображением повторен по одному изображению
+    assert ultralytics.CALLS.count(1) == 3
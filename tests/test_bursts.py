@@ -0,0 +1,68 @@
+# tests/test_bursts.py
+
+import datetime
+import os
+
+from PIL import Image
+
+import ultralytics
+from backend import inference
+from backend.bursts import BURST_MAX_FRAMES, group_bursts, image_signature, pick_representatives
+from backend.timing import RunStats
+from conftest import IMAGE_SIZES
+
+START = datetime.datetime(2024, 5, 1, 6, 0, 0)
+
+def write_frame(path, size, taken=None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    exif = Image.Exif()
+    if taken is not None:
+        exif[306] = taken.strftime("%Y:%m:%d %H:%M:%S")
+    Image.new("RGB", size, (90, 120, 60)).save(path, "JPEG", exif=exif)
+    return path
+
+def test_bursts_are_split_by_gap_hash_and_missing_time():
+    signatures = [("a", 0.0, 0), ("b", 4.0, 0), ("c", 30.0, 0), ("d", 33.0, 0b1111111111111111), ("e", None, 0),
+                  ("f", None, 0)]
+    assert group_bursts(signatures) == [[0, 1], [2], [3], [4], [5]]
+
+def test_long_chains_of_close_frames_are_cut_by_frame_count_and_span():
+    # Камера срабатывает каждые 2 с, пока животное пасется: соседние кадры близки, но серия ограничена
+    grazing = [(f"frame{i}", i * 2.0, 0) for i in range(25)]
+    bursts = group_bursts(grazing)
+    assert [len(burst) for burst in bursts] == [BURST_MAX_FRAMES, BURST_MAX_FRAMES, 5]
+
+    sparse = [(f"frame{i}", i * 8.0, 0) for i in range(10)]
+    for burst in group_bursts(sparse):
+        assert sparse[burst[-1]][1] - sparse[burst[0]][1] <= 30.0
+
+def test_representatives_are_spread_over_the_burst():
+    assert pick_representatives([4, 5, 6, 7, 8]) == [6]
+    assert pick_representatives([4, 5, 6, 7, 8], 3) == [4, 6, 8]
+    assert pick_representatives([1, 2], 5) == [1, 2]
+
+def test_file_mtime_is_used_only_when_allowed(tmp_path):
+    with_exif = write_frame(str(tmp_path / "exif.jpg"), (64, 48), START)
+    without_exif = write_frame(str(tmp_path / "copy.jpg"), (64, 48))
+    assert image_signature(with_exif)[0] == START.timestamp()
+    assert image_signature(without_exif)[0] is None
+    assert image_signature(without_exif, use_mtime=True)[0] == os.path.getmtime(without_exif)
+
+def test_model_runs_on_representatives_and_labels_are_propagated(tmp_path, classifier):
+    paths = [write_frame(str(tmp_path / "card" / f"IMG_{i:04d}.jpg"), size, START + datetime.timedelta(seconds=2 * i))
+             for i, size in enumerate(IMAGE_SIZES[:12])]
+
+    stats = RunStats()
+    class_counts, results = inference.process_images_classification(classifier, paths, batch_size=4,
+                                                                    use_cache=False, burst_grouping=True,
+                                                                    stats=stats)
+
+    assert sum(ultralytics.CALLS) == 2
+    assert stats.summary()["counters"]["bursts"] == 2
+    assert sorted(image_data["image"] for image_data in results) == sorted(paths)
+    assert sum(class_counts.values()) == len(paths)
+    propagated = [image_data for image_data in results if "propagated_from" in image_data]
+    assert len(propagated) == len(paths) - 2
+    for image_data in results:
+        burst = [other for other in results if other["burst"] == image_data["burst"]]
+        assert all(other["classes"] == image_data["classes"] for other in burst)
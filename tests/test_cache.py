@@ -0,0 +1,68 @@
+# tests/test_cache.py
+
+import sqlite3
+
+import ultralytics
+from backend import cache, inference, thumbnails
+from backend.timing import RunStats
+from conftest import IMAGE_SIZES, write_weights
+
+def test_cache_is_reused_until_weights_change(classifier_path, classifier, detector, image_paths):
+    first = list(inference.iter_images_classification(classifier, image_paths, batch_size=4))
+    first_detections = list(inference.iter_images_detection(detector, image_paths, batch_size=4))
+    ultralytics.CALLS.clear()
+
+    stats = RunStats()
+    assert list(inference.iter_images_classification(classifier, image_paths, batch_size=4, stats=stats)) == first
+    assert list(inference.iter_images_detection(detector, image_paths, batch_size=4, stats=stats)) == first_detections
+    assert stats.summary()["counters"]["cache_hits"] == 2 * len(image_paths)
+    assert ultralytics.CALLS == []
+
+    # Новые веса по тому же пути: load_model загружает модель заново, у нее новый ключ кэша
+    write_weights(classifier_path, b"retrained weights")
+    retrained = inference.load_model(classifier_path, task="classify")
+    assert retrained is not classifier
+    stats = RunStats()
+    assert list(inference.iter_images_classification(retrained, image_paths, batch_size=4, stats=stats)) == first
+    assert stats.summary()["counters"]["cache_misses"] == len(image_paths)
+    assert sum(ultralytics.CALLS) == len(image_paths)
+
+def test_model_loaded_before_weights_change_keeps_its_cache_key(classifier_path, classifier, image_paths):
+    # Старые веса остаются в памяти уже загруженной модели: ее результаты не должны попасть под ключ новых весов
+    write_weights(classifier_path, b"retrained weights")
+    list(inference.iter_images_classification(classifier, image_paths, batch_size=4))
+    retrained = inference.load_model(classifier_path, task="classify")
+    assert retrained.weights_hash != classifier.weights_hash
+
+    stats = RunStats()
+    list(inference.iter_images_classification(retrained, image_paths, batch_size=4, stats=stats))
+    assert stats.summary()["counters"]["cache_misses"] == len(image_paths)
+
+def test_cache_errors_do_not_abort_the_run(monkeypatch, classifier, detector, image_paths):
+    expected = list(inference.iter_images_classification(classifier, image_paths, batch_size=4, use_cache=False))
+
+    def locked(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(cache.get_result_cache(), "get", locked)
+    monkeypatch.setattr(cache.get_result_cache(), "put_many", locked)
+    stats = RunStats()
+    assert list(inference.iter_images_classification(classifier, image_paths, batch_size=4, stats=stats)) == expected
+    assert inference.process_image_detection(detector, image_paths[0], stats=stats)[1] is not None
+    assert stats.summary()["counters"]["cache_errors"] == len(image_paths) + 1
+
+def test_thumbnail_store_errors_do_not_abort_the_run(monkeypatch, classifier, image_paths):
+    def locked(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    store = thumbnails.get_thumbnail_cache()
+    for method in ("get", "put", "contains"):
+        monkeypatch.setattr(store, method, locked)
+    stats = RunStats()
+    results = list(inference.iter_images_classification(classifier, image_paths, batch_size=4, use_cache=False,
+                                                        stats=stats, thumbnails=True))
+    assert len(results) == len(image_paths)
+    assert stats.summary()["counters"]["thumbnail_cache_errors"] == len(image_paths)
+    # Окно просмотра получает миниатюру, созданную заново
+    data, original_size = thumbnails.thumbnail_data(image_paths[0])
+    assert data and original_size == IMAGE_SIZES[0]
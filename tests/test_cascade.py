@@ -0,0 +1,33 @@
+# tests/test_cascade.py
+# Каскад: быстрый проход, эскалация неуверенных изображений и контрольная выборка для полной модели
+
+import ultralytics
+from backend import inference
+from backend.timing import RunStats
+from conftest import IMAGE_SIZES, expected_classes
+
+def test_cascade_escalates_uncertain_images_to_full_model(classifier, image_paths):
+    stats = RunStats()
+    results = list(inference.iter_images_cascade(classifier, classifier, image_paths, batch_size=4, stats=stats,
+                                                 audit_fraction=0))
+
+    escalated = [ultralytics.expected_class(*size)[1] < inference.CASCADE_THRESHOLD for size in IMAGE_SIZES]
+    assert 0 < sum(escalated) < len(image_paths)
+    assert [image_data["classes"] for image_data in results] == [expected_classes(size) for size in IMAGE_SIZES]
+    assert [image_data["cascade"] for image_data in results] == [
+        "escalated" if is_escalated else "fast" for is_escalated in escalated]
+    summary = inference.cascade_summary(stats.summary())
+    assert summary["escalated"] == sum(escalated)
+    assert summary["accepted"] == len(image_paths) - sum(escalated)
+
+    # В кэш попадают только ответы полной модели
+    results = list(inference.iter_images_cascade(classifier, classifier, image_paths, batch_size=4,
+                                                 audit_fraction=0))
+    assert [image_data["cascade"] for image_data in results] == [
+        "cached" if is_escalated else "fast" for is_escalated in escalated]
+
+    # При полной проверке каждое уверенное изображение сверяется с полной моделью
+    results = list(inference.iter_images_cascade(classifier, classifier, image_paths, batch_size=4,
+                                                 use_cache=False, audit_fraction=1.0))
+    assert [image_data["cascade"] for image_data in results] == [
+        "escalated" if is_escalated else "audited" for is_escalated in escalated]
@@ -0,0 +1,68 @@
+# tests/test_decode.py
+# Декодирование в уменьшенном масштабе, EXIF ориентация и пересчет рамок в координаты оригинала
+
+import pytest
+from PIL import Image
+
+from backend import inference
+from backend.decode import EXIF_ORIENTATION, decode_image, decoders, original_size, scale_box
+
+# Снимок 1600x1106, повернутый EXIF ориентацией 6 (на 90 градусов по часовой): на экране 1106x1600
+STORED_SIZE = (1600, 1106)
+ORIENTED_SIZE = (1106, 1600)
+
+def write_photo(path, size, orientation=None):
+    img = Image.new("RGB", size, (40, 90, 40))
+    # Красная метка в левом верхнем углу сохраненных пикселей
+    img.paste((255, 0, 0), (0, 0, size[0] // 8, size[1] // 8))
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[EXIF_ORIENTATION] = orientation
+    img.save(path, "JPEG", exif=exif, quality=95)
+    return path
+
+def is_red(pixel):
+    red, green, blue = pixel[:3]
+    return red > 200 and green < 80 and blue < 80
+
+def test_jpeg_is_decoded_at_reduced_scale_but_not_below_target(tmp_path):
+    path = write_photo(str(tmp_path / "photo.jpg"), (2000, 1200))
+
+    img = decode_image(path, inference.IMGSZ, "reduced")
+    # 1/2 масштаба: 1/4 дала бы 300 пикселей по короткой стороне, меньше 544
+    assert img.size == (1000, 600)
+    assert original_size(img) == (2000, 1200)
+    assert decode_image(path, inference.IMGSZ, "full").size == (2000, 1200)
+
+    png_path = str(tmp_path / "photo.png")
+    Image.open(path).save(png_path)
+    assert decode_image(png_path, inference.IMGSZ, "reduced").size == (2000, 1200)
+
+@pytest.mark.parametrize("decoder", sorted(decoders))
+def test_exif_orientation_is_applied_by_every_decoder(tmp_path, decoder):
+    path = write_photo(str(tmp_path / "rotated.jpg"), STORED_SIZE, orientation=6)
+
+    img = decode_image(path, inference.IMGSZ, decoder)
+    assert original_size(img) == ORIENTED_SIZE
+    assert img.width / img.height == pytest.approx(ORIENTED_SIZE[0] / ORIENTED_SIZE[1], abs=0.01)
+    # После поворота по часовой метка из левого верхнего угла оказывается в правом верхнем
+    assert is_red(img.getpixel((img.width - 5, 5)))
+    assert not is_red(img.getpixel((5, 5)))
+
+def test_boxes_are_scaled_to_original_coordinates(tmp_path):
+    path = write_photo(str(tmp_path / "rotated.jpg"), STORED_SIZE, orientation=6)
+    img = decode_image(path, inference.IMGSZ, "reduced")
+    assert img.size == (553, 800)
+    assert scale_box([100, 50, 300, 200], img) == [200, 100, 600, 400]
+
+def test_detections_do_not_depend_on_the_decoder(tmp_path, detector, monkeypatch):
+    path = write_photo(str(tmp_path / "rotated.jpg"), STORED_SIZE, orientation=6)
+    width, height = ORIENTED_SIZE
+    # Поддельный детектор ставит рамку на 0.1-0.5 кадра, который видит: в координатах оригинала с учетом поворота
+    expected = [width * 0.1, height * 0.1, width * 0.5, height * 0.5]
+
+    for decoder in sorted(decoders):
+        monkeypatch.setenv("IMAGE_DECODER", decoder)
+        _, detections = inference.process_image_detection(detector, path, use_cache=False)
+        assert len(detections) == 1
+        assert detections[0][0] == pytest.approx(expected, rel=0.01)
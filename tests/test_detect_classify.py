@@ -0,0 +1,57 @@
+# tests/test_detect_classify.py
+# Двухэтапный режим: пустые кадры не идут в классификатор, вырезанные рамки классифицируются батчами
+
+import ultralytics
+from backend import inference
+from conftest import IMAGE_SIZES, write_weights
+
+def expected_boxes(size):
+    # Поддельный детектор находит одну рамку (0.1-0.5 кадра), если оценка изображения не делится на 4
+    width, height = size
+    if not ultralytics.image_score(width, height) % 4:
+        return []
+    x0, y0, x1, y1 = width * 0.1, height * 0.1, width * 0.5, height * 0.5
+    pad_x, pad_y = (x1 - x0) * inference.CROP_PADDING, (y1 - y0) * inference.CROP_PADDING
+    crop_width = int(x1 + pad_x) - int(x0 - pad_x)
+    crop_height = int(y1 + pad_y) - int(y0 - pad_y)
+    return [ultralytics.expected_class(crop_width, crop_height)]
+
+def test_empty_images_skip_the_classifier_and_crops_are_classified(classifier, detector, image_paths):
+    class_counts, results, summary = inference.process_images_detect_classify(detector, classifier, image_paths,
+                                                                              batch_size=4)
+
+    expected = [expected_boxes(size) for size in IMAGE_SIZES]
+    boxes = sum(len(image_boxes) for image_boxes in expected)
+    assert 0 < boxes < len(image_paths)
+    assert [image_data["image"] for image_data in results] == image_paths
+    assert [image_data["empty"] for image_data in results] == [not image_boxes for image_boxes in expected]
+    assert [image_data["classes"] for image_data in results] == expected
+    assert sum(class_counts.values()) == boxes
+    assert summary["empty_images"] == len(image_paths) - boxes
+    assert summary["classifier_calls_saved"] == len(image_paths) - boxes
+    # Детектор видит каждое изображение, классификатор - только вырезанные рамки
+    assert sum(ultralytics.CALLS) == len(image_paths) + boxes
+
+def test_cache_key_covers_both_models_and_the_detector_threshold(tmp_path, classifier, detector, image_paths):
+    _, results, _ = inference.process_images_detect_classify(detector, classifier, image_paths, batch_size=4)
+
+    ultralytics.CALLS.clear()
+    _, cached_results, summary = inference.process_images_detect_classify(detector, classifier, image_paths,
+                                                                          batch_size=4)
+    assert cached_results == results
+    assert summary["images"] == len(image_paths)
+    assert ultralytics.CALLS == []
+
+    # Другие веса классификатора - другой ответ, кэш не используется
+    other_classifier = inference.load_model(write_weights(str(tmp_path / "models" / "classifier_v2.pt"), b"v2"),
+                                            task="classify")
+    inference.process_images_detect_classify(detector, other_classifier, image_paths, batch_size=4)
+    assert sum(ultralytics.CALLS) >= len(image_paths)
+
+    # Порог выше уверенности всех рамок: кадры пустые, а не взятые из кэша с рамками
+    ultralytics.CALLS.clear()
+    _, strict_results, summary = inference.process_images_detect_classify(detector, classifier, image_paths,
+                                                                          batch_size=4, min_confidence=0.95)
+    assert all(image_data["empty"] for image_data in strict_results)
+    assert summary["boxes"] == 0
+    assert sum(ultralytics.CALLS) == len(image_paths)
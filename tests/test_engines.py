@@ -0,0 +1,78 @@
+# tests/test_engines.py
+
+import os
+import shutil
+import threading
+
+import pytest
+import yaml
+
+import ultralytics
+from backend import inference
+from backend.engines import calibration_dataset, check_parity, export_model, resolve_model_path
+from conftest import write_weights
+
+def test_detection_calibration_folder_becomes_a_dataset_yaml(tmp_path, image_paths):
+    calibration_path = os.path.dirname(image_paths[0])
+    dataset_path = calibration_dataset(calibration_path, "detect", ultralytics.NAMES, str(tmp_path))
+    with open(dataset_path, encoding="utf-8") as file:
+        dataset = yaml.safe_load(file)
+    assert dataset == {"path": os.path.abspath(calibration_path), "train": ".", "val": ".",
+                       "names": ultralytics.NAMES}
+
+def test_classification_calibration_folder_becomes_train_and_val_splits(tmp_path, image_paths):
+    dataset_path = calibration_dataset(os.path.dirname(image_paths[0]), "classify", ultralytics.NAMES,
+                                       str(tmp_path / "work"))
+    for split in ("train", "val"):
+        assert sorted(os.listdir(os.path.join(dataset_path, split))) == sorted(ultralytics.NAMES.values())
+        assert len(os.listdir(os.path.join(dataset_path, split, "deer"))) == len(image_paths)
+
+def test_ready_datasets_are_used_as_is_and_bad_paths_are_rejected(tmp_path):
+    dataset_yaml = tmp_path / "animals.yaml"
+    dataset_yaml.write_text("path: data\n")
+    assert calibration_dataset(str(dataset_yaml), "detect", ultralytics.NAMES, str(tmp_path)) == str(dataset_yaml)
+    for split in ("train", "val"):
+        (tmp_path / "dataset" / split / "deer").mkdir(parents=True)
+    assert calibration_dataset(str(tmp_path / "dataset"), "classify", ultralytics.NAMES,
+                               str(tmp_path)) == str(tmp_path / "dataset")
+    with pytest.raises(ValueError):
+        calibration_dataset(str(tmp_path / "missing"), "detect", ultralytics.NAMES, str(tmp_path))
+    (tmp_path / "empty").mkdir()
+    with pytest.raises(ValueError):
+        calibration_dataset(str(tmp_path / "empty"), "detect", ultralytics.NAMES, str(tmp_path))
+
+def test_int8_export_calibrates_on_the_built_dataset(tmp_path, image_paths):
+    model_path = write_weights(str(tmp_path / "models" / "detector.pt"))
+    exported_path = export_model(model_path, "openvino", int8=True, calibration_data=os.path.dirname(image_paths[0]))
+
+    assert exported_path == str(tmp_path / "models" / "detector_int8_openvino_model")
+    assert os.path.isfile(os.path.join(exported_path, "model.bin"))
+    export = ultralytics.EXPORTS[-1]
+    assert export["int8"] and yaml.safe_load(export["data_files"])["names"] == ultralytics.NAMES
+    # Рабочая папка экспорта с описанием датасета удалена
+    assert sorted(os.listdir(tmp_path / "models")) == ["detector.pt", "detector_int8_openvino_model"]
+
+def test_concurrent_resolves_export_once(tmp_path):
+    model_path = write_weights(str(tmp_path / "models" / "classifier.pt"))
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(resolve_model_path(model_path, "onnx")))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [str(tmp_path / "models" / "classifier.onnx")] * 4
+    assert len(ultralytics.EXPORTS) == 1
+
+def test_detection_parity_compares_boxes(tmp_path, detector, image_paths):
+    same = inference.load_model(write_weights(str(tmp_path / "models" / "detector_copy.pt")), task="detect")
+    report = check_parity(detector, same, image_paths, batch_size=4, task="detect")
+    assert report["images"] == len(image_paths)
+    assert report["boxes"] > 0
+    assert report["box_agreement"] == 1.0
+    assert report["mean_iou"] == pytest.approx(1.0)
+
+    shifted_path = str(tmp_path / "models" / "detector_shifted.pt")
+    shutil.copy(detector.weights_path, shifted_path)
+    shifted = inference.load_model(shifted_path, task="detect")
+    assert check_parity(detector, shifted, image_paths, batch_size=4, task="detect")["box_agreement"] == 0.0
@@ -0,0 +1,53 @@
+# tests/test_metadata.py
+
+import json
+
+import pytest
+
+from backend.metadata import MetadataStore
+from backend.results import ClassificationResultsWriter
+
+IMAGE_CLASSIFICATIONS = [{"image": f"/data/IMG_{i:04d}.jpg", "classes": [["deer", 0.5 + i / 100]]} for i in range(5)]
+
+@pytest.fixture
+def store(tmp_path):
+    store = MetadataStore(str(tmp_path / "metadata.sqlite"))
+    yield store
+    store.close()
+
+def write_results(path, image_classifications, class_counts):
+    writer = ClassificationResultsWriter(str(path))
+    writer.write(image_classifications)
+    return writer.close(class_counts, {"total": 1.0})
+
+def test_json_results_are_imported_once(tmp_path, store):
+    json_path = write_results(tmp_path / "metadata" / "classification_results_1.json", IMAGE_CLASSIFICATIONS,
+                              {"deer": 5})
+
+    run_id = store.import_json(json_path)
+    run = store.get_run(run_id)
+    assert (run["name"], run["status"], run["image_count"]) == ("classification_results_1", "imported", 5)
+    assert run["class_counts"] == {"deer": 5}
+    assert store.query_images(run_id=run_id) == IMAGE_CLASSIFICATIONS
+    assert store.import_json(json_path) is None
+
+def test_malformed_json_leaves_no_half_imported_run(tmp_path, store):
+    json_path = tmp_path / "metadata" / "classification_results_2.json"
+    write_results(json_path, IMAGE_CLASSIFICATIONS[:3] + [{"classes": [["deer", 0.9]]}], {"deer": 4})
+
+    with pytest.raises(KeyError):
+        store.import_json(str(json_path))
+    assert store.list_runs() == []
+    assert store.import_json_history(str(tmp_path / "metadata")) == []
+
+    # Исправленный файл импортируется при следующем запуске: имя не занято половиной запуска
+    write_results(json_path, IMAGE_CLASSIFICATIONS, {"deer": 5})
+    [run_id] = store.import_json_history(str(tmp_path / "metadata"))
+    assert store.get_run(run_id)["image_count"] == 5
+
+def test_only_running_and_stopped_runs_can_be_resumed(store):
+    inputs = {"file_paths": ["/data/card.zip"]}
+    for status in ("running", "stopped", "failed", "done"):
+        store.create_run(status, status=status, inputs=inputs)
+    store.create_run("watch", status="stopped", inputs={"watch": ["/data"]})
+    assert sorted(run["name"] for run in store.interrupted_runs()) == ["running", "stopped"]
@@ -0,0 +1,14 @@
+# tests/test_parallel.py
+# Классификация в пуле процессов: рабочие процессы импортируют поддельный ultralytics через sys.path
+
+import ultralytics
+from backend import inference
+
+def test_process_pool_matches_single_process(classifier, image_paths):
+    single = inference.process_images_classification(classifier, image_paths, batch_size=4, use_cache=False)
+    ultralytics.CALLS.clear()
+    parallel = inference.process_images_classification(classifier, image_paths, batch_size=4, use_cache=False,
+                                                       num_processes=2)
+    assert parallel == single
+    # Инференс шел в рабочих процессах, модель основного процесса не вызывалась
+    assert ultralytics.CALLS == []
@@ -0,0 +1,80 @@
+# tests/test_results.py
+# Потоковая запись отчетов: CSV, Excel с переходом на новый лист, Parquet по группам строк
+
+import csv
+
+import pytest
+
+from backend import results
+from backend.results import ReportWriter, report_columns
+
+def image_classifications(start, count):
+    # Каждое третье изображение - с двумя классами, часть классов без перевода
+    labels = ["roedeer", "deer", "muskdeer", "boar"]
+    items = []
+    for index in range(start, start + count):
+        classes = [(labels[index % 4], 0.9)]
+        if index % 3 == 0:
+            classes.append(("deer", 0.4))
+        items.append({"image": f"/cards/card{index % 2}/IMG_{index:04d}.jpg", "classes": classes})
+    return items
+
+def expected_rows(items):
+    return [[item["image"].rsplit("/", 1)[1],
+             ", ".join(results.animal_dict.get(label_name, label_name) for label_name, _ in item["classes"])]
+            for item in items]
+
+def write_in_chunks(report_path, chunks):
+    with ReportWriter(report_path) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+    return report_path
+
+def test_csv_report(tmp_path):
+    items = image_classifications(0, 7)
+    report_path = write_in_chunks(str(tmp_path / "reports" / "run.csv"), [items[:3], items[3:]])
+
+    with open(report_path, newline="", encoding="utf-8-sig") as file:
+        rows = list(csv.reader(file))
+    assert rows == [report_columns] + expected_rows(items)
+    assert rows[1] == ["IMG_0000.jpg", "Косуля, Олень"]
+
+def test_excel_report_continues_on_a_new_sheet(tmp_path, monkeypatch):
+    openpyxl = pytest.importorskip("openpyxl")
+    # Лист на 4 строки данных вместо 1048576
+    monkeypatch.setattr(results, "EXCEL_MAX_ROWS", 5)
+    items = image_classifications(0, 11)
+    report_path = write_in_chunks(str(tmp_path / "run.xlsx"), [items[:6], items[6:]])
+
+    workbook = openpyxl.load_workbook(report_path, read_only=True)
+    assert workbook.sheetnames == ["Sheet1", "Sheet2", "Sheet3"]
+    sheets = [[list(row) for row in worksheet.iter_rows(values_only=True)] for worksheet in workbook.worksheets]
+    workbook.close()
+    assert [len(rows) for rows in sheets] == [5, 5, 4]
+    assert all(rows[0] == report_columns for rows in sheets)
+    assert [row for rows in sheets for row in rows[1:]] == expected_rows(items)
+
+def test_empty_excel_report_has_a_header(tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    report_path = write_in_chunks(str(tmp_path / "empty.xlsx"), [])
+
+    workbook = openpyxl.load_workbook(report_path, read_only=True)
+    assert [list(row) for row in workbook["Sheet1"].iter_rows(values_only=True)] == [report_columns]
+    workbook.close()
+
+def test_parquet_report_is_written_in_row_groups(tmp_path, monkeypatch):
+    pq = pytest.importorskip("pyarrow.parquet")
+    monkeypatch.setattr(results, "PARQUET_ROW_GROUP_SIZE", 4)
+    items = image_classifications(0, 10)
+    report_path = write_in_chunks(str(tmp_path / "run.parquet"), [items[:3], items[3:]])
+
+    parquet_file = pq.ParquetFile(report_path)
+    assert parquet_file.metadata.num_row_groups == 3
+    table = parquet_file.read()
+    assert table.column_names == report_columns
+    rows = [list(row) for row in zip(*(table.column(name).to_pylist() for name in report_columns))]
+    assert rows == expected_rows(items)
+
+def test_unknown_report_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        ReportWriter(str(tmp_path / "run.txt"))
@@ -0,0 +1,36 @@
+# tests/test_resume.py
+# Продолжение прерванного запуска по контрольным точкам в MetadataStore
+
+import json
+import threading
+
+import pytest
+
+from backend import inference
+from backend.metadata import MetadataStore
+
+def test_resumed_run_matches_uninterrupted_run(tmp_path, classifier, image_paths):
+    _, expected = inference.process_images_classification(classifier, image_paths, batch_size=4, use_cache=False)
+
+    store = MetadataStore(str(tmp_path / "metadata.sqlite"))
+    run_id = store.create_run("interrupted")
+    stop_event = threading.Event()
+    class_counts = {}
+
+    def checkpoint(new_class_counts, new_image_classifications):
+        for label_name, count in new_class_counts.items():
+            class_counts[label_name] = class_counts.get(label_name, 0) + count
+        store.add_images(run_id, new_image_classifications, class_counts)
+        if len(store.processed_images(run_id)) >= 8:
+            stop_event.set()
+
+    with pytest.raises(InterruptedError):
+        inference.process_images_classification(classifier, image_paths, stop_event, batch_size=4, num_workers=1,
+                                                use_cache=False, result_callback=checkpoint)
+    processed = store.processed_images(run_id)
+    assert 0 < len(processed) < len(image_paths)
+
+    inference.process_images_classification(classifier, image_paths, batch_size=4, use_cache=False,
+                                            result_callback=checkpoint, skip=processed)
+    assert store.query_images(run_id=run_id) == json.loads(json.dumps(expected))
+    store.close()
@@ -0,0 +1,90 @@
+# tests/test_server.py
+# Сервис инференса и клиент на Unix-сокете: общие батчи запросов разных клиентов и ответ 503 при переполнении
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+import ultralytics
+from backend import inference
+from backend.client import InferenceClient
+from backend.server import InferenceServer
+from conftest import IMAGE_SIZES, expected_classes
+
+@pytest.fixture
+def start_server(tmp_path, classifier, detector):
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, name="inference-server", daemon=True)
+    thread.start()
+    servers = []
+
+    def start(**options):
+        server = InferenceServer({"classification": classifier, "detection": detector}, **options)
+        socket_path = str(tmp_path / f"server{len(servers)}.sock")
+        asyncio.run_coroutine_threadsafe(server.start(unix_path=socket_path), loop).result(5)
+        servers.append(server)
+        return server, InferenceClient(f"unix:{socket_path}")
+
+    yield start
+    for server in servers:
+        asyncio.run_coroutine_threadsafe(server.close(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+def test_results_match_in_process_inference_and_use_the_cache(start_server, detector, image_paths):
+    _, client = start_server()
+
+    results = list(client.iter_images_classification(image_paths, batch_size=4))
+    assert [image_data["image"] for image_data in results] == image_paths
+    assert [image_data["classes"] for image_data in results] == [expected_classes(size) for size in IMAGE_SIZES]
+
+    expected = list(inference.iter_images_detection(detector, image_paths, batch_size=4, use_cache=False))
+    assert list(client.iter_images_detection(image_paths, batch_size=4)) == expected
+
+    # Повторный запрос отвечается из кэша, модель не вызывается
+    ultralytics.CALLS.clear()
+    assert list(client.iter_images_classification(image_paths, batch_size=4)) == results
+    assert ultralytics.CALLS == []
+
+def test_requests_of_different_clients_share_a_batch(start_server, image_paths):
+    _, client = start_server(max_batch=8, max_wait=0.5)
+    barrier = threading.Barrier(4)
+    results = {}
+
+    def request(index):
+        sources = [(image_path, None) for image_path in image_paths[2 * index:2 * index + 2]]
+        barrier.wait()
+        results[index] = client.predict("classify", sources, use_cache=False)
+
+    threads = [threading.Thread(target=request, args=(index,)) for index in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    # Ответ сервиса - JSON: классы приходят списками
+    expected = [[list(class_data) for class_data in expected_classes(size)] for size in IMAGE_SIZES[:8]]
+    assert [image_data["classes"] for index in range(4) for image_data in results[index]] == expected
+    # Четыре запроса по два изображения ушли в модель одним батчем
+    assert ultralytics.CALLS == [8]
+    assert client.metrics()["models"]["classification"]["mean_batch_size"] == 8
+
+def test_busy_server_answers_503_and_client_retries(start_server, image_paths):
+    server, client = start_server(max_batch=16, max_wait=0.5, max_pending=2)
+    first = {}
+    thread = threading.Thread(target=lambda: first.update(
+        results=client.predict("classify", [(image_path, None) for image_path in image_paths[:2]], use_cache=False)))
+    thread.start()
+    deadline = time.monotonic() + 5
+    while not server.pending and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    # Пока первый запрос ждет батч, второй не помещается в max_pending: сервер отвечает 503, клиент повторяет
+    second = client.predict("classify", [(image_path, None) for image_path in image_paths[2:4]], use_cache=False)
+    thread.join(10)
+
+    assert [image_data["image"] for image_data in first["results"] + second] == image_paths[:4]
+    assert client.metrics()["stats"]["counters"]["rejected_requests"] >= 1
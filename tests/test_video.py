@@ -0,0 +1,71 @@
+# tests/test_video.py
+# Детекция по видео: батчи кадров, шаг по кадрам, выходные файлы, отсев кадров без движения
+
+import csv
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+import ultralytics
+from backend.video import process_video
+
+# При таком размере кадра поддельный детектор находит на каждом кадре одну рамку
+FRAME_SIZE = (320, 250)
+MOVING_FRAMES = range(10, 20)
+
+def write_video(path, frame_count=30):
+    # Серый фон; на кадрах 10-19 квадрат движется, потом стоит на месте
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 10.0, FRAME_SIZE)
+    for frame_index in range(frame_count):
+        frame = np.full((FRAME_SIZE[1], FRAME_SIZE[0], 3), 90, dtype=np.uint8)
+        if frame_index >= MOVING_FRAMES.start:
+            x = 20 + 16 * (min(frame_index, MOVING_FRAMES.stop - 1) - MOVING_FRAMES.start)
+            frame[100:160, x:x + 60] = 255
+        writer.write(frame)
+    writer.release()
+    return path
+
+@pytest.fixture
+def video_path(tmp_path):
+    return write_video(str(tmp_path / "trail.avi"))
+
+def test_frames_are_batched_with_stride_and_saved(tmp_path, detector, video_path):
+    summary = process_video(detector, video_path, output_dir=str(tmp_path / "out"), stride=3, batch_size=4,
+                            motion_threshold=0)
+
+    with open(summary["detections_json"]) as file:
+        frames = json.load(file)
+    # Пропущенные кадры не декодируются, а без порога детектор работает на каждом оставшемся кадре
+    assert [frame_data["frame"] for frame_data in frames] == list(range(0, 30, 3))
+    assert all(frame_data["inferred"] for frame_data in frames)
+    assert summary["frames"] == 30
+    assert sum(ultralytics.CALLS) == summary["inferred_frames"] == 10
+    assert max(ultralytics.CALLS) <= 4
+
+    with open(summary["detections_csv"], newline="") as file:
+        rows = list(csv.reader(file))
+    assert len(rows) == 1 + sum(len(frame_data["detections"]) for frame_data in frames)
+    capture = cv2.VideoCapture(summary["annotated_video"])
+    assert int(capture.get(cv2.CAP_PROP_FRAME_COUNT)) == 10
+    capture.release()
+
+def test_static_frames_inherit_detections_of_the_last_inferred_frame(tmp_path, detector, video_path):
+    summary = process_video(detector, video_path, output_dir=str(tmp_path / "out"), batch_size=8)
+
+    with open(summary["detections_json"]) as file:
+        frames = json.load(file)
+    inferred = [frame_data["frame"] for frame_data in frames if frame_data["inferred"]]
+    # Детектор работает на первом кадре и на кадрах, где движется квадрат
+    assert inferred == [0, *MOVING_FRAMES]
+    assert summary["frames"] == summary["processed_frames"] == len(frames) == 30
+    assert summary["inferred_frames"] == sum(ultralytics.CALLS) == len(inferred)
+
+    # Кадры без движения получают детекции последнего кадра, на котором работал детектор
+    detections = {frame_data["frame"]: frame_data["detections"] for frame_data in frames}
+    assert detections[0] and detections[25] != detections[5]
+    for frame_data in frames:
+        if not frame_data["inferred"]:
+            last_inferred = max(frame_index for frame_index in inferred if frame_index < frame_data["frame"])
+            assert frame_data["detections"] == detections[last_inferred]
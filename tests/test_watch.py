@@ -0,0 +1,44 @@
+# tests/test_watch.py
+# Наблюдение за папкой: повторный запуск продолжает тот же запуск и берет только новые файлы
+
+import csv
+import os
+import shutil
+import zipfile
+
+from backend.metadata import MetadataStore
+from backend.watch import watch_folders
+
+def test_watch_continues_run_with_new_files_only(tmp_path, classifier, image_paths):
+    watched = tmp_path / "card"
+    watched.mkdir()
+    for image_path in image_paths[:8]:
+        shutil.copy(image_path, watched)
+    store = MetadataStore(str(tmp_path / "metadata.sqlite"))
+    report_path = str(tmp_path / "report.csv")
+    options = dict(run_name="watch_card", report_path=report_path, poll_interval=0, settle_seconds=0, num_workers=1,
+                   store=store, max_polls=2)
+
+    run_id, _ = watch_folders(classifier, [str(watched)], **options)
+    first_paths = {str(watched / os.path.basename(image_path)) for image_path in image_paths[:8]}
+    assert store.processed_images(run_id) == first_paths
+
+    for image_path in image_paths[8:12]:
+        shutil.copy(image_path, watched)
+    zip_path = str(watched / "later.zip")
+    with zipfile.ZipFile(zip_path, "w") as zip_ref:
+        for image_path in image_paths[12:]:
+            zip_ref.write(image_path, os.path.basename(image_path))
+
+    second_run_id, class_counts = watch_folders(classifier, [str(watched)], **options)
+
+    assert second_run_id == run_id
+    expected_paths = ([str(watched / os.path.basename(image_path)) for image_path in image_paths[:12]]
+                      + [f"{zip_path}/{os.path.basename(image_path)}" for image_path in image_paths[12:]])
+    images = store.query_images(run_id=run_id)
+    assert sorted(image_data["image"] for image_data in images) == sorted(expected_paths)
+    assert sum(class_counts.values()) == len(image_paths)
+    assert store.seen_files(run_id) == set(expected_paths[:12]) | {zip_path}
+    with open(report_path, newline="", encoding="utf-8-sig") as file:
+        assert len(list(csv.reader(file))) == len(image_paths) + 1
+    store.close()